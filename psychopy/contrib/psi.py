@@ -16,13 +16,15 @@ from __future__ import absolute_import, division, print_function
 
 from builtins import range
 from builtins import object
-__all__ = ['PsiObject']
+__all__ = ['PsiObject', 'LeanPsiObject']
 
+import atexit
 import math
 import warnings
 import random
 import sys
 import time
+from multiprocessing.pool import ThreadPool
 from numpy import *
 
 
@@ -66,11 +68,18 @@ class PsiObject(object):
             else:
                 self._probLambda = prior.reshape(1, len(self.alpha), len(self.beta), 1)
             
+        self._initProbResponse()
+
+    def _initProbResponse(self):
         #Create P(r | lambda, x)
-        if TwoAFC:
-            self._probResponseGivenLambdaX = (1-self._r) + (2*self._r-1) * ((.5 + .5 * stats.norm.cdf(self._x, self._alpha, self._beta)) * (1 - self.delta) + self.delta / 2)
+        self._probResponseGivenLambdaX = (1-self._r) + (2*self._r-1) * self._probCorrectGivenLambdaX(self._x)
+
+    def _probCorrectGivenLambdaX(self, x):
+        """P(r=1 | lambda, x) for the intensities x, given as a [1,1,1,x] array."""
+        if self._TwoAFC:
+            return (.5 + .5 * stats.norm.cdf(x, self._alpha, self._beta)) * (1 - self.delta) + self.delta / 2
         else: # Yes/No
-            self._probResponseGivenLambdaX = (1-self._r) + (2*self._r-1) * (stats.norm.cdf(self._x, self._alpha, self._beta)*(1-self.delta)+self.delta/2)
+            return stats.norm.cdf(x, self._alpha, self._beta)*(1-self.delta)+self.delta/2
         
     def update(self, response=None):
         if response is not None:    #response should only be None when Psi is first initialized
@@ -107,3 +116,131 @@ class PsiObject(object):
         
     def savePosterior(self, file):
         save(file, self._probLambda)
+
+
+_threadPools = {}
+
+
+def _getThreadPool(threads):
+    if threads not in _threadPools:
+        _threadPools[threads] = ThreadPool(threads)
+    return _threadPools[threads]
+
+
+@atexit.register
+def _closeThreadPools():
+    for pool in _threadPools.values():
+        pool.close()
+        pool.join()
+    _threadPools.clear()
+
+
+def _xlog10x(p):
+    """p * log10(p), with 0 where p is 0."""
+    nonzero = p > 0
+    return where(nonzero, p * log10(where(nonzero, p, 1)), 0)
+
+
+class LeanPsiObject(PsiObject):
+
+    """PsiObject that chooses each intensity without creating the 4D [r,a,b,x]
+    arrays of PsiObject, for fine intensity, alpha and beta grids.
+
+    Writing Z(r, x) = P(r | x) and L = P(lambda), the expected entropy of each
+    intensity is
+
+        E[H(x)] = sum_r Z log Z - sum L log L - sum L * sum_r P(r | lambda, x) log P(r | lambda, x)
+
+    so only P(r=1 | lambda, x) and the last sum over r are kept, as [x, lambda]
+    arrays of the given dtype (float32 by default), and each update takes two
+    matrix-vector products. If threads > 1 the products are computed in chunks of
+    chunkSize intensities by a pool of threads. The posterior is kept as log
+    probabilities, in float64, and updated using the presented intensity only.
+    """
+
+    def __init__(self, x, alpha, beta, xPrecision, aPrecision, bPrecision, delta=0, stepType='lin', TwoAFC=False, prior=None, dtype='float32', chunkSize=32, threads=1):
+        self._dtype = dtype
+        self._chunkSize = int(chunkSize)
+        self._threads = int(threads)
+        if self._chunkSize < 1 or self._threads < 1:
+            raise ValueError('chunkSize and threads must be at least 1.')
+        PsiObject.__init__(self, x, alpha, beta, xPrecision, aPrecision, bPrecision, delta=delta, stepType=stepType, TwoAFC=TwoAFC, prior=prior)
+
+    def _initProbResponse(self):
+        # [x, lambda] arrays of P(r=1 | lambda, x) and of
+        # sum_r P(r | lambda, x) log P(r | lambda, x), created in chunks of x
+        # so that only a chunk is ever held in float64.
+        lambdaCount = len(self.alpha) * len(self.beta)
+        self._probCorrectXLambda = empty((len(self.x), lambdaCount), dtype=self._dtype)
+        self._responseEntropyXLambda = empty((len(self.x), lambdaCount), dtype=self._dtype)
+        for start in range(0, len(self.x), self._chunkSize):
+            end = start + self._chunkSize
+            probCorrect = self._probCorrectGivenLambdaX(self._x[..., start:end]).reshape((lambdaCount, -1)).T
+            self._probCorrectXLambda[start:end] = probCorrect
+            self._responseEntropyXLambda[start:end] = _xlog10x(probCorrect) + _xlog10x(1 - probCorrect)
+        with errstate(divide='ignore'):
+            self._logProbLambda = log(self._probLambda.ravel())
+
+    def update(self, response=None):
+        if response is not None:    #response should only be None when Psi is first initialized
+            x = self._x[..., self.nextIntensityIndex:self.nextIntensityIndex + 1]
+            probCorrect = self._probCorrectGivenLambdaX(x).ravel()
+            with errstate(divide='ignore'):
+                if response:
+                    self._logProbLambda = self._logProbLambda + log(probCorrect)
+                else:
+                    self._logProbLambda = self._logProbLambda + log(1 - probCorrect)
+            self._logProbLambda -= self._logProbLambda.max()
+            probLambda = exp(self._logProbLambda)
+            total = probLambda.sum()
+            self._logProbLambda -= log(total)
+            self._probLambda = (probLambda / total).reshape((1,len(self.alpha),len(self.beta),1))
+
+        #Create E[H(x)]
+        self._expectedEntropyX = self._expectedEntropy(self._probLambda.ravel())
+
+        #Generate next intensity
+        self.nextIntensityIndex = argmin(self._expectedEntropyX)
+        self.nextIntensity = self.x[self.nextIntensityIndex]
+
+    def _expectedEntropy(self, probLambda):
+        lambdaProbs = probLambda.astype(self._dtype)
+
+        def products(chunk):
+            return (self._probCorrectXLambda[chunk].dot(lambdaProbs),
+                    self._responseEntropyXLambda[chunk].dot(lambdaProbs))
+
+        if self._threads > 1:
+            chunks = [slice(start, start + self._chunkSize) for start in range(0, len(self.x), self._chunkSize)]
+            results = _getThreadPool(self._threads).map(products, chunks)
+            probCorrectX = concatenate([r[0] for r in results])
+            responseEntropyX = concatenate([r[1] for r in results])
+        else:
+            probCorrectX, responseEntropyX = products(slice(None))
+
+        probCorrectX = probCorrectX.astype(float64)
+        probIncorrectX = clip(probLambda.sum() - probCorrectX, 0, None)
+        lambdaEntropy = sum(_xlog10x(probLambda))
+        return _xlog10x(probCorrectX) + _xlog10x(probIncorrectX) - lambdaEntropy - responseEntropyX
+
+
+if __name__ == '__main__':
+    # Compare the time taken to choose each intensity, and the memory used by
+    # the arrays of each object, for a 200 x 100 x 100 intensity, alpha and
+    # beta grid.
+    import timeit
+    from itertools import cycle
+
+    args = ([0.05, 10], [0.1, 10], [0.05, 5], 0.05, 0.1, 0.05)
+    kwargs = dict(delta=0.02, TwoAFC=True)
+    for name, cls, extraKwargs in (('PsiObject', PsiObject, {}),
+                                   ('LeanPsiObject', LeanPsiObject, {}),
+                                   ('LeanPsiObject, 4 threads', LeanPsiObject, dict(threads=4))):
+        kwargs.update(extraKwargs)
+        psi = cls(*args, **kwargs)
+        psi.update(None)
+        responses = cycle([1, 1, 0, 1])
+        dur = min(timeit.repeat(lambda: psi.update(next(responses)), repeat=5, number=1))
+        nbytes = sum([a.nbytes for a in vars(psi).values() if isinstance(a, ndarray)])
+        print('%s: %d x %d x %d grid, %.1f msec / update, %.1f MB of arrays' % (
+            name, len(psi.x), len(psi.alpha), len(psi.beta), dur * 1000, nbytes / 1e6))
@@ -45,12 +45,51 @@ import warnings
 import random
 import sys
 import time
+import collections
 
 import numpy as num
 
 def getinf(x):
     return num.nonzero( num.isinf( num.atleast_1d(x) ) )
 
+# psychometric function tables (x2, p2, xThreshold, s2, log(s2)) of recently
+# used parameter sets, shared by the QuestObjects using them
+_TABLE_CACHE_SIZE = 32
+_tableCache = collections.OrderedDict()
+
+def _psychometricTables(pThreshold,beta,delta,gamma,grain,dim):
+    """x2, p2, xThreshold, s2 and log(s2) of recompute(), from the cache if
+    possible. The arrays are read-only."""
+    key = (pThreshold,beta,delta,gamma,grain,dim)
+    tables = _tableCache.pop(key, None)
+    if tables is None:
+        i2 = num.arange(-dim,dim+1)
+        x2 = i2*grain
+        p2 = delta*gamma+(1-delta)*(1-(1-gamma)*num.exp(-10**(beta*x2)))
+        if p2[0] >= pThreshold or p2[-1] <= pThreshold:
+            raise RuntimeError('psychometric function range [%.2f %.2f] omits %.2f threshold'%(p2[0],p2[-1],pThreshold)) # XXX
+        if len(getinf(p2)[0]):
+            raise RuntimeError('psychometric function p2 is not finite')
+        index = num.nonzero( p2[1:]-p2[:-1] )[0] # strictly monotonic subset
+        if len(index) < 2:
+            raise RuntimeError('psychometric function has only %g strictly monotonic points'%len(index))
+        xThreshold = num.interp([pThreshold],p2[index],x2[index])[0]
+        p2 = delta*gamma+(1-delta)*(1-(1-gamma)*num.exp(-10**(beta*(x2+xThreshold))))
+        if len(getinf(p2)[0]):
+            raise RuntimeError('psychometric function p2 is not finite')
+        s2 = num.array( ((1-p2)[::-1], p2[::-1]) )
+        if len(getinf(s2)[0]):
+            raise RuntimeError('psychometric function s2 is not finite')
+        with num.errstate(divide='ignore'):
+            logS2 = num.log(s2)
+        for a in (x2, p2, s2, logS2):
+            a.flags.writeable = False
+        tables = (x2, p2, xThreshold, s2, logS2)
+    _tableCache[key] = tables
+    while len(_tableCache) > _TABLE_CACHE_SIZE:
+        _tableCache.popitem(last=False)
+    return tables
+
 
 class QuestObject(object):
 
@@ -304,26 +343,11 @@ class QuestObject(object):
         self.x = self.i * self.grain
         self.pdf = num.exp(-0.5*(self.x/self.tGuessSd)**2)
         self.pdf = self.pdf/num.sum(self.pdf)
-        i2 = num.arange(-self.dim,self.dim+1)
-        self.x2 = i2*self.grain
-        self.p2 = self.delta*self.gamma+(1-self.delta)*(1-(1-self.gamma)*num.exp(-10**(self.beta*self.x2)))
-        if self.p2[0] >= self.pThreshold or self.p2[-1] <= self.pThreshold:
-            raise RuntimeError('psychometric function range [%.2f %.2f] omits %.2f threshold'%(self.p2[0],self.p2[-1],self.pThreshold)) # XXX
-        if len(getinf(self.p2)[0]):
-            raise RuntimeError('psychometric function p2 is not finite')
-        index = num.nonzero( self.p2[1:]-self.p2[:-1] )[0] # strictly monotonic subset
-        if len(index) < 2:
-            raise RuntimeError('psychometric function has only %g strictly monotonic points'%len(index))
-        self.xThreshold = num.interp([self.pThreshold],self.p2[index],self.x2[index])[0]
-        self.p2 = self.delta*self.gamma+(1-self.delta)*(1-(1-self.gamma)*num.exp(-10**(self.beta*(self.x2+self.xThreshold))))
-        if len(getinf(self.p2)[0]):
-            raise RuntimeError('psychometric function p2 is not finite')
-        self.s2 = num.array( ((1-self.p2)[::-1], self.p2[::-1]) )
+        self.x2, self.p2, self.xThreshold, self.s2, logS2 = _psychometricTables(
+            self.pThreshold,self.beta,self.delta,self.gamma,self.grain,self.dim)
         if not hasattr(self,'intensity') or not hasattr(self,'response'):
             self.intensity = []
             self.response = []
-        if len(getinf(self.s2)[0]):
-            raise RuntimeError('psychometric function s2 is not finite')
 
         eps = 1e-14
 
@@ -336,20 +360,26 @@ class QuestObject(object):
         if len(getinf(self.pdf)[0]):
             raise RuntimeError('prior pdf is not finite')
 
-        # recompute the pdf from the historical record of trials
-        for intensity, response in zip(self.intensity,self.response):
-            inten = max(-1e10,min(1e10,intensity)) # make intensity finite
-            ii = len(self.pdf) + self.i-round((inten-self.tGuess)/self.grain)-1
-            if ii[0]<0:
-                ii = ii-ii[0]
-            if ii[-1]>=self.s2.shape[1]:
-                ii = ii+self.s2.shape[1]-ii[-1]-1
-            iii = ii.astype(num.int_)
-            if not num.allclose(ii,iii):
-                raise ValueError('truncation error')
-            self.pdf = self.pdf*self.s2[response,iii]
-            if self.normalizePdf and k%100==0:
-                self.pdf = self.pdf/num.sum(self.pdf) # avoid underflow; keep the pdf normalized
+        # recompute the pdf from the historical record of trials, summing the
+        # log likelihood of all trials at once, a chunk of trials at a time
+        if len(self.intensity):
+            logPdf = num.zeros(len(self.pdf))
+            for start in range(0, len(self.intensity), 1000):
+                intensity = num.asarray(self.intensity[start:start+1000], dtype=float)
+                response = num.asarray(self.response[start:start+1000]).astype(num.int_)
+                inten = num.fmax(-1e10,num.fmin(1e10,intensity)) # make intensity finite
+                ii0 = len(self.pdf) + self.i[0]-num.round((inten-self.tGuess)/self.grain)-1
+                ii0 = num.clip(ii0, 0, self.s2.shape[1]-len(self.pdf)).astype(num.int_)
+                iii = ii0[:,num.newaxis] + num.arange(len(self.pdf))
+                with num.errstate(invalid='ignore'):
+                    logPdf += logS2[response[:,num.newaxis],iii].sum(axis=0)
+            with num.errstate(divide='ignore'):
+                logPdf += num.log(self.pdf)
+            # rescaled if the product of the likelihoods would underflow
+            logMax = logPdf.max()
+            if -num.inf < logMax < math.log(sys.float_info.min):
+                logPdf -= logMax
+            self.pdf = num.exp(logPdf)
         if self.normalizePdf:
             self.pdf = self.pdf/num.sum(self.pdf) # avoid underflow; keep the pdf normalized
         if len(getinf(self.pdf)[0]):
@@ -371,7 +401,7 @@ class QuestObject(object):
         if self.updatePdf:
             inten = max(-1e10,min(1e10,intensity)) # make intensity finite
             ii = len(self.pdf) + self.i-round((inten-self.tGuess)/self.grain)-1
-            if ii[0]<0 or ii[-1] > self.s2.shape[1]:
+            if ii[0]<0 or ii[-1] >= self.s2.shape[1]:
                 if self.warnPdf:
                     low=(1-len(self.pdf)-self.i[0])*self.grain+self.tGuess
                     high=(self.s2.shape[1]-len(self.pdf)-self.i[-1])*self.grain+self.tGuess
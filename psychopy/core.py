@@ -73,7 +73,7 @@ def quit():
     """Close everything and exit nicely (ending the experiment)
     """
     # pygame.quit()  # safe even if pygame was never initialised
-    logging.flush()
+    logging.flush(wait=True)  # also drains an asynchronous logger
 
     for thisThread in threading.enumerate():
         if hasattr(thisThread, 'stop') and hasattr(thisThread, 'running'):
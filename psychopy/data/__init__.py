@@ -23,6 +23,8 @@ from .utils import (checkValidFilePath, isValidVariableName, importTrialTypes,
 from .fit import (FitFunction, FitCumNormal, FitLogistic, FitNakaRushton,
                   FitWeibull)
 
+from .simulation import simulateStaircase
+
 try:
     # import openpyxl
     import openpyxl
@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Column-oriented storage of experiment entries, used by
+:class:`~psychopy.data.ExperimentHandler` when created with
+`columnar=True`.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from builtins import str
+from builtins import range
+from builtins import object
+import numbers
+import numpy as np
+
+_INITIAL_CAPACITY = 64
+_INT64_MIN = -2 ** 63
+_INT64_MAX = 2 ** 63 - 1
+
+
+def _kindOf(value):
+    """Return the numpy dtype that can hold `value` without changing how it
+    is written to a text file. Anything that can't be stored exactly in a
+    typed column goes into an object column.
+    """
+    if isinstance(value, (bool, np.bool_)):
+        return np.dtype(bool)
+    if isinstance(value, numbers.Integral):
+        if _INT64_MIN <= value <= _INT64_MAX:
+            return np.dtype(np.int64)
+        return np.dtype(object)
+    if isinstance(value, (float, np.float64)):
+        return np.dtype(np.float64)
+    return np.dtype(object)
+
+
+class _Column(object):
+    """A single named data column with a mask of the rows that hold a value.
+    """
+
+    def __init__(self, name, dtype, capacity):
+        self.name = name
+        self.values = np.zeros(capacity, dtype=dtype)
+        self.present = np.zeros(capacity, dtype=bool)
+
+    @property
+    def dtype(self):
+        return self.values.dtype
+
+    def resize(self, capacity):
+        values = np.zeros(capacity, dtype=self.values.dtype)
+        present = np.zeros(capacity, dtype=bool)
+        n = min(capacity, len(self.values))
+        values[:n] = self.values[:n]
+        present[:n] = self.present[:n]
+        self.values = values
+        self.present = present
+
+    def toObject(self, nRows):
+        """Convert a typed column to an object column (e.g. when a string
+        arrives in a column that so far only held numbers).
+        """
+        values = np.empty(len(self.values), dtype=object)
+        values[:nRows] = self.values[:nRows].tolist()
+        self.values = values
+
+    def set(self, row, value):
+        self.values[row] = value
+        self.present[row] = True
+
+    def get(self, row):
+        value = self.values[row]
+        if self.values.dtype != object:
+            value = value.item()
+        return value
+
+
+class ColumnarEntries(object):
+    """A list-like container of experiment entries stored by column.
+
+    Each data name gets its own preallocated NumPy array (bool, int64,
+    float64 or object) which grows geometrically, so appending an entry
+    does not keep a dict per row alive. Rows are only converted back to
+    dicts when explicitly requested (indexing, iterating, `getAllEntries`),
+    whereas saving and conversion to pandas work on the columns directly.
+
+    Values retrieved from typed columns are returned as native Python
+    types (e.g. `numpy.float64` comes back as `float`).
+    """
+
+    def __init__(self, entries=None, capacity=_INITIAL_CAPACITY):
+        self._columns = {}
+        self._names = []  # column names in order of first appearance
+        self._capacity = max(int(capacity), 1)
+        self._nRows = 0
+        if entries is not None:
+            self.extend(entries)
+
+    @property
+    def names(self):
+        """Names of all columns, in the order they first appeared.
+        """
+        return list(self._names)
+
+    def __len__(self):
+        return self._nRows
+
+    def __iter__(self):
+        for row in range(self._nRows):
+            yield self._getRow(row)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._getRow(row)
+                    for row in range(*index.indices(self._nRows))]
+        if index < 0:
+            index += self._nRows
+        if not 0 <= index < self._nRows:
+            raise IndexError('entry index out of range')
+        return self._getRow(index)
+
+    def __eq__(self, other):
+        if isinstance(other, ColumnarEntries):
+            other = list(other)
+        return list(self) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '%s(%i entries, %i columns)' % (
+            self.__class__.__name__, self._nRows, len(self._names))
+
+    def __getstate__(self):
+        # don't pickle the unused (preallocated) part of each column
+        n = self._nRows
+        columns = [(name, self._columns[name].values[:n],
+                    self._columns[name].present[:n])
+                   for name in self._names]
+        return {'nRows': n, 'columns': columns}
+
+    def __setstate__(self, state):
+        self._columns = {}
+        self._names = []
+        self._nRows = state['nRows']
+        self._capacity = max(self._nRows, _INITIAL_CAPACITY)
+        for name, values, present in state['columns']:
+            column = _Column(name, values.dtype, self._capacity)
+            column.values[:self._nRows] = values
+            column.present[:self._nRows] = present
+            self._columns[name] = column
+            self._names.append(name)
+
+    def copy(self):
+        """Return an independent copy of the container.
+        """
+        new = ColumnarEntries()
+        new.__setstate__(self.__getstate__())
+        return new
+
+    def _getRow(self, row):
+        entry = {}
+        for name in self._names:
+            column = self._columns[name]
+            if column.present[row]:
+                entry[name] = column.get(row)
+        return entry
+
+    def _grow(self):
+        self._capacity *= 2
+        for column in self._columns.values():
+            column.resize(self._capacity)
+
+    def _addColumn(self, name, dtype):
+        column = _Column(name, dtype, self._capacity)
+        self._columns[name] = column
+        self._names.append(name)
+        return column
+
+    def append(self, entry):
+        """Add an entry (a dict of name/value pairs) as a new row.
+        """
+        if self._nRows >= self._capacity:
+            self._grow()
+        row = self._nRows
+        for name, value in entry.items():
+            kind = _kindOf(value)
+            column = self._columns.get(name)
+            if column is None:
+                column = self._addColumn(name, kind)
+            elif kind != column.dtype and column.dtype != object:
+                # mixed types; keep the values exactly as they were given
+                column.toObject(row)
+            column.set(row, value)
+        self._nRows += 1
+
+    def extend(self, entries):
+        for entry in entries:
+            self.append(entry)
+
+    def getColumn(self, name):
+        """Return a tuple of `(values, present)` arrays for the rows stored
+        so far. Rows without a value have `present == False` and an
+        undefined entry in `values`.
+        """
+        column = self._columns[name]
+        n = self._nRows
+        return column.values[:n], column.present[:n]
+
+    def getColumnStrings(self, name, quoteChars=(',', '\n')):
+        """Return the column formatted as a list of strings, as written to a
+        wide text file; missing values are returned as empty strings and
+        values containing any of `quoteChars` are enclosed in quotes.
+        """
+        n = self._nRows
+        if name not in self._columns:
+            return [u''] * n
+        values, present = self.getColumn(name)
+        if values.dtype == object:
+            strings = []
+            for val, isPresent in zip(values, present):
+                if not isPresent:
+                    strings.append(u'')
+                    continue
+                sVal = str(val)
+                if any(char in sVal for char in quoteChars):
+                    sVal = u'"%s"' % sVal
+                strings.append(sVal)
+            return strings
+        strings = [str(val) for val in values.tolist()]
+        if not present.all():
+            for row in np.flatnonzero(~present):
+                strings[row] = u''
+        return strings
+
+    def toDataFrame(self, columns=None):
+        """Return the entries as a :class:`pandas.DataFrame`, built directly
+        from the column arrays. Missing values are NaN in numeric columns
+        and None otherwise.
+
+        :Parameters:
+
+            columns : list or None
+                Order of columns in the DataFrame. Names that were never
+                used appear as empty columns. Defaults to the order in which
+                the names first appeared.
+        """
+        import pandas as pd
+        if columns is None:
+            columns = self._names
+        n = self._nRows
+        data = {}
+        for name in columns:
+            if name not in self._columns:
+                data[name] = np.full(n, None, dtype=object)
+                continue
+            values, present = self.getColumn(name)
+            if present.all():
+                data[name] = values.copy()
+            elif values.dtype.kind in 'if':
+                # as pandas does for missing numbers in a list of dicts
+                data[name] = np.where(present, values, np.nan)
+            else:
+                col = values.astype(object)
+                col[~present] = None
+                data[name] = col
+        return pd.DataFrame(data, columns=list(columns))
@@ -16,6 +16,8 @@ from psychopy.tools.filetools import (openOutputFile, genDelimiter,
                                       genFilenameFromDelimiter)
 from .utils import checkValidFilePath
 from .base import _ComparisonMixin
+from .columnar import ColumnarEntries
+from .streaming import WideTextStreamWriter, formatWideTextRow
 
 
 class ExperimentHandler(_ComparisonMixin):
@@ -29,7 +31,10 @@ class ExperimentHandler(_ComparisonMixin):
         exp = data.ExperimentHandler(name="Face Preference",version='0.1.0')
 
     """
-    
+    # defaults for handlers pickled before these options existed
+    columnar = False
+    _streamWriter = None
+
     def __init__(self,
                  name='',
                  version='',
@@ -40,7 +45,9 @@ class ExperimentHandler(_ComparisonMixin):
                  saveWideText=True,
                  dataFileName='',
                  autoLog=True,
-                 appendFiles=False):
+                 appendFiles=False,
+                 columnar=False,
+                 streamWideText=False):
         """
         :parameters:
 
@@ -75,6 +82,22 @@ class ExperimentHandler(_ComparisonMixin):
             saveWideText : True (default) or False
 
             autoLog : True (default) or False
+
+            columnar : True or False (default)
+                Store entries by column (one typed NumPy array per data
+                name) rather than as a list of dicts. This keeps memory
+                low and saving fast for very long runs. `entries` is then
+                a :class:`~psychopy.data.columnar.ColumnarEntries` object,
+                which still behaves as a sequence of dicts.
+
+            streamWideText : True or False (default)
+                Write each entry to the wide text (csv) data file as soon as
+                nextEntry() is called, from a background thread, rather than
+                saving the whole file when the experiment ends. A crash then
+                loses at most the current trial. Requires `saveWideText` and
+                a `dataFileName`. The columns are in the same order as in
+                :meth:`saveAsWideText`, and the file is appended to if
+                `appendFiles` is True.
         """
         self.loops = []
         self.loopsUnfinished = []
@@ -90,11 +113,16 @@ class ExperimentHandler(_ComparisonMixin):
         self.saveWideText = saveWideText
         self.dataFileName = dataFileName
         self.thisEntry = {}
-        self.entries = []  # chronological list of entries
+        self.columnar = columnar
+        if columnar:
+            self.entries = ColumnarEntries()
+        else:
+            self.entries = []  # chronological list of entries
         self._paramNamesSoFar = []
         self.dataNames = []  # names of all the data (eg. resp.keys)
         self.autoLog = autoLog
         self.appendFiles = appendFiles
+        self._streamWriter = None
 
         if dataFileName in ['', None]:
             logging.warning('ExperimentHandler created with no dataFileName'
@@ -103,6 +131,10 @@ class ExperimentHandler(_ComparisonMixin):
         else:
             # fail now if we fail at all!
             checkValidFilePath(dataFileName, makeValid=True)
+            if streamWideText and saveWideText:
+                self._streamWriter = WideTextStreamWriter(
+                    dataFileName + '.csv', append=appendFiles,
+                    fileCollisionMethod='rename')
         atexit.register(self.close)
 
     def __del__(self):
@@ -234,6 +266,8 @@ class ExperimentHandler(_ComparisonMixin):
         if type(self.extraInfo) == dict:
             this.update(self.extraInfo)
         self.entries.append(this)
+        if self._streamWriter is not None and not self._streamWriter.closed:
+            self._streamWriter.addEntry(this, self._getAllColumnNames())
         self.thisEntry = {}
 
     def getAllEntries(self):
@@ -244,11 +278,48 @@ class ExperimentHandler(_ComparisonMixin):
         :return: copy (not pointer) to entries
         """
         # check for orphan final data (not committed as a complete entry)
-        entries = copy.copy(self.entries)
+        entries = list(self.entries)
         if self.thisEntry:  # thisEntry is not empty
             entries.append(self.thisEntry)
         return entries
 
+    def _getAllColumnarEntries(self):
+        """As getAllEntries() but returns a
+        :class:`~psychopy.data.columnar.ColumnarEntries` object (only for
+        handlers created with `columnar=True`).
+        """
+        if not self.thisEntry:
+            return self.entries
+        entries = self.entries.copy()
+        entries.append(self.thisEntry)
+        return entries
+
+    def _getAllColumnNames(self, sortColumns=False):
+        """Returns the names of all columns of the wide-format data file
+        """
+        names = self._getAllParamNames()
+        names.extend(self.dataNames)
+        # names from the extraInfo dictionary
+        names.extend(self._getExtraInfo()[0])
+        # sort names if requested
+        if sortColumns:
+            names.sort()
+        return names
+
+    def getDataFrame(self, sortColumns=False):
+        """Returns a pandas DataFrame of all entries so far (including a
+        final entry for which nextEntry() has not yet been called), with the
+        same columns as the wide-format text file.
+
+        For handlers created with `columnar=True` the DataFrame is built
+        directly from the stored columns.
+        """
+        names = self._getAllColumnNames(sortColumns=sortColumns)
+        if self.columnar:
+            return self._getAllColumnarEntries().toDataFrame(columns=names)
+        import pandas as pd
+        return pd.DataFrame(self.getAllEntries(), columns=names)
+
     def saveAsWideText(self,
                        fileName,
                        delim=None,
@@ -312,36 +383,40 @@ class ExperimentHandler(_ComparisonMixin):
                            fileCollisionMethod=fileCollisionMethod,
                            encoding=encoding)
 
-        names = self._getAllParamNames()
-        names.extend(self.dataNames)
-        # names from the extraInfo dictionary
-        names.extend(self._getExtraInfo()[0])
-        # sort names if requested
-        if sortColumns:
-            names.sort()
+        names = self._getAllColumnNames(sortColumns=sortColumns)
         # write a header line
         if not matrixOnly:
             for heading in names:
                 f.write(u'%s%s' % (heading, delim))
             f.write('\n')
 
-        # write the data for each entry
-        for entry in self.getAllEntries():
-            for name in names:
-                if name in entry:
-                    ename = str(entry[name])
-                    if ',' in ename or '\n' in ename:
-                        fmt = u'"%s"%s'
-                    else:
-                        fmt = u'%s%s'
-                    f.write(fmt % (entry[name], delim))
-                else:
-                    f.write(delim)
-            f.write('\n')
+        if self.columnar:
+            self._writeColumnarRows(f, names, delim)
+        else:
+            self._writeEntryRows(f, names, delim)
         if f != sys.stdout:
             f.close()
         logging.info('saved data to %r' % f.name)
 
+    def _writeEntryRows(self, f, names, delim):
+        """Write the data for each entry (list of dicts) to an open file
+        """
+        for entry in self.getAllEntries():
+            f.write(formatWideTextRow(entry, names, delim))
+
+    def _writeColumnarRows(self, f, names, delim):
+        """Write the data for each entry of a columnar handler to an open
+        file, formatting whole columns at once rather than row by row
+        """
+        entries = self._getAllColumnarEntries()
+        columns = [entries.getColumnStrings(name) for name in names]
+        if not columns:
+            f.write('\n' * len(entries))
+            return
+        for row in zip(*columns):
+            f.write(u''.join(cell + delim for cell in row))
+            f.write('\n')
+
     def saveAsPickle(self, fileName, fileCollisionMethod='rename'):
         """Basically just saves a copy of self (with data) to a pickle file.
 
@@ -370,7 +445,10 @@ class ExperimentHandler(_ComparisonMixin):
         self.saveWideText = False
 
         origEntries = self.entries
-        self.entries = self.getAllEntries()
+        if self.columnar:
+            self.entries = self._getAllColumnarEntries()
+        else:
+            self.entries = self.getAllEntries()
 
         # otherwise use default location
         if not fileName.endswith('.psydat'):
@@ -394,7 +472,13 @@ class ExperimentHandler(_ComparisonMixin):
                 logging.debug(msg)
             if self.savePickle:
                 self.saveAsPickle(self.dataFileName)
-            if self.saveWideText:
+            if self._streamWriter is not None:
+                # the file is already written, apart from any orphan entry
+                if self.saveWideText and self.thisEntry:
+                    self._streamWriter.addEntry(self.thisEntry,
+                                                self._getAllColumnNames())
+                self._streamWriter.close()
+            elif self.saveWideText:
                 self.saveAsWideText(self.dataFileName + '.csv')
         self.abort()
         self.autoLog = False
@@ -410,3 +494,6 @@ class ExperimentHandler(_ComparisonMixin):
         """
         self.savePickle = False
         self.saveWideText = False
+        if self._streamWriter is not None:
+            # keep what has been written so far but stop adding to it
+            self._streamWriter.close()
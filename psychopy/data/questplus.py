@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""A vectorised implementation of QUEST+ (Watson, 2017), used by
+:class:`~psychopy.data.QuestPlusHandler` when created with
+`engine='native'`.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from builtins import object
+import collections
+import hashlib
+import threading
+import numpy as np
+
+# the names of the parameters of the psychometric functions, in the order of
+# the dimensions of the parameter grid
+paramNames = ('threshold', 'slope', 'lowerAsymptote', 'lapseRate')
+psychometricFuncs = ('weibull', 'logistic', 'normal', 'gumbel')
+stimScales = ('log10', 'dB', 'linear')
+
+# likelihood tables of recently created QuestPlusObjects, by grid definition
+_LIKELIHOOD_CACHE_SIZE = 4
+_likelihoodCache = collections.OrderedDict()
+_likelihoodCacheLock = threading.Lock()
+
+
+def psychometricFunction(func, x, threshold, slope, lowerAsymptote,
+                         lapseRate, stimScale='log10'):
+    """Returns the probability of the first response (e.g. 'Yes' or
+    'Correct') at intensity `x`, broadcasting all of the arguments.
+
+    With `d = x - threshold` for the 'log10' and 'linear' `stimScale` and
+    `d = (x - threshold) / 20` for 'dB', this is
+
+        lowerAsymptote + (1 - lowerAsymptote - lapseRate) * F(slope * d)
+
+    where F(z) is 1 - exp(-10 ** z) for 'weibull', 1 / (1 + exp(-z)) for
+    'logistic', the standard normal cdf for 'normal' and 1 - exp(-exp(z))
+    for 'gumbel'. The 'weibull' on the 'linear' scale is instead
+    1 - exp(-(x / threshold) ** slope). The Weibull is the one used by the
+    questplus package.
+    """
+    if stimScale not in stimScales:
+        raise ValueError('Unknown stimScale %r, must be one of %s.'
+                         % (stimScale, ', '.join(stimScales)))
+    x = np.asarray(x, dtype=np.float64)
+    if func == 'weibull' and stimScale == 'linear':
+        cdf = 1 - np.exp(-(x / threshold) ** slope)
+    else:
+        z = slope * (x - threshold)
+        if stimScale == 'dB':
+            z = z / 20
+        if func == 'weibull':
+            cdf = 1 - np.exp(-10 ** z)
+        elif func == 'gumbel':
+            cdf = 1 - np.exp(-np.exp(z))
+        elif func == 'logistic':
+            # the same as 1 / (1 + exp(-z)), without overflowing
+            cdf = 0.5 * (1 + np.tanh(z / 2))
+        elif func == 'normal':
+            from scipy import special
+            cdf = special.ndtr(z)
+        else:
+            raise ValueError('Unknown psychometric function %r, must be one '
+                             'of %s.' % (func, ', '.join(psychometricFuncs)))
+    return lowerAsymptote + (1 - lowerAsymptote - lapseRate) * cdf
+
+
+def _xlogx(x):
+    """x * log(x), which is 0 where x is 0."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(x > 0, x * np.log(x), 0)
+
+
+def _equal(a, b):
+    """Compares the states of two QuestPlusObjects."""
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        a, b = np.asarray(a), np.asarray(b)
+        return (a.shape == b.shape and
+                np.array_equal(a, b, equal_nan=a.dtype.kind == 'f'))
+    if isinstance(a, (list, tuple)):
+        return (isinstance(b, (list, tuple)) and len(a) == len(b) and
+                all(_equal(i, j) for i, j in zip(a, b)))
+    if isinstance(a, dict):
+        return (isinstance(b, dict) and set(a) == set(b) and
+                all(_equal(a[k], b[k]) for k in a))
+    if isinstance(a, float) and isinstance(b, float):
+        return a == b or (np.isnan(a) and np.isnan(b))
+    return a == b
+
+
+class QuestPlusObject(object):
+    """QUEST+ for a psychometric function with two responses and a grid of
+    threshold, slope, lower asymptote and lapse rate values.
+
+    The probability of the first response is computed once for every
+    intensity and parameter combination, as an [intensity, parameters] array
+    of the given `dtype`, together with sum_r P(r) log P(r). Writing
+    Z(r, x) = P(r | x) and L = P(params), the expected entropy of each
+    intensity is then
+
+        E[H(x)] = sum_r Z log Z - sum L log L - sum_r sum P(r | params, x) log P(r | params, x) * L
+
+    which takes two matrix-vector products per trial, rather than the
+    [intensity, parameters, response] posteriors of the questplus package.
+    These tables are shared by all objects with the same grid, function and
+    `dtype`. The posterior is kept in float64, and is updated with the
+    likelihood of the presented intensity computed in float64, which needs
+    not be one of `intensityVals`.
+
+    Parameter combinations whose prior probability is at most `pruneBelow`
+    are left out of the grid. With the default of 0 only those that are
+    impossible are, which does not change the results.
+    """
+
+    def __init__(self, intensityVals, thresholdVals, slopeVals,
+                 lowerAsymptoteVals, lapseRateVals, responseVals=('Yes', 'No'),
+                 prior=None, psychometricFunc='weibull', stimScale='log10',
+                 stimSelectionMethod='minEntropy', stimSelectionOptions=None,
+                 paramEstimationMethod='mean', dtype='float64', pruneBelow=0):
+        if psychometricFunc not in psychometricFuncs:
+            raise ValueError('Unknown psychometric function %r, must be one '
+                             'of %s.' % (psychometricFunc,
+                                         ', '.join(psychometricFuncs)))
+        if stimScale not in stimScales:
+            raise ValueError('Unknown stimScale %r, must be one of %s.'
+                             % (stimScale, ', '.join(stimScales)))
+        if stimSelectionMethod not in ('minEntropy', 'minNEntropy'):
+            raise ValueError('Unknown stimSelectionMethod requested.')
+        if paramEstimationMethod not in ('mean', 'mode'):
+            raise ValueError('Unknown paramEstimationMethod requested.')
+        if len(responseVals) != 2:
+            raise ValueError('Exactly two responseVals are required.')
+
+        self.intensityVals = np.atleast_1d(intensityVals)
+        self.thresholdVals = np.atleast_1d(thresholdVals)
+        self.slopeVals = np.atleast_1d(slopeVals)
+        self.lowerAsymptoteVals = np.atleast_1d(lowerAsymptoteVals)
+        self.lapseRateVals = np.atleast_1d(lapseRateVals)
+        self.responseVals = list(responseVals)
+        self.psychometricFunc = psychometricFunc
+        self.stimScale = stimScale
+        self.stimSelectionMethod = stimSelectionMethod
+        self.paramEstimationMethod = paramEstimationMethod
+        self.dtype = np.dtype(dtype).name
+
+        options = dict(N=4, maxConsecutiveReps=2, randomSeed=None)
+        if stimSelectionOptions is not None:
+            unknown = set(stimSelectionOptions) - set(options)
+            if unknown:
+                raise ValueError('Unknown stimSelectionOptions requested. '
+                                 'Valid options are: %s'
+                                 % ', '.join(sorted(options)))
+            options.update(stimSelectionOptions)
+        self.stimSelectionOptions = options
+        if stimSelectionMethod == 'minNEntropy':
+            self._rng = np.random.RandomState(seed=options['randomSeed'])
+        else:
+            self._rng = None
+
+        # the prior, over the parameter combinations that are kept
+        prior = self._fullPrior(prior).ravel()
+        self._paramIndex = np.flatnonzero(prior > pruneBelow)
+        if not len(self._paramIndex):
+            raise ValueError('pruneBelow leaves no parameter combinations.')
+        prior = prior[self._paramIndex]
+        self.prior = prior / prior.sum()
+        self.posterior = self.prior.copy()
+        self.stimHistory = []
+        self.respHistory = []
+        # the expected entropy of the last intensity chosen
+        self.entropy = None
+        self._initLikelihoods()
+
+    def _fullPrior(self, prior):
+        """The normalised prior over the whole parameter grid, from a dict of
+        the prior probabilities of each parameter's values."""
+        paramVals = self._paramVals()
+        prior = {} if prior is None else prior
+        unknown = set(prior) - set(paramNames)
+        if unknown:
+            raise ValueError('Invalid prior parameter(s) specified. '
+                             'Valid parameter names are: %s'
+                             % ', '.join(paramNames))
+        fullPrior = np.ones([len(v) for v in paramVals])
+        for i, name in enumerate(paramNames):
+            if name in prior:
+                shape = [1] * len(paramNames)
+                shape[i] = -1
+                p = np.asarray(prior[name], dtype=np.float64).reshape(shape)
+                fullPrior = fullPrior * p
+        return fullPrior / fullPrior.sum()
+
+    def _paramVals(self):
+        return (self.thresholdVals, self.slopeVals, self.lowerAsymptoteVals,
+                self.lapseRateVals)
+
+    def _params(self):
+        """The values of each parameter for each kept parameter combination.
+        """
+        shape = [len(v) for v in self._paramVals()]
+        indices = np.unravel_index(self._paramIndex, shape)
+        return [v[i] for v, i in zip(self._paramVals(), indices)], indices
+
+    def _probFirstResponse(self, x):
+        """[x, parameters] array of the probability of the first response,
+        in float64."""
+        params, _ = self._params()
+        return psychometricFunction(
+            self.psychometricFunc, np.asarray(x)[:, np.newaxis],
+            *[p[np.newaxis] for p in params], stimScale=self.stimScale)
+
+    def _initLikelihoods(self):
+        """Gets the likelihood tables from the cache, or creates them."""
+        key = hashlib.sha1()
+        for a in (self.intensityVals,) + self._paramVals() + (self._paramIndex,):
+            a = np.ascontiguousarray(a)
+            key.update(a.dtype.str.encode())
+            key.update(repr(a.shape).encode())
+            key.update(a.tobytes())
+        key = (self.psychometricFunc, self.stimScale, self.dtype,
+               key.hexdigest())
+
+        with _likelihoodCacheLock:
+            tables = _likelihoodCache.pop(key, None)
+        if tables is None:
+            probFirst = self._probFirstResponse(self.intensityVals)
+            responseEntropy = _xlogx(probFirst) + _xlogx(1 - probFirst)
+            tables = (probFirst.astype(self.dtype),
+                      responseEntropy.astype(self.dtype))
+            for table in tables:
+                table.flags.writeable = False
+        with _likelihoodCacheLock:
+            _likelihoodCache[key] = tables
+            while len(_likelihoodCache) > _LIKELIHOOD_CACHE_SIZE:
+                _likelihoodCache.popitem(last=False)
+        self._probFirstXParams, self._responseEntropyXParams = tables
+
+    def __getstate__(self):
+        # the likelihood tables are shared, and can be created again
+        state = self.__dict__.copy()
+        del state['_probFirstXParams']
+        del state['_responseEntropyXParams']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._initLikelihoods()
+
+    def __json_encode__(self):
+        state = self.__getstate__()
+        if self._rng is not None:
+            state['_rng'] = self._rng.get_state()
+        return state
+
+    def __json_decode__(self, **state):
+        if state['_rng'] is not None:
+            rng = np.random.RandomState()
+            rng.set_state(tuple(state['_rng']))
+            state['_rng'] = rng
+        self.__setstate__(state)
+
+    def __eq__(self, other):
+        if not isinstance(other, QuestPlusObject):
+            return False
+        return _equal(self.__json_encode__(), other.__json_encode__())
+
+    def __ne__(self, other):
+        return not self == other
+
+    def update(self, intensity, response):
+        """Updates the posterior with the `response` to `intensity`."""
+        try:
+            responseIndex = self.responseVals.index(response)
+        except ValueError:
+            raise ValueError('Unknown response %r, must be one of %s.'
+                             % (response, self.responseVals))
+        likelihood = self._probFirstResponse([intensity])[0]
+        if responseIndex:
+            likelihood = 1 - likelihood
+        posterior = self.posterior * likelihood
+        self.posterior = posterior / posterior.sum()
+        self.stimHistory.append(intensity)
+        self.respHistory.append(response)
+
+    def expectedEntropy(self):
+        """The expected entropy of the posterior after each of
+        `intensityVals`."""
+        posterior = self.posterior.astype(self.dtype)
+        probFirst = self._probFirstXParams.dot(posterior).astype(np.float64)
+        responseEntropy = self._responseEntropyXParams.dot(
+            posterior).astype(np.float64)
+        probSecond = np.clip(self.posterior.sum() - probFirst, 0, None)
+        return (_xlogx(probFirst) + _xlogx(probSecond) -
+                _xlogx(self.posterior).sum() - responseEntropy)
+
+    @property
+    def nextIntensity(self):
+        """The intensity to present next. With the 'minNEntropy'
+        stimSelectionMethod, every call picks one at random.
+        """
+        entropy = self.expectedEntropy()
+        if self.stimSelectionMethod == 'minEntropy':
+            index = np.argmin(entropy)
+            self.entropy = entropy[index].item()
+            return self.intensityVals[index].item()
+
+        indices = np.argsort(entropy)[:self.stimSelectionOptions['N']]
+        maxReps = self.stimSelectionOptions['maxConsecutiveReps']
+        while True:
+            index = self._rng.choice(indices)
+            intensity = self.intensityVals[index].item()
+            self.entropy = entropy[index].item()
+            if len(self.stimHistory) < 2:
+                break
+            elif all(intensity == prev
+                     for prev in self.stimHistory[-maxReps:]):
+                # pick again
+                continue
+            else:
+                break
+        return intensity
+
+    # the name used by questplus, so that QuestPlusHandler can use either
+    next_intensity = nextIntensity
+
+    def _marginals(self, probs):
+        _, indices = self._params()
+        return dict((name, np.bincount(i, weights=probs, minlength=len(v)))
+                    for name, i, v in zip(paramNames, indices,
+                                          self._paramVals()))
+
+    @property
+    def marginalPrior(self):
+        """Dict of the marginal prior of each parameter."""
+        return self._marginals(self.prior)
+
+    @property
+    def marginalPosterior(self):
+        """Dict of the marginal posterior of each parameter."""
+        return self._marginals(self.posterior)
+
+    @property
+    def paramEstimate(self):
+        """Dict of the estimate of each parameter, by `paramEstimationMethod`.
+        """
+        if self.paramEstimationMethod == 'mode':
+            params, _ = self._params()
+            index = np.argmax(self.posterior)
+            return dict((name, p[index].item())
+                        for name, p in zip(paramNames, params))
+        marginals = self.marginalPosterior
+        return dict((name, np.dot(marginals[name], vals).item())
+                    for name, vals in zip(paramNames, self._paramVals()))
+
+
+if __name__ == '__main__':
+    # Compare the time taken to update and choose each intensity with the
+    # questplus package, for a 100 x 41 x 10 x 5 x 5 grid.
+    import timeit
+    from itertools import cycle
+
+    grid = dict(intensities=np.linspace(-40, 0, 100),
+                thresholds=np.arange(-40, 1), slopes=np.linspace(1, 10, 10),
+                lower_asymptotes=np.linspace(0, 0.5, 5),
+                lapse_rates=np.linspace(0, 0.04, 5))
+    objects = [('float64', QuestPlusObject(*grid.values(), stimScale='dB')),
+               ('float32', QuestPlusObject(*grid.values(), stimScale='dB',
+                                           dtype='float32'))]
+    try:
+        import questplus
+        objects.insert(0, ('questplus', questplus.QuestPlusWeibull(
+            stim_scale='dB', **grid)))
+    except ImportError:
+        pass
+    for name, qp in objects:
+        responses = cycle(['Yes', 'Yes', 'No', 'Yes'])
+
+        def trial():
+            qp.update(intensity=qp.next_intensity, response=next(responses))
+
+        dur = min(timeit.repeat(trial, repeat=5, number=1))
+        print('%s: %.1f msec / trial' % (name, dur * 1000))
@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Simulation of many observers running through a staircase design, to tune
+its parameters (step sizes, number of reversals, priors...) before using it.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from builtins import range
+from builtins import object
+import multiprocessing
+import numpy as np
+
+from .questplus import psychometricFunction
+
+# the handler class and how each estimates the threshold, for each stairType
+_estimators = {
+    'quest': lambda handler: handler.mean(),
+    'psi': lambda handler: handler.estimateLambda()[0],
+    'questplus': lambda handler: handler.paramEstimate['threshold'],
+}
+
+# the direction of the staircase
+_START, _UP, _DOWN = 0, 1, -1
+
+
+def _handlerClass(stairType):
+    from .staircase import (StairHandler, QuestHandler, PsiHandler,
+                            QuestPlusHandler)
+    return dict(simple=StairHandler, quest=QuestHandler, psi=PsiHandler,
+                questplus=QuestPlusHandler)[stairType]
+
+
+def _observerKwargs(observer, thresholds):
+    kwargs = dict(slope=3.5, lowerAsymptote=0.5, lapseRate=0.01,
+                  psychometricFunc='weibull', stimScale='log10')
+    kwargs.update(observer)
+    del kwargs['threshold']
+    kwargs['func'] = kwargs.pop('psychometricFunc')
+    kwargs['threshold'] = thresholds
+    return kwargs
+
+
+class SimulatedStaircases(object):
+    """The results of :func:`simulateStaircase`, with an entry per observer in
+    each of these arrays:
+
+        thresholds: the true threshold of each observer
+        estimates: their estimated threshold (nan if there was no reversal
+            to average)
+        nTrials: the number of trials each observer ran
+        finished: False for the observers whose staircase was stopped at
+            `maxTrials`
+        intensities, responses: [observer, trial] arrays of the intensities
+            presented and the responses (nan and -1 after the last trial)
+
+    Use :meth:`summary` for the bias and variability of the estimates and the
+    number of trials.
+    """
+
+    def __init__(self, thresholds, estimates, nTrials, intensities,
+                 responses, finished):
+        self.thresholds = thresholds
+        self.estimates = estimates
+        self.nTrials = nTrials
+        self.intensities = intensities
+        self.responses = responses
+        self.finished = finished
+
+    @property
+    def errors(self):
+        """The estimated minus the true threshold of each observer."""
+        return self.estimates - self.thresholds
+
+    @property
+    def bias(self):
+        return np.nanmean(self.errors)
+
+    @property
+    def sd(self):
+        """Standard deviation of the errors of the estimates."""
+        return np.nanstd(self.errors)
+
+    @property
+    def rmse(self):
+        return np.sqrt(np.nanmean(self.errors ** 2))
+
+    def summary(self):
+        """Returns a dict of the bias, sd and rmse of the estimates, the mean
+        and sd of the number of trials and the number of observers that did
+        not finish."""
+        return dict(bias=float(self.bias), sd=float(self.sd),
+                    rmse=float(self.rmse),
+                    meanTrials=float(np.mean(self.nTrials)),
+                    sdTrials=float(np.std(self.nTrials)),
+                    unfinished=int(np.sum(~self.finished)))
+
+
+def simulateStaircase(observer, nObservers=1000, stairType='simple',
+                      maxTrials=1000, reversalsToAverage=6, seed=None,
+                      processes=None, **kwargs):
+    """Runs `nObservers` simulated observers through the staircase created
+    with `kwargs`, e.g.::
+
+        sim = simulateStaircase(
+            dict(threshold=0.1, stimScale='linear'), nObservers=5000,
+            startVal=0.5, stepType='db', stepSizes=[8, 4, 4, 2],
+            nTrials=30, nUp=1, nDown=3)
+        print(sim.summary())
+
+    :Parameters:
+
+        observer : dict
+            The psychometric function of the observers, as the arguments of
+            :func:`psychopy.data.questplus.psychometricFunction`:
+            `threshold`, and optionally `slope` (3.5), `lowerAsymptote`
+            (0.5), `lapseRate` (0.01), `psychometricFunc` ('weibull') and
+            `stimScale` ('log10'). `threshold` can be an array of the
+            threshold of each observer.
+
+        stairType : 'simple', 'quest', 'psi' or 'questplus'
+            Use a :class:`StairHandler`, :class:`QuestHandler`,
+            :class:`PsiHandler` or :class:`QuestPlusHandler`. The rules of
+            the StairHandler are applied to all observers at once, and the
+            others are run in a pool of `processes` processes (by default,
+            one per CPU; 1 runs them all in this process).
+
+        maxTrials : int
+            The number of trials after which a staircase that has not
+            finished is stopped.
+
+        reversalsToAverage : int or None
+            The threshold estimated by a StairHandler is the mean of this
+            many of the last reversal intensities (None for all). The other
+            handlers use the mean of their posterior, the alpha estimated by
+            the PsiHandler, or the threshold estimated by the QUEST+ handler.
+
+        seed : int or None
+            The seed of the responses of the observers, which are the same
+            whatever the number of `processes`.
+
+    :Returns:
+
+        a :class:`SimulatedStaircases`
+
+    As the observers are simulated in other processes, scripts calling this
+    on Windows need an ``if __name__ == '__main__':`` guard.
+    """
+    if stairType not in ('simple', 'quest', 'psi', 'questplus'):
+        raise ValueError("stairType must be 'simple', 'quest', 'psi' or "
+                         "'questplus', not %r." % (stairType,))
+    if 'threshold' not in observer:
+        raise ValueError('The threshold of the observer is required.')
+    thresholds = np.broadcast_to(np.asarray(observer['threshold'],
+                                            dtype=np.float64),
+                                 (nObservers,)).copy()
+
+    if stairType == 'simple':
+        return _simulateStairHandlers(
+            observer, thresholds, maxTrials, reversalsToAverage, seed,
+            kwargs)
+
+    seeds = np.random.RandomState(seed).randint(2 ** 31 - 1, size=nObservers)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    chunkSize = max(1, -(-nObservers // (processes * 4)))
+    chunks = [(stairType, kwargs, observer, thresholds[i:i + chunkSize],
+               seeds[i:i + chunkSize], maxTrials)
+              for i in range(0, nObservers, chunkSize)]
+    if processes > 1 and len(chunks) > 1:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_simulateHandlers, chunks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_simulateHandlers(chunk) for chunk in chunks]
+
+    estimates, nTrials, intensities, responses, finished = [
+        np.concatenate(r) for r in zip(*results)]
+    return SimulatedStaircases(thresholds, estimates, nTrials, intensities,
+                               responses, finished)
+
+
+def _simulateHandlers(args):
+    """Runs each of the given observers through a handler of its own."""
+    stairType, kwargs, observer, thresholds, seeds, maxTrials = args
+    handlerClass = _handlerClass(stairType)
+    estimate = _estimators[stairType]
+    n = len(thresholds)
+    estimates = np.empty(n)
+    nTrials = np.zeros(n, dtype=int)
+    intensities = np.full((n, maxTrials), np.nan)
+    responses = np.full((n, maxTrials), -1, dtype=np.int8)
+    finished = np.zeros(n, dtype=bool)
+    for i in range(n):
+        rng = np.random.RandomState(seeds[i])
+        observerKwargs = _observerKwargs(observer, thresholds[i])
+        handler = handlerClass(**kwargs)
+        if stairType == 'questplus':
+            responseVals = handler.responseVals
+        else:
+            responseVals = (1, 0)
+        for trialN, intensity in enumerate(handler):
+            if trialN == maxTrials:
+                break
+            p = psychometricFunction(x=intensity, **observerKwargs)
+            correct = rng.rand() < p
+            handler.addResponse(responseVals[0] if correct
+                                else responseVals[1])
+            intensities[i, trialN] = intensity
+            responses[i, trialN] = correct
+        else:
+            finished[i] = True
+        nTrials[i] = len(handler.data)
+        estimates[i] = estimate(handler)
+    return estimates, nTrials, intensities, responses, finished
+
+
+def _simulateStairHandlers(observer, thresholds, maxTrials,
+                           reversalsToAverage, seed, kwargs):
+    """Applies the rules of StairHandler.calculateNextIntensity to all
+    observers at once, one trial at a time."""
+    # a StairHandler checks and completes the parameters
+    stairs = _handlerClass('simple')(**kwargs)
+    stepSizes = np.asarray(stairs.stepSizes, dtype=np.float64)
+    observerKwargs = _observerKwargs(observer, thresholds)
+    rng = np.random.RandomState(seed)
+
+    n = len(thresholds)
+    intensity = np.full(n, stairs.startVal, dtype=np.float64)
+    stepSize = np.full(n, stepSizes[0])
+    correctCounter = np.zeros(n, dtype=int)
+    lastResponse = np.full(n, -1, dtype=np.int8)
+    direction = np.full(n, _START, dtype=np.int8)
+    nReversals = np.zeros(n, dtype=int)
+    reversalIntensities = np.full((n, maxTrials), np.nan)
+    intensities = np.full((n, maxTrials), np.nan)
+    responses = np.full((n, maxTrials), -1, dtype=np.int8)
+    finished = np.zeros(n, dtype=bool)
+    nTrials = np.zeros(n, dtype=int)
+
+    for trialN in range(maxTrials):
+        active = np.flatnonzero(~finished)
+        if not len(active):
+            break
+        # responses are drawn for every observer, so that each gets the same
+        # random numbers however many are still running
+        p = psychometricFunction(x=intensity, **observerKwargs)
+        correct = (rng.rand(n) < p)[active]
+        x = intensity[active]
+        intensities[active, trialN] = x
+        responses[active, trialN] = correct
+        nTrials[active] = trialN + 1
+
+        # StairHandler.addResponse
+        onRun = lastResponse[active] == correct
+        counter = np.where(
+            correct, np.where(onRun, correctCounter[active] + 1, 1),
+            np.where(onRun, correctCounter[active] - 1, -1))
+        lastResponse[active] = correct
+
+        # StairHandler.calculateNextIntensity
+        initial = (nReversals[active] == 0) & stairs.applyInitialRule
+        goDown = np.where(initial, correct, counter >= stairs.nDown)
+        goUp = np.where(initial, ~correct,
+                        ~goDown & (counter <= -stairs.nUp))
+        dirs = direction[active]
+        reversal = ((goDown & (dirs == _UP)) | (goUp & (dirs == _DOWN)))
+        direction[active] = np.where(goDown, _DOWN,
+                                     np.where(goUp, _UP, dirs))
+
+        revs = active[reversal]
+        reversalIntensities[revs, nReversals[revs]] = x[reversal]
+        nReversals[revs] += 1
+        finished[active] = ((nReversals[active] >= stairs.nReversals) &
+                            (trialN + 1 >= stairs.nTrials))
+        if stairs._variableStep:
+            stepSize[revs] = stepSizes[np.minimum(nReversals[revs],
+                                                  len(stepSizes) - 1)]
+
+        # the initial rule is applied up to and including the first reversal
+        # so goDown and goUp are what _intensityDec and _intensityInc do
+        step = stepSize[active]
+        if stairs.stepType == 'db':
+            factor = 10.0 ** (step / 20.0)
+            x = np.where(goDown, x / factor, np.where(goUp, x * factor, x))
+        elif stairs.stepType == 'log':
+            factor = 10.0 ** step
+            x = np.where(goDown, x / factor, np.where(goUp, x * factor, x))
+        elif stairs.stepType == 'lin':
+            x = np.where(goDown, x - step, np.where(goUp, x + step, x))
+        if stairs.maxVal is not None:
+            x = np.where(goUp & (x > stairs.maxVal), stairs.maxVal, x)
+        if stairs.minVal is not None:
+            x = np.where(goDown & (x < stairs.minVal), stairs.minVal, x)
+        intensity[active] = x
+        correctCounter[active] = np.where(goDown | goUp, 0, counter)
+
+    # the mean of the last reversalsToAverage reversal intensities
+    last = np.arange(maxTrials) < nReversals[:, np.newaxis]
+    if reversalsToAverage is not None:
+        last &= (np.arange(maxTrials) >=
+                 nReversals[:, np.newaxis] - reversalsToAverage)
+    with np.errstate(invalid='ignore'):
+        estimates = (np.where(last, reversalIntensities, 0).sum(axis=1) /
+                     last.sum(axis=1))
+    return SimulatedStaircases(thresholds, estimates, nTrials, intensities,
+                               responses, finished)
+
+
+if __name__ == '__main__':
+    # Compare the time taken to simulate 2000 observers with a StairHandler
+    # loop and with simulateStaircase.
+    import time
+    from psychopy.data import StairHandler
+
+    observer = dict(threshold=0.1, stimScale='linear')
+    kwargs = dict(startVal=0.5, stepType='db', stepSizes=[8, 4, 4, 2],
+                  nTrials=30, nUp=1, nDown=3, nReversals=8)
+    rng = np.random.RandomState(0)
+    t0 = time.time()
+    for i in range(2000):
+        stairs = StairHandler(**kwargs)
+        for x in stairs:
+            p = psychometricFunction(x=x, **_observerKwargs(observer, 0.1))
+            stairs.addResponse(int(rng.rand() < p))
+    t1 = time.time()
+    sim = simulateStaircase(observer, nObservers=2000, **kwargs)
+    t2 = time.time()
+    print('StairHandler loop: %.2f sec, simulateStaircase: %.3f sec'
+          % (t1 - t0, t2 - t1))
+    print(sim.summary())
@@ -17,6 +17,8 @@ import pickle
 import copy
 import warnings
 import collections
+import threading
+import weakref
 import numpy as np
 from pkg_resources import parse_version
 
@@ -25,7 +27,8 @@ from psychopy import logging
 from psychopy.tools.filetools import openOutputFile, genDelimiter
 from psychopy.tools.fileerrortools import handleFileCollision
 from psychopy.contrib.quest import QuestObject
-from psychopy.contrib.psi import PsiObject
+from psychopy.contrib.psi import PsiObject, LeanPsiObject
+from .questplus import QuestPlusObject
 from .base import _BaseTrialHandler, _ComparisonMixin
 from .utils import _getExcelCellName
 
@@ -42,6 +45,54 @@ try:
 except ImportError:
     haveOpenpyxl = False
 
+# speculative updates in progress, by id of the staircase. They are kept
+# out of the staircases themselves so that those can still be copied,
+# pickled and compared. An entry is dropped when the staircase ends or is
+# garbage collected
+_speculations = {}
+
+
+class _SpeculativeUpdate(object):
+    """Updates copies of the posterior of a staircase for each of the
+    possible responses to its current trial in a background thread, so that
+    addResponse() only needs to pick the copy for the actual response.
+    """
+
+    def __init__(self, staircase, posterior, update, responses,
+                 intensity=None):
+        self._key = id(staircase)
+        self.staircase = weakref.ref(staircase, self._discard)
+        self.trialN = staircase.thisTrialN
+        self.intensity = intensity
+        self._branches = {}
+        self._thread = threading.Thread(
+            target=self._run, args=(posterior, update, responses))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, posterior, update, responses):
+        for response in responses:
+            try:
+                branch = copy.deepcopy(posterior)
+                self._branches[response] = (branch, update(branch, response))
+            except Exception:
+                # addResponse() will then update the posterior itself, and
+                # raise the error there
+                pass
+
+    def _discard(self, ref=None):
+        # so that neither the copies of the posterior nor a recycled id
+        # outlive the staircase
+        if _speculations.get(self._key) is self:
+            del _speculations[self._key]
+
+    def get(self, response):
+        """Waits for the update to finish and returns the (posterior,
+        result of update) for `response`, or None if it was not computed.
+        """
+        self._thread.join()
+        return self._branches.get(response)
+
 
 class StairHandler(_BaseTrialHandler):
     """Class to handle smoothly the selection of the next trial
@@ -208,6 +259,38 @@ class StairHandler(_BaseTrialHandler):
     def __iter__(self):
         return self
 
+    def _startSpeculativeUpdate(self, posterior, update, responses,
+                                intensity=None):
+        """Starts calling `update(copy, response)` on a copy of `posterior`
+        for each of `responses` in a background thread.
+        See :meth:`_getSpeculativeUpdate`.
+        """
+        _speculations[id(self)] = _SpeculativeUpdate(
+            self, posterior, update, responses, intensity)
+
+    def _getSpeculativeUpdate(self, response, intensity=None):
+        """Returns the (posterior, result of update) that was speculatively
+        computed for `response` on the current trial, or None if there is
+        none (e.g. a different `intensity` was used than the speculated one).
+
+        Always waits for any speculative update to finish, so the posterior
+        is not modified while it is being copied.
+        """
+        speculation = _speculations.pop(id(self), None)
+        if speculation is None or speculation.staircase() is not self:
+            return None
+        branch = speculation.get(response)
+        if (speculation.trialN != self.thisTrialN or
+                speculation.intensity != intensity):
+            return None
+        return branch
+
+    def _terminate(self):
+        """Drop any speculative update before ending the loop
+        """
+        _speculations.pop(id(self), None)
+        super(StairHandler, self)._terminate()
+
     def addResponse(self, result, intensity=None):
         """Add a 1 or 0 to signify a correct / detected or
         incorrect / missed trial
@@ -738,6 +821,8 @@ class QuestHandler(StairHandler):
         staircase.quantile(0.5)  # gets the median
 
     """
+    # default for handlers saved before this option existed
+    speculative = False
 
     def __init__(self,
                  startVal,
@@ -758,6 +843,7 @@ class QuestHandler(StairHandler):
                  originPath=None,
                  name='',
                  autoLog=True,
+                 speculative=False,
                  **kwargs):
         """
         Typical values for pThreshold are:
@@ -844,6 +930,12 @@ class QuestHandler(StairHandler):
                 if you have it. You can also call the importData function
                 directly.
 
+            speculative: *False* or True
+                If True, the Quest posterior is updated for both possible
+                responses in a background thread while the participant is
+                responding, so that `addResponse` only has to pick the
+                right one.
+
             Additional keyword arguments will be ignored.
 
         :Notes:
@@ -870,6 +962,7 @@ class QuestHandler(StairHandler):
             startVal, startValSd, pThreshold, beta, delta, gamma,
             grain=grain, range=self._range)
 
+        self.speculative = speculative
         # Import any old staircase data
         if staircase is not None:
             self.importData(staircase.intensities, staircase.data)
@@ -920,8 +1013,13 @@ class QuestHandler(StairHandler):
             if len(self.intensities) != 0:
                 self.intensities.pop()  # remove the auto-generated one
             self.intensities.append(intensity)
-        # Update quest
-        self._quest.update(intensity, result)
+        # Update quest, or use the update computed while waiting for the
+        # response
+        speculation = self._getSpeculativeUpdate(result, intensity)
+        if speculation is not None:
+            self._quest = speculation[0]
+        else:
+            self._quest.update(intensity, result)
         # Update other things
         self.data.append(result)
         # add the current data to experiment if poss
@@ -941,6 +1039,20 @@ class QuestHandler(StairHandler):
             raise AttributeError("length of intensities and results input "
                                  "must be the same")
         self.incTrials(len(intensities))
+        if (self.stopInterval is None and not self.finished and
+                self.getExp() is None):
+            # nothing can happen between the trials, so Quest can replay
+            # them all at once
+            self.thisTrialN += len(intensities)
+            self.intensities.extend(intensities)
+            self.data.extend(results)
+            self._quest.intensity.extend(intensities)
+            self._quest.response.extend(results)
+            self._quest.recompute()
+            self._checkFinished()
+            if not self.finished:
+                self.calculateNextIntensity()
+            return
         for intensity, result in zip(intensities, results):
             try:
                 next(self)
@@ -1057,6 +1169,12 @@ class QuestHandler(StairHandler):
             # update pointer for next trial
             self.thisTrialN += 1
             self.intensities.append(self._nextIntensity)
+            if self.speculative:
+                intensity = self._questNextIntensity
+                self._startSpeculativeUpdate(
+                    self._quest,
+                    lambda quest, result: quest.update(intensity, result),
+                    (0, 1), intensity)
             return self._nextIntensity
         else:
             self._terminate()
@@ -1082,6 +1200,12 @@ class PsiObject_(PsiObject, _ComparisonMixin):
     pass
 
 
+class LeanPsiObject_(LeanPsiObject, _ComparisonMixin):
+    """A LeanPsiObject that implements the == and != operators.
+    """
+    pass
+
+
 class PsiHandler(StairHandler):
     """Handler to implement the "Psi" adaptive psychophysical method
     (Kontsevich & Tyler, 1999).
@@ -1119,6 +1243,8 @@ class PsiHandler(StairHandler):
 
     Y(x) = .5 * delta + (1 - delta) * (.5 + .5 * _normCdf)
     """
+    # default for handlers saved before this option existed
+    speculative = False
 
     def __init__(self,
                  nTrials,
@@ -1130,7 +1256,10 @@ class PsiHandler(StairHandler):
                  prior=None,
                  fromFile=False,
                  extraInfo=None,
-                 name=''):
+                 name='',
+                 engine='full',
+                 engineOptions=None,
+                 speculative=False):
         """Initializes the handler and creates an internal Psi Object for
         grid approximation.
 
@@ -1203,12 +1332,37 @@ class PsiHandler(StairHandler):
                 Optional name for the PsiHandler used in PsychoPy's built-in
                 logging system.
 
+            engine  (str)
+                How the next intensity is computed. 'full' creates 4-D
+                [response, alpha, beta, intensity] arrays of the
+                probabilities and entropies. 'lean' only keeps two
+                [intensity, alpha * beta] arrays, and updates the
+                posterior and expected entropies with matrix-vector
+                products, which needs much less memory and time for fine
+                grids. Defaults to 'full'.
+
+            engineOptions   (dict)
+                Options for the 'lean' engine: 'dtype' of the
+                [intensity, alpha * beta] arrays (default 'float32'),
+                'threads' used to compute the expected entropies
+                (default 1), in chunks of 'chunkSize' intensities
+                (default 32).
+
+            speculative (bool)
+                If True, the posterior and the next intensity are computed
+                for both possible responses in a background thread while the
+                participant is responding, so that `addResponse` only has
+                to pick the right one.
+
         :Raises:
 
             NotImplementedError
                 If the supplied `minVal` parameter implies an experimental
                 design other than Yes/No or 2-AFC.
 
+            ValueError
+                If `engine` is not 'full' or 'lean'.
+
         """
         if expectedMin not in [0, 0.5]:
             raise NotImplementedError(
@@ -1232,12 +1386,25 @@ class PsiHandler(StairHandler):
                 prior = None
 
         twoAFC = True if expectedMin == 0.5 else False
-        self._psi = PsiObject_(
-            intensRange, alphaRange, betaRange, intensPrecision,
-            alphaPrecision, betaPrecision, delta=delta,
-            stepType=stepType, TwoAFC=twoAFC, prior=prior)
+        if engine == 'full':
+            self._psi = PsiObject_(
+                intensRange, alphaRange, betaRange, intensPrecision,
+                alphaPrecision, betaPrecision, delta=delta,
+                stepType=stepType, TwoAFC=twoAFC, prior=prior)
+        elif engine == 'lean':
+            if engineOptions is None:
+                engineOptions = {}
+            self._psi = LeanPsiObject_(
+                intensRange, alphaRange, betaRange, intensPrecision,
+                alphaPrecision, betaPrecision, delta=delta,
+                stepType=stepType, TwoAFC=twoAFC, prior=prior,
+                **engineOptions)
+        else:
+            raise ValueError("engine must be 'full' or 'lean', not %r."
+                             % (engine,))
 
         self._psi.update(None)
+        self.speculative = speculative
 
     def addResponse(self, result, intensity=None):
         """Add a 1 or 0 to signify a correct / detected or
@@ -1256,7 +1423,12 @@ class PsiHandler(StairHandler):
         if self.getExp() is not None:
             # update the experiment handler too
             self.getExp().addData(self.name + ".response", result)
-        self._psi.update(result)
+        # the Psi update does not depend on the intensity
+        speculation = self._getSpeculativeUpdate(result)
+        if speculation is not None:
+            self._psi = speculation[0]
+        else:
+            self._psi.update(result)
 
     def __next__(self):
         """Advances to next trial and returns it.
@@ -1266,6 +1438,9 @@ class PsiHandler(StairHandler):
             # update pointer for next trial
             self.thisTrialN += 1
             self.intensities.append(self._psi.nextIntensity)
+            if self.speculative:
+                self._startSpeculativeUpdate(
+                    self._psi, lambda psi, result: psi.update(result), (0, 1))
             return self._psi.nextIntensity
         else:
             self._terminate()
@@ -1329,6 +1504,11 @@ class PsiHandler(StairHandler):
 
 
 class QuestPlusHandler(StairHandler):
+    # defaults for handlers saved before these options existed
+    engine = 'questplus'
+    speculative = False
+    _qpNextIntensity = None
+
     def __init__(self,
                  nTrials,
                  intensityVals, thresholdVals, slopeVals,
@@ -1338,10 +1518,12 @@ class QuestPlusHandler(StairHandler):
                  psychometricFunc='weibull', stimScale='log10',
                  stimSelectionMethod='minEntropy',
                  stimSelectionOptions=None, paramEstimationMethod='mean',
-                 extraInfo=None, name='', label='', **kwargs):
+                 extraInfo=None, name='', label='', engine='questplus',
+                 engineOptions=None, speculative=False, **kwargs):
         """
-        QUEST+ implementation. Currently only supports parameter estimation of
-        a Weibull-shaped psychometric function.
+        QUEST+ implementation. Using the questplus package, it only supports
+        parameter estimation of a Weibull-shaped psychometric function; the
+        native engine also supports logistic, normal and Gumbel functions.
 
         The parameter estimates can be retrieved via the `.paramEstimate`
         attribute, which returns a dictionary whose keys correspond to the
@@ -1397,9 +1579,10 @@ class QuestPlusHandler(StairHandler):
         startIntensity : float
             The very first intensity (or stimulus level) to present.
 
-        psychometricFunc : {'weibull'}
-            The psychometric function to fit. Currently, only the Weibull
-            function is supported.
+        psychometricFunc : {'weibull', 'logistic', 'normal', 'gumbel'}
+            The psychometric function to fit. Only the Weibull function is
+            supported by the questplus engine. See
+            :func:`psychopy.data.questplus.psychometricFunction`.
 
         stimScale : {'log10', 'dB', 'linear'}
             The scale on which the stimulus intensities (or stimulus levels)
@@ -1449,12 +1632,37 @@ class QuestPlusHandler(StairHandler):
         label : str
             Only used by :class:`MultiStairHandler`, and otherwise ignored.
 
+        engine : {'questplus', 'native'}
+            Whether to use the questplus package, or the
+            :class:`~psychopy.data.questplus.QuestPlusObject` of PsychoPy,
+            which selects each intensity with two matrix-vector products on
+            likelihood tables that are shared between staircases with the
+            same grid.
+
+        engineOptions : dict or None
+            Only used by the native engine: the `dtype` of its likelihood
+            tables ('float64' by default, or 'float32' to halve their size),
+            and `pruneBelow`, the prior probability at or below which
+            parameter combinations are left out of the grid (0 by default,
+            i.e. only impossible ones).
+
+        speculative : bool
+            If ``True``, the posterior and the next intensity are computed
+            for each of the `responseVals` in a background thread while the
+            participant is responding, so that `addResponse` only has to pick
+            the right one.
+
         kwargs : dict
             Additional keyword arguments. These might be passed, for example,
             through a :class:`MultiStairHandler`, and will be ignored. A
             warning will be emitted whenever additional keyword arguments
             have been passed.
 
+        Raises
+        ------
+        ValueError
+            If `engine` is not 'questplus' or 'native'.
+
         Warns
         -----
         RuntimeWarning
@@ -1469,11 +1677,15 @@ class QuestPlusHandler(StairHandler):
                Journal of Vision, 17(3):10. doi: 10.1167/17.3.10.
 
         """
-        if sys.version_info.major == 3 and sys.version_info.minor >= 6:
-            import questplus as qp
-        else:
-            msg = 'QUEST+ implementation requires Python 3.6 or newer'
-            raise RuntimeError(msg)
+        if engine not in ('questplus', 'native'):
+            raise ValueError("engine must be 'questplus' or 'native', not %r."
+                             % (engine,))
+        elif engine == 'questplus':
+            if sys.version_info.major == 3 and sys.version_info.minor >= 6:
+                import questplus as qp
+            else:
+                msg = 'QUEST+ implementation requires Python 3.6 or newer'
+                raise RuntimeError(msg)
 
         msg = ('The QUEST+ staircase implementation is currently being '
                'tested and may be subject to change.')
@@ -1516,6 +1728,7 @@ class QuestPlusHandler(StairHandler):
         self.stimSelectionOptions = stimSelectionOptions
         self.paramEstimationMethod = paramEstimationMethod
         self._prior = prior
+        self.engine = engine
 
         # questplus uses different parameter names.
         if self.stimSelectionMethod == 'minEntropy':
@@ -1563,7 +1776,24 @@ class QuestPlusHandler(StairHandler):
         else:
             prior_ = self._prior
 
-        if self.psychometricFunc == 'weibull':
+        if self.engine == 'native':
+            if engineOptions is None:
+                engineOptions = {}
+            self._qp = QuestPlusObject(
+                intensityVals=self.intensityVals,
+                thresholdVals=self.thresholdVals,
+                slopeVals=self.slopeVals,
+                lowerAsymptoteVals=self.lowerAsymptoteVals,
+                lapseRateVals=self.lapseRateVals,
+                responseVals=self.responseVals,
+                prior=self._prior,
+                psychometricFunc=self.psychometricFunc,
+                stimScale=self.stimScale,
+                stimSelectionMethod=self.stimSelectionMethod,
+                stimSelectionOptions=self.stimSelectionOptions,
+                paramEstimationMethod=self.paramEstimationMethod,
+                **engineOptions)
+        elif self.psychometricFunc == 'weibull':
             self._qp = qp.QuestPlusWeibull(
                 intensities=self.intensityVals,
                 thresholds=self.thresholdVals,
@@ -1577,8 +1807,8 @@ class QuestPlusHandler(StairHandler):
                 stim_selection_options=stimSelectionOptions_,
                 param_estimation_method=self.paramEstimationMethod)
         else:
-            msg = ('Currently only the Weibull psychometric function is '
-                   'supported.')
+            msg = ('Only the Weibull psychometric function is supported by '
+                   'the questplus engine.')
             raise ValueError(msg)
 
         # Ensure self._nextIntensity is set in case the `startIntensity` kwarg
@@ -1590,6 +1820,10 @@ class QuestPlusHandler(StairHandler):
         else:
             self._nextIntensity = self._qp.next_intensity
 
+        self.speculative = speculative
+        # the next intensity, if it was computed by a speculative update
+        self._qpNextIntensity = None
+
     @property
     def startIntensity(self):
         return self.startVal
@@ -1605,8 +1839,13 @@ class QuestPlusHandler(StairHandler):
         if self.getExp() is not None:
             # update the experiment handler too
             self.getExp().addData(self.name + ".response", response)
-        self._qp.update(intensity=self.intensities[-1],
-                        response=response)
+        speculation = self._getSpeculativeUpdate(response,
+                                                 self.intensities[-1])
+        if speculation is not None:
+            self._qp, self._qpNextIntensity = speculation
+        else:
+            self._qp.update(intensity=self.intensities[-1],
+                            response=response)
 
     def __next__(self):
         self._checkFinished()
@@ -1615,8 +1854,26 @@ class QuestPlusHandler(StairHandler):
             self.thisTrialN += 1
             if self.thisTrialN == 0 and self.startIntensity is not None:
                 self.intensities.append(self.startVal)
+            elif self._qpNextIntensity is not None:
+                self.intensities.append(self._qpNextIntensity)
             else:
                 self.intensities.append(self._qp.next_intensity)
+            self._qpNextIntensity = None
+
+            if self.speculative:
+                intensity = self.intensities[-1]
+                lastTrial = (self.nTrials is not None and
+                             len(self.intensities) >= self.nTrials)
+
+                def update(qp, response):
+                    qp.update(intensity=intensity, response=response)
+                    # next_intensity may use the random number generator,
+                    # so only ask for it if there is a next trial
+                    if not lastTrial:
+                        return qp.next_intensity
+
+                self._startSpeculativeUpdate(
+                    self._qp, update, self.responseVals, intensity)
 
             # We never actually use self._nextIntensity in the
             # QuestPlusHandler; it's mere purpose here is to make the
@@ -1646,6 +1903,9 @@ class QuestPlusHandler(StairHandler):
             parameters.
 
         """
+        if self.engine == 'native':
+            return self._qp.paramEstimate
+
         qp_estimate = self._qp.param_estimate
         estimate = dict(threshold=qp_estimate['threshold'],
                         slope=qp_estimate['slope'],
@@ -1664,6 +1924,9 @@ class QuestPlusHandler(StairHandler):
             A dictionary whose keys correspond to the names of the parameters.
 
         """
+        if self.engine == 'native':
+            return self._qp.marginalPrior
+
         qp_prior = self._qp.prior
 
         threshold = qp_prior.sum(dim=('slope', 'lower_asymptote', 'lapse_rate'))
@@ -1689,6 +1952,9 @@ class QuestPlusHandler(StairHandler):
             parameters.
 
         """
+        if self.engine == 'native':
+            return self._qp.marginalPosterior
+
         qp_posterior = self._qp.posterior
 
         threshold = qp_posterior.sum(dim=('slope', 'lower_asymptote', 'lapse_rate'))
@@ -1710,9 +1976,11 @@ class QuestPlusHandler(StairHandler):
 
         # Convert questplus.QuestPlus to JSON using questplus's built-in
         # functionality. questplus uses xarray, which cannot be easily
-        # serialized directly using json_tricks (yet).
-        self_copy._qp_json = self_copy._qp.to_json()
-        del self_copy._qp
+        # serialized directly using json_tricks (yet). The native
+        # QuestPlusObject can be.
+        if self.engine == 'questplus':
+            self_copy._qp_json = self_copy._qp.to_json()
+            del self_copy._qp
 
         r = (super(QuestPlusHandler, self_copy)
              .saveAsJson(fileName=fileName,
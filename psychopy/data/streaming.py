@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Incremental (streaming) saving of experiment entries, used by
+:class:`~psychopy.data.ExperimentHandler` when created with
+`streamWideText=True`.
+"""
+
+from __future__ import absolute_import, print_function
+
+from builtins import str
+from builtins import object
+import os
+import codecs
+import threading
+from array import array
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue  # python 2.x
+
+from psychopy import logging
+from psychopy.tools.filetools import (genDelimiter, genFilenameFromDelimiter,
+                                      pathToString, replaceFile)
+from psychopy.tools.fileerrortools import handleFileCollision
+
+_STOP = object()  # sentinel telling the writer thread to finish
+
+
+def formatWideTextCells(entry, names, delim):
+    """The cells (each ending with `delim`) of a line of a wide-format text
+    file for a single entry (dict).
+    """
+    cells = []
+    for name in names:
+        if name in entry:
+            ename = str(entry[name])
+            if ',' in ename or '\n' in ename:
+                ename = u'"%s"' % ename
+            cells.append(ename + delim)
+        else:
+            cells.append(delim)
+    return cells
+
+
+def formatWideTextRow(entry, names, delim):
+    """Format a single entry (dict) as a line of a wide-format text file,
+    using the same rules as `ExperimentHandler.saveAsWideText`.
+    """
+    return u''.join(formatWideTextCells(entry, names, delim)) + u'\n'
+
+
+class WideTextStreamWriter(object):
+    """Writes entries to a wide-format text file from a background thread.
+
+    Each call to :meth:`addEntry` just queues the entry; formatting and
+    disk access happen on a separate thread so the caller (typically the
+    frame loop, via `ExperimentHandler.nextEntry`) never waits on the disk.
+    After each batch of queued entries the file is flushed, so the file on
+    disk is never more than the entries still in the queue behind.
+
+    When columns first appear after rows have already been written, the
+    header line is rewritten and the cells of earlier rows are moved to the
+    new column order (or empty cells added), so the file always has a
+    consistent number of columns. The order is the `names` given to
+    :meth:`addEntry` (e.g. that of `ExperimentHandler.saveAsWideText`), or
+    otherwise the order in which the names were first seen. This rewrite
+    costs one pass over the file, but new names usually only appear in the
+    first trials.
+    """
+
+    def __init__(self, fileName, delim=None, encoding='utf-8-sig',
+                 fileCollisionMethod='rename', fsync=False, append=False):
+        """
+        :Parameters:
+
+            fileName : string
+                if extension is not specified, '.csv' will be appended if
+                the delimiter is ',', else '.tsv' will be appended.
+
+            delim : string or None
+                the delimiter between cells, by default derived from the
+                file name (see :func:`~psychopy.tools.filetools.genDelimiter`)
+
+            encoding : string
+                The encoding to use when saving a the file.
+                Defaults to `utf-8-sig`.
+
+            fileCollisionMethod:
+                Collision method passed to
+                :func:`~psychopy.tools.fileerrortools.handleFileCollision`.
+                Ignored if `append` is True.
+
+            fsync : True or False (default)
+                Also call `os.fsync` after each batch, so that data survive
+                a crash of the operating system (not just of Python), at
+                some extra cost in disk I/O.
+
+            append : True or False (default)
+                Add the header and rows to the end of an existing file,
+                as `saveAsWideText(appendFile=True)` does, rather than
+                starting a new one.
+        """
+        fileName = pathToString(fileName)
+        if delim is None:
+            delim = genDelimiter(fileName)
+        fileName = genFilenameFromDelimiter(fileName, delim)
+        append = append and os.path.exists(fileName)
+        if os.path.exists(fileName) and not append:
+            fileName = handleFileCollision(
+                fileName, fileCollisionMethod=fileCollisionMethod)
+        self.fileName = fileName
+        self.delim = delim
+        self.encoding = encoding
+        self.fsync = fsync
+        self.names = []  # column names, in the order they are in the file
+        self.nEntries = 0  # entries written to disk so far
+
+        self._queue = Queue()
+        self._rowEnds = []  # byte offset of the end of each row
+        # byte offsets of the end of each cell of each row, from its start
+        self._cellEnds = []
+        self._newlineSize = len(codecs.encode(u'\n', self._rowEncoding))
+        # open the file here so that we fail now if we fail at all
+        if append:
+            self._file = open(self.fileName, 'r+b')
+            self._file.seek(0, os.SEEK_END)
+        else:
+            self._file = open(self.fileName, 'w+b')
+        # our header and rows start after any contents we append to
+        self._start = self._headerEnd = self._file.tell()
+        self._thread = threading.Thread(target=self._run,
+                                        name='WideTextStreamWriter')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __getstate__(self):
+        # the thread and the open file can't be pickled; a reloaded writer
+        # is closed and only records where the data were saved
+        return {'fileName': self.fileName, 'delim': self.delim,
+                'encoding': self.encoding, 'fsync': self.fsync,
+                'names': self.names, 'nEntries': self.nEntries}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._queue = None
+        self._thread = None
+        self._file = None
+
+    @property
+    def _rowEncoding(self):
+        # the byte-order mark (if any) only belongs at the start of the file
+        if self.encoding.lower().replace('_', '-') == 'utf-8-sig':
+            return 'utf-8'
+        return self.encoding
+
+    @property
+    def closed(self):
+        return self._thread is None or not self._thread.is_alive()
+
+    def addEntry(self, entry, names=None):
+        """Queue an entry (a dict of name/value pairs) to be written.
+
+        `names` is the order of all the columns so far; it is used when the
+        entry has names that are not yet in the file.
+        """
+        if self.closed:
+            raise RuntimeError('WideTextStreamWriter for %s is closed'
+                               % self.fileName)
+        self._queue.put((dict(entry), names))
+
+    def flush(self):
+        """Block until all queued entries have been written to disk.
+        """
+        if not self.closed:
+            self._queue.join()
+
+    def close(self):
+        """Write any queued entries, then stop the thread and close the file.
+        """
+        if self.closed:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            entries = [self._queue.get()]
+            # write everything that is waiting in one go
+            while not self._queue.empty():
+                entries.append(self._queue.get())
+            try:
+                for entry in entries:
+                    if entry is _STOP:
+                        stopping = True
+                        continue
+                    # so that one failed entry doesn't stop the others
+                    # (or the writer) from being written
+                    try:
+                        self._write(*entry)
+                    except Exception as err:
+                        logging.error('Failed to write data to %s: %s'
+                                      % (self.fileName, err))
+                self._file.flush()
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+            except Exception as err:
+                logging.error('Failed to write data to %s: %s'
+                              % (self.fileName, err))
+            finally:
+                for entry in entries:
+                    self._queue.task_done()
+        self._file.close()
+        logging.info('saved data to %r' % self.fileName)
+
+    def _write(self, entry, names=None):
+        if any(name not in self.names for name in entry):
+            # the columns so far, in the order given, followed by any
+            # others of the file or the entry
+            newNames = list(names or self.names)
+            for name in list(self.names) + list(entry):
+                if name not in newNames:
+                    newNames.append(name)
+            self._writeHeader(newNames)
+        cells = formatWideTextCells(entry, self.names, self.delim)
+        row = u''.join(cells) + u'\n'
+        rowBytes = row.encode(self._rowEncoding)
+        if len(rowBytes) == len(row):
+            cellSizes = [len(cell) for cell in cells]
+        else:
+            cellSizes = [len(cell.encode(self._rowEncoding))
+                         for cell in cells]
+        cellEnds = array('I')
+        end = 0
+        for size in cellSizes:
+            end += size
+            cellEnds.append(end)
+        self._file.write(rowBytes)
+        self._rowEnds.append(self._file.tell())
+        self._cellEnds.append(cellEnds)
+        self.nEntries += 1
+
+    def _header(self, names):
+        header = u''.join(name + self.delim for name in names) + u'\n'
+        if self._start:
+            # no byte-order mark in the middle of the file
+            return header.encode(self._rowEncoding)
+        return header.encode(self.encoding)
+
+    def _writeHeader(self, names):
+        """(Re)write the header line for the columns `names`, and move the
+        cells of the rows written so far to match.
+        """
+        if not self._rowEnds:
+            self._file.seek(self._start)
+            self._file.truncate()
+            header = self._header(names)
+            self._file.write(header)
+            self._headerEnd = self._start + len(header)
+            self.names = names
+            return
+        self._file.flush()
+        self._file.seek(0)
+        contents = self._file.read()
+        oldIndex = dict((name, i) for i, name in enumerate(self.names))
+        empty = self.delim.encode(self._rowEncoding)
+        newline = contents[self._rowEnds[0] - self._newlineSize:
+                           self._rowEnds[0]]
+        header = self._header(names)
+        rowEnds = []
+        allCellEnds = []
+        tmpName = self.fileName + '.tmp'
+        with open(tmpName, 'wb') as tmp:
+            tmp.write(contents[:self._start])
+            tmp.write(header)
+            rowStart = self._headerEnd
+            for rowEnd, cellEnds in zip(self._rowEnds, self._cellEnds):
+                cellStarts = [0] + list(cellEnds[:-1])
+                row = []
+                newCellEnds = array('I')
+                end = 0
+                for name in names:
+                    i = oldIndex.get(name)
+                    if i is None:
+                        cell = empty
+                    else:
+                        cell = contents[rowStart + cellStarts[i]:
+                                        rowStart + cellEnds[i]]
+                    row.append(cell)
+                    end += len(cell)
+                    newCellEnds.append(end)
+                row.append(newline)
+                tmp.write(b''.join(row))
+                rowEnds.append(tmp.tell())
+                allCellEnds.append(newCellEnds)
+                rowStart = rowEnd
+            # on disk before it replaces the file, so that a crash leaves
+            # either the old file or the new one
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        self._file.close()
+        try:
+            replaceFile(tmpName, self.fileName)
+        finally:
+            # the old file if the new one couldn't replace it
+            self._file = open(self.fileName, 'r+b')
+            self._file.seek(0, os.SEEK_END)
+        self._rowEnds = rowEnds
+        self._cellEnds = allCellEnds
+        self._headerEnd = self._start + len(header)
+        self.names = names
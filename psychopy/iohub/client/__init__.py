@@ -14,6 +14,7 @@ import json
 import signal
 from weakref import proxy
 
+import numpy
 import psutil
 
 try:
@@ -60,7 +61,21 @@ class DeviceRPC(object):
         # for the method return value sent back from the ioHub Server.
         r = self.sendToHub(('EXP_DEVICE', 'DEV_RPC', self.device_class,
                             self.method_name, args, kwargs))
-        
+        return self._processReply(r, args, kwargs)
+
+    def future(self, *args, **kwargs):
+        """Send the device method call request to the ioHub Server without
+        waiting for the reply. Returns an ioHubRPCFuture; its result() is
+        the method return value. Within an ioHubConnection.batch() block the
+        request is sent with the other requests of the batch.
+        """
+        return self.sendToHub(('EXP_DEVICE', 'DEV_RPC', self.device_class,
+                               self.method_name, args, kwargs),
+                              future=True,
+                              convert=lambda r: self._processReply(r, args,
+                                                                   kwargs))
+
+    def _processReply(self, r, args, kwargs):
         if r is None:
             print("r is None:",('EXP_DEVICE', 'DEV_RPC', self.device_class,
                             self.method_name, args, kwargs))
@@ -89,8 +104,12 @@ class DeviceRPC(object):
             conversionMethod = ioHubConnection.eventListToObject
         elif asType == 'namedtuple':
             conversionMethod = ioHubConnection.eventListToNamedTuple
+        elif asType == 'numpy':
+            conversionMethod = None
 
         if self.device_class != 'Experiment':
+            if conversionMethod is None:
+                return ioHubConnection.eventListsToArrays(r)
             return [conversionMethod(el) for el in r]
 
         EVT_TYPE_IX = DeviceEvent.EVENT_TYPE_ID_INDEX
@@ -103,9 +122,81 @@ class DeviceRPC(object):
                 ltext = l[self._log_text_index]
                 llevel = l[self._log_level_index]
                 psycho_logging.log(ltext, llevel, ltime)
+        if conversionMethod is None:
+            return ioHubConnection.eventListsToArrays(r)
         return [conversionMethod(el) for el in r]
 
 
+class ioHubRPCFuture(object):
+    """
+    The pending reply to a request sent to the ioHub Server without waiting
+    for it, as returned by DeviceRPC.future(). Replies are read as they
+    arrive, while waiting for any later request or in result().
+    """
+    def __init__(self, hubClient, convert=None):
+        self._hubClient = hubClient
+        self._convert = convert
+        self._sent = False
+        self._done = False
+        self._reply = None
+
+    def done(self):
+        """True once the reply has been received."""
+        return self._done
+
+    def result(self):
+        """Waits for the reply if needed and returns it. Raises ioHubError
+        if the ioHub Server replied with an error."""
+        if not self._sent:
+            raise RuntimeError('The request is sent when its '
+                               'ioHubConnection.batch() block ends.')
+        # pylint: disable=protected-access
+        while not self._done:
+            if self._hubClient._receiveReply() is None:
+                raise ioHubError('No reply received from the ioHub Server.')
+        reply = self._hubClient._checkReply(self._reply)
+        if self._convert:
+            return self._convert(reply)
+        return reply
+
+    def _setReply(self, reply):
+        self._reply = reply
+        self._done = True
+
+
+class ioHubRPCBatch(object):
+    """
+    Collects the requests made within an ioHubConnection.batch() block, to
+    send them to the ioHub Server in one datagram when the block ends.
+    """
+    def __init__(self, hubClient):
+        self._hubClient = hubClient
+        self.requests = []
+        self.futures = []
+
+    def add(self, tx_data, future=None):
+        self.requests.append(tx_data)
+        self.futures.append(future)
+        return future
+
+    def send(self):
+        if self.requests:
+            requests, futures = self.requests, self.futures
+            self.requests, self.futures = [], []
+            # pylint: disable=protected-access
+            self._hubClient._sendBatch(requests, futures)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # pylint: disable=protected-access
+        if self._hubClient._batch is self:
+            self._hubClient._batch = None
+            self.send()
+        return False
+
+
 # pylint: disable=protected-access
 
 class ioHubDeviceView(object):
@@ -272,6 +363,15 @@ class ioHubConnection(object):
 
         # udp port setup
         self.udp_client = None
+        # reads events from shared memory when the 'shared_memory'
+        # event_transport is used.
+        self._event_reader = None
+        # requests sent without waiting for their reply: request id:
+        # ioHubRPCFuture (or list of them for a batch).
+        self._pending_replies = {}
+        self._last_request_id = 0
+        # the open batch(), if any.
+        self._batch = None
 
         # the dynamically generated object that contains an attribute for
         # each device registered for monitoring with the ioHub server so
@@ -340,6 +440,10 @@ class ioHubConnection(object):
         When events are retrieved from an event buffer, they are removed from
         that buffer as well.
 
+        With the 'shared_memory' event_transport, events from all devices are
+        read from shared memory instead of being requested from the ioHub
+        Process.
+
         If events are only needed from one device instead of all devices,
         providing a valid device name as the device_label argument will
         result in only events from that device being returned.
@@ -353,6 +457,9 @@ class ioHubConnection(object):
             * 'dict': Each event converted to a dict object.
             * 'object': Each event is converted to a DeviceEvent subclass
                         based on the event's type.
+            * 'numpy': A dict of event type id: numpy structured array (with
+                       the event class's NUMPY_DTYPE) of the events of
+                       that type. No Python object is created per event.
 
         Args:
             device_label (str): Name of device to retrieve events for.
@@ -364,9 +471,15 @@ class ioHubConnection(object):
         Returns:
             tuple: List of event objects; object type controlled by 'as_type'.
         """
+        if as_type == 'numpy':
+            return self._getEventArrays(device_label)
+
         r = None
         if device_label is None:
-            events = self._sendToHubServer(('GET_EVENTS',))[1]
+            if self._event_reader:
+                events = self._event_reader.read()
+            else:
+                events = self._sendToHubServer(('GET_EVENTS',))[1]
             if events is None:
                 r = self.allEvents
             else:
@@ -394,6 +507,28 @@ class ioHubConnection(object):
 
         return []
 
+    def _getEventArrays(self, device_label=None):
+        """getEvents(as_type='numpy'); events read from shared memory are
+        not converted to lists at all."""
+        arrays = {}
+        if device_label is None:
+            if self._event_reader:
+                events = self.allEvents
+                arrays = self._event_reader.readArrays()
+            else:
+                events = self._sendToHubServer(('GET_EVENTS',))[1] or []
+                events = self.allEvents + events
+            self.allEvents = []
+        else:
+            dev = self.devices.getDevice(device_label)
+            events = dev.getEvents(asType='list')
+
+        for etype, earray in self.eventListsToArrays(events).items():
+            if etype in arrays:
+                earray = numpy.concatenate((earray, arrays[etype]))
+            arrays[etype] = earray
+        return arrays
+
     def clearEvents(self, device_label='all'):
         """Clears unread events from the ioHub Server's Event Buffer(s)
         so that unneeded events are not discarded.
@@ -420,6 +555,8 @@ class ioHubConnection(object):
         if device_label.lower() == 'all':
             self.allEvents = []
             self._sendToHubServer(('RPC', 'clearEventBuffer', [True, ]))
+            if self._event_reader:
+                self._event_reader.clear()
             try:
                 self.getDevice('keyboard')._clearLocalEvents()
             except:
@@ -427,6 +564,8 @@ class ioHubConnection(object):
         elif device_label in [None, '', False]:
             self.allEvents = []
             self._sendToHubServer(('RPC', 'clearEventBuffer', [False, ]))
+            if self._event_reader:
+                self._event_reader.clear()
             try:
                 self.getDevice('keyboard')._clearLocalEvents()
             except:
@@ -459,6 +598,8 @@ class ioHubConnection(object):
                               is time stamped when this method is called
                               using the global timer (core.getTime()).
 
+        The message is sent without waiting for the ioHub Server to reply.
+
         Returns:
             bool: True
 
@@ -467,7 +608,7 @@ class ioHubConnection(object):
                                              category=category,
                                              msg_offset=offset,
                                              sec_time=sec_time)
-        self._sendToHubServer(('EXP_DEVICE', 'EVENT_TX', [msg_evt, ]))
+        self._postToHubServer(('EXP_DEVICE', 'EVENT_TX', [msg_evt, ]))
         return True
 
     def getHubServerConfig(self):
@@ -783,6 +924,28 @@ class ioHubConnection(object):
         device_class_name, dev_name, _ = r[2]
         return self._addDeviceView(dev_name, device_class_name)
 
+    def batch(self):
+        """Returns a context manager collecting the requests made with
+        DeviceRPC.future() and sendMessageEvent() within its block, which
+        are then sent to the ioHub Server in one datagram when the block
+        ends. For example::
+
+            with io.batch():
+                io.sendMessageEvent('TRIAL_START')
+                position = io.devices.mouse.getPosition.future()
+                reporting = io.devices.keyboard.isReportingEvents.future()
+            print(position.result(), reporting.result())
+
+        Requests made while waiting for the reply (normal device method
+        calls, getEvents(), etc.) first send the requests collected so far,
+        so requests are always handled in the order they were made.
+        A batch() within a batch() block adds to the outer batch.
+        """
+        if self._batch is None:
+            self._batch = ioHubRPCBatch(self)
+            return self._batch
+        return ioHubRPCBatch(self)
+
     def flushDataStoreFile(self):
         """Manually tell the ioDataStore to flush any events it has buffered in
         memory to disk.".
@@ -797,6 +960,47 @@ class ioHubConnection(object):
         r = self._sendToHubServer(('RPC', 'flushIODataStoreFile'))
         return r
 
+    def getDataStoreStats(self):
+        """Returns information about how the ioDataStore is saving events.
+
+        Events are held in memory for each event table and written to the
+        file in chunks (of up to data_store.write_buffer_size events, at
+        least every data_store.write_buffer_interval seconds).
+
+        Args:
+            None
+
+        Returns:
+            dict: with keys 'buffered' (events currently held in memory),
+                  'events_written', 'max_latency' (longest time in sec.
+                  an event waited to be written) and 'tables', a dict with
+                  the counters of each event table: 'buffered', 'size',
+                  'max_buffered', 'events_written', 'writes',
+                  'mean_latency' and 'max_latency'.
+                  None if the ioDataStore is not enabled.
+
+        """
+        r = self._sendToHubServer(('RPC', 'getDataStoreStats'))
+        return r[2]
+
+    def getDeviceMonitorStats(self):
+        """Returns information about how the ioHub Server polls the devices
+        that have a device_timer.
+
+        Args:
+            None
+
+        Returns:
+            dict: device name: dict with keys 'polls' (number of _poll calls),
+                  'empty_polls' (calls that found no new events),
+                  'fileno_wakeups' (calls made because the device's file
+                  descriptor became readable) and 'interval' (the current
+                  polling interval in sec.).
+
+        """
+        r = self._sendToHubServer(('RPC', 'getDeviceMonitorStats'))
+        return r[2]
+
     def startCustomTasklet(self, task_name, task_class_path, **class_kwargs):
         """
         Instruct the iohub server to start running a custom tasklet given
@@ -985,6 +1189,9 @@ class ioHubConnection(object):
         # <<<<< Done starting iohub subprocess
 
         ioHubConnection.ACTIVE_CONNECTION = proxy(self)
+
+        self._initEventReader()
+
         # Send iohub server any existing open psychopy window handles.
         try:
             from psychopy.visual import window
@@ -1033,6 +1240,22 @@ class ioHubConnection(object):
 
         # # <<<< Finished wait for iohub server ready signal ....
 
+    def _initEventReader(self):
+        """Attach to the ioHub Server's shared memory event rings if the
+        'shared_memory' event_transport is in use."""
+        r = self._sendToHubServer(('RPC', 'getEventTransport'))
+        transport, name = r[2]
+        if transport == 'shared_memory':
+            from ..shmem import SharedEventReader
+            try:
+                self._event_reader = SharedEventReader(name)
+            except Exception: # pylint: disable=broad-except
+                # the server then still holds the events in its rings,
+                # so the udp transport can not be used instead.
+                printExceptionDetailsToStdErr()
+                raise ioHubError('Could not open the ioHub Server shared '
+                                 'memory event transport.', name)
+
     def _createDeviceList(self, monitor_devices_config):
         """Create client side iohub device views.
         """
@@ -1128,16 +1351,61 @@ class ioHubConnection(object):
                 r.append(i)
         return r
 
-    def _sendToHubServer(self, tx_data):
+    def _sendToHubServer(self, tx_data, future=False, convert=None):
         """General purpose local <-> iohub server process UDP based
         request - reply code. The method blocks until the request is fulfilled
         and and a response is received from the ioHub server.
 
         Args:
             tx_data (tuple): data to send to iohub server
+            future (bool): If True, do not wait for the response and return
+                           an ioHubRPCFuture for it instead.
+            convert (callable): If given, applied to the response.
 
         Return (object): response from the ioHub Server process.
         """
+        if future:
+            rpc_future = ioHubRPCFuture(self, convert)
+            if self._batch is not None:
+                return self._batch.add(tx_data, rpc_future)
+            request_id = self._nextRequestId()
+            self._pending_replies[request_id] = rpc_future
+            self._sendRequest(('ASYNC', request_id, tx_data))
+            rpc_future._sent = True
+            return rpc_future
+
+        if self._batch is not None:
+            self._batch.send()
+        self._sendRequest(tx_data)
+        result = self._receiveReply()
+        while result is self._pending_replies:
+            result = self._receiveReply()
+        result = self._checkReply(result)
+        if convert:
+            return convert(result)
+        return result
+
+    def _postToHubServer(self, tx_data):
+        """Send a request to the ioHub server without waiting for, or
+        receiving, a response."""
+        if self._batch is not None:
+            self._batch.add(tx_data)
+        else:
+            self._sendRequest(('NO_REPLY', tx_data))
+
+    def _sendBatch(self, requests, futures):
+        request_id = self._nextRequestId()
+        self._pending_replies[request_id] = futures
+        self._sendRequest(('BATCH', request_id, requests))
+        for rpc_future in futures:
+            if rpc_future:
+                rpc_future._sent = True
+
+    def _nextRequestId(self):
+        self._last_request_id += 1
+        return self._last_request_id
+
+    def _sendRequest(self, tx_data):
         try:
             # send request to host, return is # bytes sent.
             #print("SEND:",tx_data)
@@ -1147,7 +1415,11 @@ class ioHubConnection(object):
             traceback.print_exc()
             self.shutdown()
             raise e
-        
+
+    def _receiveReply(self):
+        """Receive the next response from the ioHub server. Responses to
+        requests sent with future=True, or in a batch, are handed to their
+        ioHubRPCFuture and self._pending_replies is returned instead."""
         result = None
         
         try:
@@ -1163,6 +1435,24 @@ class ioHubConnection(object):
             self.shutdown()
             raise e
 
+        if isinstance(result, (list, tuple)) and len(result) == 3:
+            reply_type = result[0]
+            if isinstance(reply_type, bytes):
+                reply_type = unicode(reply_type, 'utf-8')
+            if reply_type == 'ASYNC_RESULT':
+                rpc_future = self._pending_replies.pop(result[1], None)
+                if rpc_future:
+                    rpc_future._setReply(result[2])
+                return self._pending_replies
+            if reply_type == 'BATCH_RESULT':
+                futures = self._pending_replies.pop(result[1], ())
+                for rpc_future, reply in zip(futures, result[2]):
+                    if rpc_future:
+                        rpc_future._setReply(reply)
+                return self._pending_replies
+        return result
+
+    def _checkReply(self, result):
         # check if the reply is an error or not. If it is, raise the error.
         # TODO: This is not really working as planned, in part because iohub
         #       server does not consistently return error responses when needed
@@ -1255,6 +1545,31 @@ class ioHubConnection(object):
         return EventConstants.getClass(etype).createEventAsDict(evt_data)
 
 
+    @staticmethod
+    def eventListsToArrays(events):
+        """Convert a list of ioHub events in list value format into a dict of
+        event type id: numpy structured array of the events of that type."""
+        etype_index = DeviceEvent.EVENT_TYPE_ID_INDEX
+        by_type = {}
+        for evt_data in events:
+            by_type.setdefault(evt_data[etype_index], []).append(evt_data)
+
+        arrays = {}
+        for etype, evt_list in by_type.items():
+            dtype = EventConstants.getClass(etype).NUMPY_DTYPE
+            str_fields = [i for i, n in enumerate(dtype.names)
+                          if dtype[n].kind == 'S']
+            if str_fields:
+                # text attributes are stored utf-8 encoded
+                evt_list = [list(e) for e in evt_list]
+                for e in evt_list:
+                    for i in str_fields:
+                        if isinstance(e[i], unicode):
+                            e[i] = e[i].encode('utf-8')
+            arrays[etype] = numpy.array([tuple(e) for e in evt_list],
+                                        dtype=dtype)
+        return arrays
+
     @staticmethod
     def eventListToNamedTuple(evt_data):
         """Convert an ioHub event currently in list value format into the
@@ -1278,6 +1593,9 @@ class ioHubConnection(object):
                 pass
 
             self._shutdown_attempted = True
+            if self._event_reader:
+                self._event_reader.close()
+                self._event_reader = None
             TimeoutError = psutil.TimeoutExpired
             try:
                 self.udp_client.sendTo(('STOP_IOHUB_SERVER',))
@@ -8,11 +8,15 @@ from __future__ import division, absolute_import, print_function
 
 import os
 import atexit
+import functools
+import threading
+from collections import deque
 import numpy as np
 from builtins import str
 from builtins import object
 from pkg_resources import parse_version
 from ..server import DeviceEvent
+from ..devices import Computer
 from ..constants import EventConstants
 from ..errors import ioHubError, printExceptionDetailsToStdErr, print2err
 
@@ -65,6 +69,204 @@ FILE_VERSION = '0.8.1.1'
 SCHEMA_AUTHORS = 'Sol Simpson'
 SCHEMA_MODIFIED_DATE = 'November 24th, 2016'
 
+getTime = Computer.getTime
+
+
+class EventTableBuffer(object):
+    """Holds the events to be saved to one event table in a preallocated
+    numpy array, so that they can be appended to the table in chunks
+    rather than one row at a time.
+
+    The buffered events are written when the buffer is full, or (see
+    isDue) once the oldest of them has waited `interval` seconds. If a
+    DataStoreWriter is given, the events are handed over to it to be
+    written from its thread.
+    """
+    def __init__(self, table, dtype, size=1024, interval=0.1, writer=None):
+        self.table = table
+        self.writer = writer
+        self.size = max(int(size), 1)
+        self.interval = interval
+        self._rows = np.zeros(self.size, dtype=dtype)
+        self._times = np.zeros(self.size)  # when each event was buffered
+        self.count = 0
+
+        # counters returned by getStats()
+        self.events_written = 0
+        self.writes = 0
+        self.max_count = 0
+        self.max_latency = 0.0
+        self._latency_sum = 0.0
+
+    def add(self, event, ctime):
+        """Buffer an event, writing the buffer to the table if it is full.
+        Returns the number of events written.
+        """
+        self._rows[self.count] = tuple(event)
+        self._times[self.count] = ctime
+        self.count += 1
+        if self.count > self.max_count:
+            self.max_count = self.count
+        if self.count >= self.size:
+            return self.write(ctime)
+        return 0
+
+    def isDue(self, ctime):
+        return self.count > 0 and ctime - self._times[0] >= self.interval
+
+    def write(self, ctime):
+        """Append all buffered events to the table. Returns the number of
+        events written (0 if they were handed over to the writer).
+        """
+        count = self.count
+        if count == 0:
+            return 0
+        if self.writer is not None:
+            # the writer gets copies, as the buffer is reused right away
+            self.count = 0
+            self.writer.put(self, self._rows[:count].copy(),
+                            self._times[:count].copy())
+            return 0
+        try:
+            self.appendRows(self._rows[:count], self._times[:count], ctime)
+        finally:
+            self.count = 0
+        return count
+
+    def appendRows(self, rows, times, ctime=None):
+        """Append rows that were buffered at times to the table."""
+        self.table.append(rows)
+        if ctime is None:
+            ctime = getTime()
+        latency = ctime - times
+        self.max_latency = max(self.max_latency, float(latency.max()))
+        self._latency_sum += float(latency.sum())
+        self.events_written += len(rows)
+        self.writes += 1
+
+    def getStats(self):
+        mean_latency = 0.0
+        if self.events_written:
+            mean_latency = self._latency_sum / self.events_written
+        return dict(buffered=self.count,
+                    size=self.size,
+                    max_buffered=self.max_count,
+                    events_written=self.events_written,
+                    writes=self.writes,
+                    mean_latency=mean_latency,
+                    max_latency=self.max_latency)
+
+
+class DataStoreWriter(object):
+    """Appends the chunks of events handed over by EventTableBuffers to
+    their tables from a separate thread, so that the ioHub Server's device
+    monitoring and event processing never wait on disk I/O.
+
+    At most queue_size chunks wait to be written. overflow_policy sets
+    what happens when the writer falls behind and the queue is full:
+
+        'block': wait until there is room. No events are lost, but the
+                 ioHub Server is stalled meanwhile.
+        'drop':  discard the new chunk of events (counted in the stats).
+        'grow':  queue the chunk anyway, so memory use keeps growing.
+    """
+    OVERFLOW_POLICIES = ('block', 'drop', 'grow')
+
+    def __init__(self, dsfile, queue_size=64, overflow_policy='block'):
+        if overflow_policy not in self.OVERFLOW_POLICIES:
+            raise ValueError("Unknown data_store.writer_overflow_policy: %s;"
+                             " should be one of %s"
+                             % (overflow_policy, self.OVERFLOW_POLICIES))
+        self.dsfile = dsfile
+        self.queue_size = max(int(queue_size), 1)
+        self.overflow_policy = overflow_policy
+        self._chunks = deque()
+        self._state = threading.Condition()
+        self._busy = False
+        self._running = True
+
+        # counters returned by getStats()
+        self.max_queued = 0
+        self.dropped_events = 0
+        self.blocked_time = 0.0
+
+        self._thread = threading.Thread(target=self._run,
+                                        name='ioDataStoreWriter')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def put(self, ebuffer, rows, times):
+        """Queue rows (buffered at times) to be appended to the table of
+        ebuffer. Returns False if they were dropped."""
+        with self._state:
+            if len(self._chunks) >= self.queue_size:
+                if self.overflow_policy == 'drop':
+                    self.dropped_events += len(rows)
+                    return False
+                if self.overflow_policy == 'block':
+                    stime = getTime()
+                    while (len(self._chunks) >= self.queue_size and
+                           self._thread.is_alive()):
+                        self._state.wait()
+                    self.blocked_time += getTime() - stime
+            self._chunks.append((ebuffer, rows, times))
+            self.max_queued = max(self.max_queued, len(self._chunks))
+            self._state.notify_all()
+        return True
+
+    def _run(self):
+        while True:
+            with self._state:
+                while not self._chunks and self._running:
+                    self._state.wait()
+                if not self._chunks:
+                    break  # stopped, and everything has been written
+                ebuffer, rows, times = self._chunks.popleft()
+                self._busy = True
+                self._state.notify_all()
+            try:
+                with self.dsfile._fileLock:
+                    ebuffer.appendRows(rows, times)
+                    self.dsfile.bufferedFlush(len(rows))
+            except Exception:
+                print2err("Error saving events to table: ",
+                          ebuffer.table._v_pathname)
+                printExceptionDetailsToStdErr()
+            finally:
+                with self._state:
+                    self._busy = False
+                    self._state.notify_all()
+
+    def join(self):
+        """Wait until all queued events have been written."""
+        with self._state:
+            while ((self._chunks or self._busy) and
+                   self._thread.is_alive()):
+                self._state.wait()
+
+    def stop(self):
+        """Write the queued events, then end the writer thread."""
+        with self._state:
+            self._running = False
+            self._state.notify_all()
+        self._thread.join()
+
+    def getStats(self):
+        return dict(queued=len(self._chunks),
+                    queue_size=self.queue_size,
+                    max_queued=self.max_queued,
+                    dropped_events=self.dropped_events,
+                    blocked_time=self.blocked_time)
+
+
+def _lockFile(method):
+    """Only access the HDF5 file while the writer thread isn't."""
+    @functools.wraps(method)
+    def _lockedMethod(self, *args, **kwargs):
+        with self._fileLock:
+            return method(self, *args, **kwargs)
+    return _lockedMethod
+
 
 class DataStoreFile(object):
     def __init__(self, fileName, folderPath, fmode='a', iohub_settings=None):
@@ -83,6 +285,15 @@ class DataStoreFile(object):
         self.flushCounter = self.settings.get('flush_interval', 32)
         self._eventCounter = 0
 
+        # events are written to each table in chunks of up to
+        # write_buffer_size events, at least every write_buffer_interval sec.
+        self.writeBufferSize = self.settings.get('write_buffer_size', 1024)
+        self.writeBufferInterval = self.settings.get('write_buffer_interval',
+                                                     0.1)
+        self._eventBuffers = dict()
+        self._fileLock = threading.RLock()
+        self._writer = None
+
         self.TABLES = dict()
         self._eventGroupMappings = dict()
         self.emrtFile = open_file(self.filePath, mode=fmode)
@@ -95,6 +306,12 @@ class DataStoreFile(object):
         else:
             self.loadTableMappings()
 
+        if self.settings.get('writer_thread', True):
+            self._writer = DataStoreWriter(
+                self,
+                self.settings.get('writer_queue_size', 64),
+                self.settings.get('writer_overflow_policy', 'block'))
+
     def loadTableMappings(self):
         # create meta-data tables
         self.TABLES['EXPERIMENT_METADETA']=self.emrtFile.root.data_collection.experiment_meta_data
@@ -184,13 +401,8 @@ class DataStoreFile(object):
                                       title=egtitle)
             return datevts_node._f_get_child(evt_group_label)
 
+    @_lockFile
     def updateDataStoreStructure(self, device_instance, event_class_dict):
-        dfilter = tables.Filters(
-            complevel=0,
-            complib='zlib',
-            shuffle=False,
-            fletcher32=False)
-
         for event_cls_name, event_cls in event_class_dict.items():
             if event_cls.IOHUB_DATA_TABLE:
                 event_table_label = event_cls.IOHUB_DATA_TABLE
@@ -203,7 +415,8 @@ class DataStoreFile(object):
                             title='%s Data' %
                             (device_instance.__class__.__name__,
                              ),
-                            filters=dfilter.copy())
+                            **getEventTableOptions(self.settings,
+                                                   event_table_label))
                         self.flush()
                     except tables.NodeError:
                         self.TABLES[event_table_label] = self.groupNodeForEvent(event_cls)._f_get_child(self.eventTableLabel2ClassName(event_table_label))
@@ -242,6 +455,7 @@ class DataStoreFile(object):
                             self.eventTableLabel2ClassName(event_table_label)))
                     print2err('----------------------------------------------')
 
+    @_lockFile
     def addClassMapping(self,ioClass,ctable):
         names = [
             x['class_id'] for x in self.TABLES['CLASS_TABLE_MAPPINGS'].where(
@@ -256,6 +470,7 @@ class DataStoreFile(object):
             trow.append()
             self.flush()
 
+    @_lockFile
     def createOrUpdateExperimentEntry(self,experimentInfoList):
         experiment_metadata = self.TABLES['EXPERIMENT_METADETA']
         result = [row for row in experiment_metadata.iterrows() if row[
@@ -274,6 +489,7 @@ class DataStoreFile(object):
         self.flush()
         return self.active_experiment_id
 
+    @_lockFile
     def createExperimentSessionEntry(self, sessionInfoDict):
         session_metadata = self.TABLES['SESSION_METADETA']
         max_id = 0
@@ -294,6 +510,7 @@ class DataStoreFile(object):
         self.flush()
         return self.active_session_id
 
+    @_lockFile
     def initConditionVariableTable(
             self, experiment_id, session_id, np_dtype):
         expcv_table = None
@@ -340,6 +557,7 @@ class DataStoreFile(object):
         return True
 
 
+    @_lockFile
     def extendConditionVariableTable(self, experiment_id, session_id, data):
         if self._EXP_COND_DTYPE is None:
             return False
@@ -375,6 +593,7 @@ class DataStoreFile(object):
             return False
         return True
 
+    @_lockFile
     def checkIfSessionCodeExists(self, sessionCode):
         if self.emrtFile:
             sessionsForExperiment = self.emrtFile.root.data_collection.session_meta_data.where(
@@ -385,19 +604,35 @@ class DataStoreFile(object):
                 return True
             return False
 
+    def getEventBuffer(self, eventClass):
+        """Returns the EventTableBuffer that events of eventClass are
+        saved through, creating it if needed."""
+        table_label = eventClass.IOHUB_DATA_TABLE
+        ebuffer = self._eventBuffers.get(table_label)
+        if ebuffer is None:
+            ebuffer = EventTableBuffer(self.TABLES[table_label],
+                                       eventClass.NUMPY_DTYPE,
+                                       self.writeBufferSize,
+                                       self.writeBufferInterval,
+                                       self._writer)
+            self._eventBuffers[table_label] = ebuffer
+        return ebuffer
+
     def _handleEvent(self, event):
         try:
             if self.checkForExperimentAndSessionIDs(event) is False:
                 return False
             etype = event[DeviceEvent.EVENT_TYPE_ID_INDEX]
             eventClass = EventConstants.getClass(etype)
-            etable = self.TABLES[eventClass.IOHUB_DATA_TABLE]
+            ebuffer = self.getEventBuffer(eventClass)
             event[DeviceEvent.EVENT_EXPERIMENT_ID_INDEX] = self.active_experiment_id
             event[DeviceEvent.EVENT_SESSION_ID_INDEX] = self.active_session_id
 
-            np_array = np.array([tuple(event), ], dtype=eventClass.NUMPY_DTYPE)
-            etable.append(np_array)
-            self.bufferedFlush()
+            ctime = getTime()
+            written = ebuffer.add(event, ctime)
+            written += self._writeEventBuffers(ctime)
+            if written:
+                self.bufferedFlush(written)
         except Exception:
             print2err("Error saving event: ", event)
             printExceptionDetailsToStdErr()
@@ -411,22 +646,59 @@ class DataStoreFile(object):
 
             etype = event[DeviceEvent.EVENT_TYPE_ID_INDEX]
             eventClass = EventConstants.getClass(etype)
-            etable = self.TABLES[eventClass.IOHUB_DATA_TABLE]
+            ebuffer = self.getEventBuffer(eventClass)
 
-            np_events = []
+            ctime = getTime()
+            written = 0
             for event in events:
                 event[DeviceEvent.EVENT_EXPERIMENT_ID_INDEX] = self.active_experiment_id
                 event[DeviceEvent.EVENT_SESSION_ID_INDEX] = self.active_session_id
-                np_events.append(tuple(event))
-
-            np_array = np.array(np_events, dtype=eventClass.NUMPY_DTYPE)
-            etable.append(np_array)
-            self.bufferedFlush(len(np_events))
+                written += ebuffer.add(event, ctime)
+            written += self._writeEventBuffers(ctime)
+            if written:
+                self.bufferedFlush(written)
         except ioHubError as e:
             print2err(e)
         except Exception:
             printExceptionDetailsToStdErr()
 
+    def _writeEventBuffers(self, ctime, force=False):
+        written = 0
+        for ebuffer in self._eventBuffers.values():
+            if force or ebuffer.isDue(ctime):
+                try:
+                    written += ebuffer.write(ctime)
+                except Exception:
+                    print2err("Error saving events to table: ",
+                              ebuffer.table._v_pathname)
+                    printExceptionDetailsToStdErr()
+        return written
+
+    def writeBufferedEvents(self, force=False):
+        """Write the buffered events of each table that are due to be
+        written, or all of them if force is True. Called regularly by the
+        ioHub Server so that events do not wait longer than
+        write_buffer_interval when no new events arrive."""
+        written = self._writeEventBuffers(getTime(), force)
+        if written:
+            self.bufferedFlush(written)
+        return written
+
+    def getStats(self):
+        """Returns a dict with the buffer occupancy and write latency
+        counters (in sec.) of each event table, by table label, along with
+        the totals for all tables."""
+        table_stats = dict()
+        for table_label, ebuffer in self._eventBuffers.items():
+            table_stats[table_label] = ebuffer.getStats()
+        totals = table_stats.values()
+        return dict(tables=table_stats,
+                    buffered=sum(t['buffered'] for t in totals),
+                    events_written=sum(t['events_written'] for t in totals),
+                    max_latency=max([t['max_latency'] for t in totals] or
+                                    [0.0]),
+                    writer=self._writer and self._writer.getStats())
+
     def bufferedFlush(self,eventCount=1):
         """
         If flushCounter threshold is >=0 then do some checks. If it is < 0,
@@ -435,16 +707,29 @@ class DataStoreFile(object):
         """
         if self.flushCounter >= 0:
             if self.flushCounter == 0:
-                self.flush()
+                self._flushFile()
                 return True
             if self.flushCounter <= self._eventCounter:
-                self.flush()
+                self._flushFile()
                 self._eventCounter = 0
                 return True
             self._eventCounter += eventCount
             return False
 
     def flush(self):
+        """Write all buffered events (waiting for the writer thread to do
+        so, if used), then flush the file."""
+        try:
+            if self.emrtFile:
+                self._writeEventBuffers(getTime(), force=True)
+                if self._writer:
+                    self._writer.join()
+        except Exception:
+            printExceptionDetailsToStdErr()
+        self._flushFile()
+
+    @_lockFile
+    def _flushFile(self):
         try:
             if self.emrtFile:
                 self.emrtFile.flush()
@@ -455,8 +740,12 @@ class DataStoreFile(object):
 
     def close(self):
         self.flush()
+        if self._writer:
+            self._writer.stop()
+            self._writer = None
         self._activeRunTimeConditionVariableTable = None
-        self.emrtFile.close()
+        with self._fileLock:
+            self.emrtFile.close()
 
     def __del__(self):
         try:
@@ -486,6 +775,64 @@ def close_open_data_files(verbose):
 registered_close_open_data_files = True
 atexit.register(close_open_data_files, False)
 
+# The event table settings used for any that are not given by the
+# event_table_profile or event_tables data_store settings: uncompressed
+# tables, chunked for the PyTables default of 10000 rows.
+DEFAULT_EVENT_TABLE_SETTINGS = dict(complib='zlib', complevel=0,
+                                    shuffle=False, bitshuffle=False,
+                                    fletcher32=False, expectedrows=10000,
+                                    chunkshape=None)
+
+
+def getEventTableSettings(settings, table_label):
+    """Returns the compression and chunking settings for the event table
+    with the given label: those of the event_table_profile chosen from the
+    event_table_profiles, updated with any event_tables settings for the
+    table label."""
+    table_settings = dict(DEFAULT_EVENT_TABLE_SETTINGS)
+    profile_name = settings.get('event_table_profile', 'default')
+    profiles = settings.get('event_table_profiles') or {}
+    if profile_name not in profiles and profile_name != 'default':
+        print2err('WARNING: data_store event_table_profile {0} is not one '
+                  'of the event_table_profiles {1}. Using default.'.format(
+                      profile_name, sorted(profiles)))
+    table_settings.update(profiles.get(profile_name) or {})
+    table_settings.update(
+        (settings.get('event_tables') or {}).get(table_label) or {})
+    return table_settings
+
+
+def getEventTableOptions(settings, table_label):
+    """Returns the filters, expectedrows and chunkshape keyword arguments
+    to create the event table with the given label with, see
+    getEventTableSettings."""
+    table_settings = getEventTableSettings(settings, table_label)
+    filter_args = dict(complevel=table_settings['complevel'],
+                       complib=table_settings['complib'],
+                       shuffle=table_settings['shuffle'],
+                       fletcher32=table_settings['fletcher32'])
+    if table_settings['bitshuffle']:
+        filter_args['bitshuffle'] = True
+    try:
+        filters = tables.Filters(**filter_args)
+    except (ValueError, TypeError) as e:
+        print2err('WARNING: invalid compression settings for event table '
+                  '{0}: {1}. The table will not be compressed.'.format(
+                      table_label, e))
+        filters = tables.Filters(complevel=0)
+    if filters.complevel and not tables.which_lib_version(
+            filters.complib.split(':')[0]):
+        print2err('WARNING: compression library {0} is not available. '
+                  'Event table {1} will not be compressed.'.format(
+                      filters.complib, table_label))
+        filters = tables.Filters(complevel=0)
+
+    options = dict(filters=filters,
+                   expectedrows=int(table_settings['expectedrows']))
+    if table_settings['chunkshape']:
+        options['chunkshape'] = (int(table_settings['chunkshape']),)
+    return options
+
 ## ---------------------- Pytable Definitions ------------------- ##
 
 
@@ -12,8 +12,10 @@ from builtins import object
 import numbers  # numbers.Integral is like (int, long) but supports Py3
 from tables import *
 import os
+import operator
 from collections import namedtuple
 import json
+import numpy as np
 
 from ..errors import print2err
 
@@ -35,6 +37,25 @@ else:
 
 _hubFiles = []
 
+# Comparisons used in condition variable filters and in the start and end
+# conditions of getEventAttributeValues that can be applied to whole columns.
+_columnComparisons = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda column, value: np.isin(column, value),
+    'not in': lambda column, value: ~np.isin(column, value),
+}
+
+# File formats that ExperimentDataAccessUtility.exportTrialEvents can save.
+exportFileFormats = {
+    '.parquet': 'parquet',
+    '.feather': 'feather',
+}
+
 def openHubFile(filepath, filename, mode):
     """
     Open an HDF5 DataStore file and register it so that it is closed even on interpreter crash.
@@ -45,6 +66,75 @@ def openHubFile(filepath, filename, mode):
     return hubFile
 
 
+def _encodeStrings(value):
+    # Strings are saved to the DataStore file as bytes.
+    if isinstance(value, (list, tuple)):
+        return [_encodeStrings(v) for v in value]
+    if isinstance(value, basestring) and not isinstance(value, bytes):
+        return value.encode('utf-8')
+    return value
+
+
+def _exportHubFile(exportJob):
+    hdfFilePath, outputPath, exportArgs = exportJob
+    dataAccessUtil = ExperimentDataAccessUtility(*os.path.split(hdfFilePath))
+    try:
+        return dataAccessUtil.exportTrialEvents(outputPath, **exportArgs)
+    finally:
+        dataAccessUtil.close()
+
+
+def exportHubFiles(
+        hdfFilePaths,
+        outputDir,
+        event_type_id,
+        trialStartVar,
+        trialEndVar,
+        event_attribute_names=None,
+        fileFormat='parquet',
+        processes=None):
+    """
+    Save the events of each trial in each of the DataStore files to a
+    Parquet or Feather file of the same name in outputDir, see
+    ExperimentDataAccessUtility.exportTrialEvents. The files are exported
+    in parallel by a pool of processes.
+
+    Args:
+        hdfFilePaths (list): The paths of the DataStore HDF5 files to export.
+
+        outputDir (str): The directory to save the exported files in.
+
+        processes (int): The number of processes to use. Default is the number of cpus. If 1, the files are exported by the calling process.
+
+        See ExperimentDataAccessUtility.exportTrialEvents for the other arguments.
+
+    Returns:
+        list: The paths of the exported files, in the order of hdfFilePaths.
+    """
+    exportArgs = dict(event_type_id=event_type_id,
+                      trialStartVar=trialStartVar,
+                      trialEndVar=trialEndVar,
+                      event_attribute_names=event_attribute_names,
+                      fileFormat=fileFormat)
+    exportJobs = []
+    for hdfFilePath in hdfFilePaths:
+        fileName = os.path.splitext(os.path.basename(hdfFilePath))[0]
+        exportJobs.append(
+            (hdfFilePath,
+             os.path.join(outputDir, '%s.%s' % (fileName, fileFormat)),
+             exportArgs))
+
+    if processes == 1 or len(exportJobs) < 2:
+        return [_exportHubFile(job) for job in exportJobs]
+    import multiprocessing
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(_exportHubFile, exportJobs)
+    finally:
+        pool.close()
+        pool.join()
+
+
 def displayDataFileSelectionDialog(starting_dir=None):
     """Shows a FileDialog and lets you select a .hdf5 file to open for
     processing."""
@@ -146,6 +236,8 @@ class ExperimentDataAccessUtility(object):
         self._experimentCode = experimentCode
         self._sessionCodes = sessionCodes
         self._lastWhereClause = None
+        self._eventArrays = dict()
+        self._conditionVariablesArray = None
 
         try:
             self.hdfFile = openHubFile(hdfFilePath, hdfFileName, mode)
@@ -350,41 +442,153 @@ class ExperimentDataAccessUtility(object):
     def getConditionVariables(self, filter=None):
         """
         **Docstr TBC.**
+
+        The condition variables table is read from the DataStore file once,
+        and each filter condition is applied to a whole column at a time.
         """
         if filter is None:
-            session_ids = []
-            for s in self.getExperimentMetaData()[0].sessions:
-                session_ids.append(s.session_id)
-            filter = dict(session_id=(' in ', session_ids))
-
-        ConditionSetInstance = None
-
-        for conditionVarName, conditionVarComparitor in filter.items():
-            avComparison, value = conditionVarComparitor
-
-            cv_group = self.hdfFile.root.data_collection.condition_variables
-            cvrows = []
-            ecv = "EXP_CV_%d" % (self._experimentID,)
-            if ecv in cv_group._v_leaves:
-                ecvTable = cv_group._v_leaves[ecv]
-
-                if ConditionSetInstance is None:
-                    colnam = ecvTable.colnames
-                    ConditionSetInstance = namedtuple('ConditionSetInstance', colnam)
-
-                cvrows.extend(
-                    [
-                        ConditionSetInstance(
-                            *
-                            r[:]) for r in ecvTable if all(
-                            [
-                                eval(
-                                    '{0} {1} {2}'.format(
-                                        r[conditionVarName],
-                                        conditionVarComparitor[0],
-                                        conditionVarComparitor[1])) for conditionVarName,
-                                conditionVarComparitor in filter.items()])])
-        return cvrows
+            cvArray = self.getConditionVariablesArray()
+        else:
+            cvArray = self._readConditionVariablesTable()
+            if cvArray is not None:
+                cvArray = cvArray[self._getColumnMask(
+                    cvArray,
+                    [(name, comparison, value) for name, (comparison, value)
+                     in filter.items()])]
+        if cvArray is None:
+            return []
+        ConditionSetInstance = namedtuple('ConditionSetInstance',
+                                          cvArray.dtype.names)
+        return [ConditionSetInstance(*r) for r in cvArray.tolist()]
+
+    def getConditionVariablesArray(self):
+        """Returns the condition variable values saved for the sessions in
+        use as a numpy structured array, with one row per trial.
+
+        The condition variables table is read from the DataStore file
+        the first time it is needed and then cached, so the returned array
+        must not be modified.
+
+        Returns:
+            numpy.ndarray: the condition variable rows, or None if the
+            DataStore file has no condition variables.
+        """
+        cvArray = self._readConditionVariablesTable()
+        if cvArray is None:
+            return None
+        sessionField = self._getFieldName(cvArray.dtype.names, 'session_id')
+        return cvArray[np.isin(cvArray[sessionField], self._getSessionIds())]
+
+    def getEventTableArray(self, event_type_id):
+        """Returns the events of the given type saved for the sessions in
+        use as a numpy structured array, sorted by session_id and then by
+        time.
+
+        The event table is read from the DataStore file the first time it
+        is needed and then cached, so that queries for trials, sessions or
+        attributes of the same event type do not read the file again. The
+        returned array must not be modified.
+
+        Args:
+            event_type_id (int): The iohub EventConstants id of the event type.
+
+        Returns:
+            numpy.ndarray: the events of the given type.
+        """
+        events = self._getEventArray(event_type_id)
+        return events[np.isin(events['session_id'], self._getSessionIds())]
+
+    def _readConditionVariablesTable(self):
+        if self._conditionVariablesArray is None:
+            ecvTable = self.getConditionVariablesTable()
+            if ecvTable is None:
+                return None
+            self._conditionVariablesArray = ecvTable.read()
+        return self._conditionVariablesArray
+
+    def _getEventArray(self, event_type_id):
+        # All the events of the type saved for the experiment, in session
+        # and time order, so sessions and times can be binary searched.
+        if event_type_id not in self._eventArrays:
+            events = self._getEventTableForType(event_type_id).read()
+            events = events[(events['type'] == event_type_id) &
+                            (events['experiment_id'] == self._experimentID)]
+            order = np.lexsort((events['time'], events['session_id']))
+            self._eventArrays[event_type_id] = events[order]
+        return self._eventArrays[event_type_id]
+
+    def _getEventTableForType(self, event_type_id):
+        klassTables = self.hdfFile.root.class_table_mapping
+        result = [
+            row.fetch_all_fields() for row in klassTables.where(
+                '(class_id == %d) & (class_type_id == 1)' %
+                (event_type_id))]
+        if len(result) != 1:
+            raise ExperimentDataAccessException("event_type_id passed to getEventAttribute should only return one row from CLASS_MAPPINGS.")
+        tablePathString = result[0][3]
+        if isinstance(tablePathString, bytes):
+            tablePathString = tablePathString.decode('utf-8')
+        return getattr(self.hdfFile, get_node)(tablePathString)
+
+    def _getSessionIds(self):
+        return [s.session_id for s in self.getSessionMetaData()]
+
+    @staticmethod
+    def _getFieldName(names, name):
+        # Condition variable tables save the experiment and session ids as
+        # EXPERIMENT_ID and SESSION_ID, so names are matched ignoring case.
+        if name in names:
+            return name
+        for n in names:
+            if n.lower() == name.lower():
+                return n
+        raise ExperimentDataAccessException(
+            '{0} is not a valid attribute name in {1}'.format(name, names))
+
+    @staticmethod
+    def _getSessionRange(events, session_id):
+        sessions = events['session_id']
+        return (np.searchsorted(sessions, session_id, 'left'),
+                np.searchsorted(sessions, session_id, 'right'))
+
+    def _getColumnMask(self, array, conditions):
+        """Returns a boolean array that is True for the rows of array that
+        match all of the (attribute name, comparison, value) conditions.
+        """
+        mask = np.ones(len(array), dtype=bool)
+        for name, comparison, value in conditions:
+            column = array[self._getFieldName(array.dtype.names, name)]
+            compare = _columnComparisons.get(comparison.strip())
+            if compare is None:
+                mask &= np.array([eval('{0} {1} {2}'.format(v, comparison,
+                                                            value))
+                                  for v in column.tolist()], dtype=bool)
+                continue
+            if column.dtype.kind == 'S':
+                value = _encodeStrings(value)
+            mask &= compare(column, value)
+        return mask
+
+    @staticmethod
+    def _getTimeRange(times, conditions):
+        """Returns the start and end of the range of the sorted times that
+        match the time conditions, and the conditions that are not on time.
+        """
+        start, end = 0, len(times)
+        otherConditions = []
+        for name, comparison, value in conditions:
+            comparison = comparison.strip()
+            if (name != 'time' or comparison not in ('<', '<=', '>', '>=') or
+                    not isinstance(value, numbers.Real)):
+                otherConditions.append((name, comparison, value))
+                continue
+            side = 'left' if comparison in ('>=', '<') else 'right'
+            i = np.searchsorted(times, value, side)
+            if comparison in ('>', '>='):
+                start = max(start, i)
+            else:
+                end = min(end, i)
+        return start, max(start, end), otherConditions
 
     def getValuesForVariables(self, cv, value, cvNames):
         """
@@ -430,6 +634,13 @@ class ExperimentDataAccessUtility(object):
         """
         **Docstr TBC.**
 
+        The event table is read once, see getEventTableArray, and the
+        events of each condition variable row are found by binary searching
+        the session and, for start and end conditions on the event time,
+        the time of the events, rather than by querying the table per row.
+        Rows of the same session with no start or end conditions share the
+        same value arrays.
+
         Args:
             event_type_id
             event_attribute_names
@@ -441,18 +652,10 @@ class ExperimentDataAccessUtility(object):
             Values for the specified event type and event attribute columns which match the provided experiment condition variable filter, starting condition filer, and ending condition filter criteria.
         """
         if self.hdfFile:
-            klassTables = self.hdfFile.root.class_table_mapping
+            if not isinstance(event_attribute_names, (list, tuple)):
+                event_attribute_names = [event_attribute_names, ]
 
-            deviceEventTable = None
-
-            result = [
-                row.fetch_all_fields() for row in klassTables.where(
-                    '(class_id == %d) & (class_type_id == 1)' %
-                    (event_type_id))]
-            if len(result) is not 1:
-                raise ExperimentDataAccessException("event_type_id passed to getEventAttribute should only return one row from CLASS_MAPPINGS.")
-            tablePathString = result[0][3]
-            deviceEventTable = getattr(self.hdfFile, get_node)(tablePathString)
+            deviceEventTable = self._getEventTableForType(event_type_id)
 
             for ename in event_attribute_names:
                 if ename not in deviceEventTable.colnames:
@@ -460,101 +663,229 @@ class ExperimentDataAccessUtility(object):
                         'getEventAttribute: %s does not have a column named %s' %
                         (deviceEventTable.title, event_attribute_names))
 
-            resultSetList = []
-
             csier = list(event_attribute_names)
             csier.append('query_string')
             csier.append('condition_set')
             EventAttributeResults = namedtuple('EventAttributeResults', csier)
 
-            if deviceEventTable is not None:
-                if not isinstance(event_attribute_names, (list, tuple)):
-                    event_attribute_names = [event_attribute_names, ]
+            if conditionVariablesFilter is None:
+                filteredConditionVariableList = self.getConditionVariables()
+            else:
+                filteredConditionVariableList = self.getConditionVariables(
+                    conditionVariablesFilter)
+
+            cvNames = self.getConditionVariableNames()
+            if not filteredConditionVariableList:
+                return []
+            sessionField = self._getFieldName(
+                filteredConditionVariableList[0]._fields, 'session_id')
 
-                filteredConditionVariableList = None
-                if conditionVariablesFilter is None:
-                    filteredConditionVariableList= self.getConditionVariables()
+            events = self._getEventArray(event_type_id)
+            sessionEvents = dict()
+            sessionValues = dict()
+
+            resultSetList = []
+            for cv in filteredConditionVariableList:
+                session_id = getattr(cv, sessionField)
+                if session_id not in sessionEvents:
+                    start, end = self._getSessionRange(events, session_id)
+                    sevents = events[start:end]
+                    if filter_id is not None:
+                        sevents = sevents[sevents['filter_id'] == filter_id]
+                    sessionEvents[session_id] = sevents
+
+                wclause = '( experiment_id == {0} ) & ( session_id == {1} )'.format(
+                    self._experimentID, session_id)
+
+                wclause += ' & ( type == {0} ) '.format(event_type_id)
+
+                if filter_id is not None:
+                    wclause += '& ( filter_id == {0} ) '.format(filter_id)
+
+                conditions = []
+                # start Conditions need to be added to where clause
+                if startConditions is not None:
+                    wclause += '& ('
+                    for conditionAttributeName, conditionAttributeComparitor in startConditions.items():
+                        avComparison,value=conditionAttributeComparitor
+                        value = self.getValuesForVariables(
+                            cv, value, cvNames)
+                        wclause += ' ( {0} {1} {2} ) & '.format(
+                            conditionAttributeName, avComparison, value)
+                        conditions.append(
+                            (conditionAttributeName, avComparison, value))
+                    wclause=wclause[:-3]
+                    wclause += ' ) '
+
+                # end Conditions need to be added to where clause
+                if endConditions is not None:
+                    wclause += ' & ('
+                    for conditionAttributeName, conditionAttributeComparitor in endConditions.items():
+                        avComparison,value=conditionAttributeComparitor
+                        value = self.getValuesForVariables(
+                            cv, value, cvNames)
+                        wclause += ' ( {0} {1} {2} ) & '.format(
+                            conditionAttributeName, avComparison, value)
+                        conditions.append(
+                            (conditionAttributeName, avComparison, value))
+                    wclause=wclause[:-3]
+                    wclause += ' ) '
+
+                if conditions:
+                    sevents = sessionEvents[session_id]
+                    start, end, conditions = self._getTimeRange(
+                        sevents['time'], conditions)
+                    sevents = sevents[start:end]
+                    if conditions:
+                        sevents = sevents[self._getColumnMask(sevents,
+                                                              conditions)]
+                    values = [np.array(sevents[ename])
+                              for ename in event_attribute_names]
                 else:
-                    filteredConditionVariableList = self.getConditionVariables(
-                        conditionVariablesFilter)
+                    if session_id not in sessionValues:
+                        sessionValues[session_id] = [
+                            np.array(sessionEvents[session_id][ename])
+                            for ename in event_attribute_names]
+                    values = sessionValues[session_id]
 
-                cvNames = self.getConditionVariableNames()
+                resultSetList.append(
+                    EventAttributeResults(*(values + [wclause, cv])))
 
-                # no further where clause building needed; get reseults and
-                # return
-                if startConditions is None and endConditions is None:
-                    for cv in filteredConditionVariableList:
+            return resultSetList
 
-                        wclause = '( experiment_id == {0} ) & ( session_id == {1} )'.format(
-                            self._experimentID, cv.session_id)
+    def getTrialEvents(
+            self,
+            event_type_id,
+            trialStartVar,
+            trialEndVar,
+            event_attribute_names=None,
+            conditionVariablesFilter=None):
+        """Returns the events of the given type that occurred during each
+        trial, joined with the condition variable values of the trial.
+
+        A trial is a row of the condition variables table. An event is part
+        of a trial if it is from the trial's session and its time is
+        between the values of the trialStartVar and trialEndVar condition
+        variables, inclusive. The trials of a session must not overlap.
+
+        Events are matched to trials by binary searching the sorted trial
+        start times of each session with the sorted event times, so all the
+        trials of a file are joined in one pass over the event table.
 
-                        wclause += ' & ( type == {0} ) '.format(event_type_id)
+        Args:
+            event_type_id (int): The iohub EventConstants id of the event type.
 
-                        if filter_id is not None:
-                            wclause += '& ( filter_id == {0} ) '.format(
-                                filter_id)
+            trialStartVar (str): The condition variable holding the time each trial started.
 
-                        resultSetList.append([])
+            trialEndVar (str): The condition variable holding the time each trial ended.
 
-                        for ename in event_attribute_names:
-                            resultSetList[-1].append(getattr(deviceEventTable, read_where)(wclause, field=ename))
-                        resultSetList[-1].append(wclause)
-                        resultSetList[-1].append(cv)
+            event_attribute_names (list): The event attributes to return. Default is all of them.
 
-                        eventAttributeResults = EventAttributeResults(
-                            *resultSetList[-1])
-                        resultSetList[-1]=eventAttributeResults
+            conditionVariablesFilter (dict): Which trials to use, as for getConditionVariables. Default is all the trials of the sessions in use.
 
-                    return resultSetList
+        Returns:
+            numpy.ndarray: A structured array with a row per event, holding the event attributes followed by the condition variables of the event's trial. Condition variables with the same name as an event attribute are prefixed with 'cv_'.
+        """
+        events = self._getEventArray(event_type_id)
+        if event_attribute_names is None:
+            event_attribute_names = events.dtype.names
+        for ename in event_attribute_names:
+            if ename not in events.dtype.names:
+                raise ExperimentDataAccessException(
+                    'getTrialEvents: events do not have a column named %s' %
+                    (ename,))
 
-                #start or end conditions exist....
-                for cv in filteredConditionVariableList:
-                    resultSetList.append([])
+        if conditionVariablesFilter is None:
+            cvArray = self.getConditionVariablesArray()
+        else:
+            cvArray = self._readConditionVariablesTable()
+            if cvArray is not None:
+                cvArray = cvArray[self._getColumnMask(
+                    cvArray,
+                    [(name, comparison, value) for name, (comparison, value)
+                     in conditionVariablesFilter.items()])]
+        if cvArray is None:
+            raise ExperimentDataAccessException(
+                'getTrialEvents: the DataStore file has no condition variables.')
+        cvFields = cvArray.dtype.names
+        sessionField = self._getFieldName(cvFields, 'session_id')
+        startField = self._getFieldName(cvFields, trialStartVar)
+        endField = self._getFieldName(cvFields, trialEndVar)
+        cvArray = cvArray[np.lexsort((cvArray[startField],
+                                      cvArray[sessionField]))]
+
+        eventRows = [np.empty(0, dtype=np.intp)]
+        trialRows = [np.empty(0, dtype=np.intp)]
+        for session_id in np.unique(cvArray[sessionField]):
+            trialStart = np.searchsorted(cvArray[sessionField], session_id,
+                                         'left')
+            trialEnd = np.searchsorted(cvArray[sessionField], session_id,
+                                       'right')
+            trials = cvArray[trialStart:trialEnd]
+            start, end = self._getSessionRange(events, session_id)
+            times = events['time'][start:end]
+
+            trial = np.searchsorted(trials[startField], times, 'right') - 1
+            inTrial = trial >= 0
+            inTrial[inTrial] = times[inTrial] <= trials[endField][
+                trial[inTrial]]
+            eventRows.append(start + np.flatnonzero(inTrial))
+            trialRows.append(trialStart + trial[inTrial])
+        eventRows = np.concatenate(eventRows)
+        trialRows = np.concatenate(trialRows)
+
+        cvNames = [('cv_' + n if n in event_attribute_names else n, n)
+                   for n in cvFields]
+        dtype = [(n, events.dtype[n]) for n in event_attribute_names]
+        dtype.extend((name, cvArray.dtype[n]) for name, n in cvNames)
+        trialEvents = np.empty(len(eventRows), dtype=dtype)
+        for n in event_attribute_names:
+            trialEvents[n] = events[n][eventRows]
+        for name, n in cvNames:
+            trialEvents[name] = cvArray[n][trialRows]
+        return trialEvents
+
+    def exportTrialEvents(
+            self,
+            filePath,
+            event_type_id,
+            trialStartVar,
+            trialEndVar,
+            event_attribute_names=None,
+            conditionVariablesFilter=None,
+            fileFormat=None):
+        """Saves the events of each trial, as returned by getTrialEvents, to
+        a Parquet or Feather file. Requires pandas, and pyarrow or another
+        pandas Parquet / Feather engine.
 
-                    wclause = '( experiment_id == {0} ) & ( session_id == {1} )'.format(
-                        self._experimentID, cv.session_id)
+        Args:
+            filePath (str): The file to save.
 
-                    wclause += ' & ( type == {0} ) '.format(event_type_id)
+            fileFormat (str): 'parquet' or 'feather'. Default is given by the filePath extension.
 
-                    if filter_id is not None:
-                        wclause += '& ( filter_id == {0} ) '.format(filter_id)
-
-                    # start Conditions need to be added to where clause
-                    if startConditions is not None:
-                        wclause += '& ('
-                        for conditionAttributeName, conditionAttributeComparitor in startConditions.items():
-                            avComparison,value=conditionAttributeComparitor
-                            value = self.getValuesForVariables(
-                                cv, value, cvNames)
-                            wclause += ' ( {0} {1} {2} ) & '.format(
-                                conditionAttributeName, avComparison, value)
-                        wclause=wclause[:-3]
-                        wclause += ' ) '
-
-                    # end Conditions need to be added to where clause
-                    if endConditions is not None:
-                        wclause += ' & ('
-                        for conditionAttributeName, conditionAttributeComparitor in endConditions.items():
-                            avComparison,value=conditionAttributeComparitor
-                            value = self.getValuesForVariables(
-                                cv, value, cvNames)
-                            wclause += ' ( {0} {1} {2} ) & '.format(
-                                conditionAttributeName, avComparison, value)
-                        wclause=wclause[:-3]
-                        wclause += ' ) '
-
-                    for ename in event_attribute_names:
-                        resultSetList[-1].append(getattr(deviceEventTable, read_where)(wclause, field=ename))
-                    resultSetList[-1].append(wclause)
-                    resultSetList[-1].append(cv)
-
-                    eventAttributeResults = EventAttributeResults(
-                        *resultSetList[-1])
-                    resultSetList[-1]=eventAttributeResults
-
-                return resultSetList
+            See getTrialEvents for the other arguments.
 
-            return None
+        Returns:
+            str: filePath
+        """
+        if fileFormat is None:
+            fileFormat = exportFileFormats.get(
+                os.path.splitext(filePath)[1].lower())
+        if fileFormat not in exportFileFormats.values():
+            raise ExperimentDataAccessException(
+                'exportTrialEvents: fileFormat must be one of {0}, not {1}'.format(
+                    sorted(exportFileFormats.values()), fileFormat))
+        import pandas as pd
+
+        trialEvents = self.getTrialEvents(event_type_id, trialStartVar,
+                                          trialEndVar, event_attribute_names,
+                                          conditionVariablesFilter)
+        dataFrame = pd.DataFrame.from_records(trialEvents)
+        for name in trialEvents.dtype.names:
+            if trialEvents.dtype[name].kind == 'S':
+                dataFrame[name] = dataFrame[name].str.decode('utf-8')
+        getattr(dataFrame, 'to_' + fileFormat)(filePath)
+        return filePath
 
     def getEventIterator(self, event_type):
         """
@@ -576,6 +907,8 @@ class ExperimentDataAccessUtility(object):
             _hubFiles.remove(self.hdfFile)
         self.hdfFile.close()
 
+        self._eventArrays = dict()
+        self._conditionVariablesArray = None
         self.experimentCodes = None
         self.hdfFilePath = None
         self.hdfFileName = None
@@ -591,3 +924,83 @@ class ExperimentDataAccessUtility(object):
 
 class ExperimentDataAccessException(Exception):
     pass
+
+
+if __name__ == '__main__':
+    # Compare the write throughput, file size and read throughput of the
+    # event_table_profiles in default_datastore.yaml, for 10 minutes of
+    # 1000 Hz binocular eye samples written in chunks of write_buffer_size
+    # events, as the ioHub Server writes them.
+    import shutil
+    import timeit
+    from tempfile import mkdtemp
+    from .. import IOHUB_DIRECTORY
+    from ..constants import EventConstants
+    from ..util import yload, yLoader
+    from ..devices.eyetracker.eye_events import BinocularEyeSampleEvent
+    from . import getEventTableOptions
+
+    EventConstants.addClassMappings(
+        (EventConstants.BINOCULAR_EYE_SAMPLE,),
+        dict(BinocularEyeSampleEvent=BinocularEyeSampleEvent))
+    _, settings = yload(open(os.path.join(IOHUB_DIRECTORY, 'datastore',
+                                          'default_datastore.yaml'), 'r'),
+                        Loader=yLoader).popitem()
+    table_label = BinocularEyeSampleEvent.IOHUB_DATA_TABLE
+    chunk_size = settings['write_buffer_size']
+
+    dtype = BinocularEyeSampleEvent.NUMPY_DTYPE
+    samples = np.zeros(600 * 1000, dtype=dtype)
+    rs = np.random.RandomState(0)
+    samples['event_id'] = np.arange(1, len(samples) + 1)
+    samples['type'] = EventConstants.BINOCULAR_EYE_SAMPLE
+    for name in ('device_time', 'logged_time', 'time'):
+        samples[name] = np.arange(len(samples)) / 1000.0
+    # fixations of 150 - 400 msec at random display positions
+    fix_ends = np.cumsum(rs.randint(150, 400, len(samples) // 150))
+    fix_pos = rs.uniform(-400.0, 400.0, (len(fix_ends) + 1, 2))
+    gaze = fix_pos[np.searchsorted(fix_ends, np.arange(len(samples)),
+                                   side='right')]
+    for eye, offset in (('left', -5.0), ('right', 5.0)):
+        samples[eye + '_gaze_x'] = gaze[:, 0] + offset
+        samples[eye + '_gaze_y'] = gaze[:, 1]
+    # and noise on all the float fields, as trackers report raw positions,
+    # pupil sizes etc. with each sample.
+    for name in dtype.names:
+        if dtype[name].kind == 'f' and name.endswith(('_gaze_x',
+                                                       '_gaze_y')):
+            samples[name] += rs.normal(0.0, 0.5, len(samples))
+        elif dtype[name].kind == 'f' and not samples[name].any():
+            samples[name] = (rs.uniform(1.0, 100.0) +
+                             rs.normal(0.0, 0.1, len(samples)))
+    print('%d samples, %.1f MB' % (len(samples), samples.nbytes / 1e6))
+
+    temp_dir = mkdtemp(prefix='iohub-datastore-benchmark')
+    try:
+        for profile_name in settings['event_table_profiles']:
+            settings['event_table_profile'] = profile_name
+            file_path = os.path.join(temp_dir, profile_name + '.hdf5')
+
+            def write():
+                hubFile = open_file(file_path, 'w')
+                table = hubFile.create_table(
+                    '/', table_label, dtype,
+                    **getEventTableOptions(settings, table_label))
+                for i in range(0, len(samples), chunk_size):
+                    table.append(samples[i:i + chunk_size])
+                    table.flush()
+                hubFile.close()
+
+            def read():
+                hubFile = open_file(file_path, 'r')
+                getattr(hubFile.root, table_label).read()
+                hubFile.close()
+
+            write_dur = min(timeit.repeat(write, repeat=3, number=1))
+            read_dur = min(timeit.repeat(read, repeat=3, number=1))
+            print('%-10s write %7.0f samples/sec, read %8.0f samples/sec, '
+                  '%6.1f MB' % (profile_name, len(samples) / write_dur,
+                                len(samples) / read_dur,
+                                os.path.getsize(file_path) / 1e6))
+    finally:
+        shutil.rmtree(temp_dir)
@@ -294,6 +294,9 @@ class Device(ioObject):
         self._last_poll_time = 0
         self._last_callback_time = 0
         self._native_event_buffer = deque(maxlen=self.event_buffer_length)
+        # number of native events added; lets a DeviceMonitor tell if a
+        # _poll() call found any events.
+        self._native_event_count = 0
         self._filters = dict()
         self._hw_interface_status = self.HW_STAT_UNDEFINED
         self._hw_error_str = u''
@@ -335,7 +338,7 @@ class Device(ioObject):
 
             clearEvents (int): Can be used to indicate if the events being returned should also be removed from the device event buffer. True (the default) indicates to remove events being returned. False results in events being left in the device event buffer.
 
-            asType (str): Optional kwarg giving the object type to return events as. Valid values are 'namedtuple' (the default), 'dict', 'list', or 'object'.
+            asType (str): Optional kwarg giving the object type to return events as. Valid values are 'namedtuple' (the default), 'dict', 'list', 'object', or 'numpy' (a dict of event type id: numpy structured array of the events of that type).
 
         Returns:
             (list): New events that the ioHub has received since the last getEvents() or clearEvents() call to the device. Events are ordered by the ioHub time of each event, older event at index 0. The event object type is determined by the asType parameter passed to the method. By default a namedtuple object is returned for each event.
@@ -568,6 +571,7 @@ class Device(ioObject):
     def _addNativeEventToBuffer(self, e):
         if self.isReportingEvents():
             self._native_event_buffer.append(e)
+            self._native_event_count += 1
 
     def _addEventListener(self, l, eventTypeIDs):
         for ei in eventTypeIDs:
@@ -669,6 +673,20 @@ class Device(ioObject):
         not find any new events to process, causing extra processing overhead that
         is not needed in many cases.
 
+        The device_timer can also give a max_interval. While _poll calls
+        find no new events, the time between calls is doubled, up to
+        max_interval, and it goes back to interval as soon as a call does.
+        For example:
+
+            device_timer:
+                interval: 0.001
+                max_interval: 0.008
+
+        Devices that can provide a file descriptor that becomes readable when
+        new native events are available should implement _getPollFileno. The
+        _poll method is then called when the file descriptor is readable,
+        rather than at a fixed interval.
+
         Args:
             None
 
@@ -678,6 +696,17 @@ class Device(ioObject):
         """
         pass
 
+    def _getPollFileno(self):
+        """Returns a file descriptor (or object with a fileno() method) that
+        becomes readable when the device has new native events to be read
+        by _poll, or None (the default) if the device must be polled at the
+        device_timer interval.
+
+        Only used on platforms where gevent can wait for any file descriptor
+        to become readable (not Windows).
+        """
+        return None
+
     def _handleNativeEvent(self, *args, **kwargs):
         """The _handleEvent method can be used by the native device interface
         (implemented by the ioHub Device class) to register new native device
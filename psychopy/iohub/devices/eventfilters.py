@@ -8,6 +8,8 @@ from __future__ import print_function
 from past.builtins import basestring
 from builtins import object
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from bisect import bisect_left, insort
 from collections import deque
 
 from ..util import NumPyRingBuffer
@@ -142,9 +144,13 @@ class MovingWindowFilter(object):
     value is added to the MovingWindow using MovingWindow.add.
     None is returned until the MovingWindow is full.
 
+    MovingWindow.addMany adds a sequence of values at once, filtering all
+    the windows the values complete with one numpy call when the filter
+    type implements filteredValues.
+
     The base class implements a moving window averaging filter, no weights.
     To change the filter used, extend this class and replace the filteredValue
-    method.
+    method, and optionally the filteredValues method.
 
     """
 
@@ -193,6 +199,17 @@ class MovingWindowFilter(object):
         """
         return self._filtering_buffer.mean()
 
+    def filteredValues(self, windows):
+        """Returns the filtered value of each row of the 2D array windows,
+        as filteredValue would for a window holding the row's values.
+
+        Sub classes that implement their own filteredValue method should
+        also implement filteredValues, otherwise addMany adds values one
+        at a time.
+
+        """
+        return windows.mean(axis=1)
+
     def add(self, event):
         """Add the given iohub event ( in list form ) to the moving window. The
         value of the specified event attribute when the filter was created is
@@ -204,19 +221,95 @@ class MovingWindowFilter(object):
 
         """
         if isinstance(event, (list, tuple)):
-            self._filtering_buffer.append(event[self._event_field_index])
+            self._append(event[self._event_field_index])
             self._events.append(event)
             if self.isFull():
+                filtered_value = self.filteredValue()
                 if self._inplace:
                     self._events[
                         self._active_index][
-                        self._event_field_index] = self.filteredValue()
-                return self._events[self._active_index], self.filteredValue()
+                        self._event_field_index] = filtered_value
+                return self._events[self._active_index], filtered_value
         else:
-            self._filtering_buffer.append(event)
+            self._append(event)
             if self.isFull():
                 return None, self.filteredValue()
 
+    def addMany(self, events):
+        """Add a sequence of iohub events ( in list form ), or of values, to
+        the moving window, as calling add for each of them would.
+
+        For events, returns a list of the (event, filtered value) results of
+        each add once the window is full. For values, returns an array of
+        the filtered values.
+
+        """
+        if len(events) == 0:
+            return [] if isinstance(events, list) else np.empty(0)
+        is_events = isinstance(events[0], (list, tuple))
+        if not self._canFilterMany():
+            results = [r for r in (self.add(e) for e in events) if r]
+            if is_events:
+                return results
+            return np.asarray([v for _e, v in results])
+
+        if is_events:
+            values = [e[self._event_field_index] for e in events]
+        else:
+            values = events
+        buf = self._filtering_buffer
+        length = buf.max_size
+        prior_count = len(buf)
+        prior_values = buf.getElements()[length - prior_count:]
+        values = np.concatenate(
+            (prior_values, np.asarray(values, dtype=prior_values.dtype)))
+        self._extend(values[prior_count:])
+
+        # window i holds values[i:i + length]; the first window with a new
+        # value is the first window if the buffer was not yet full.
+        first_window = max(0, prior_count - length + 1)
+        window_count = len(values) - length + 1 - first_window
+        if window_count <= 0:
+            if is_events:
+                self._events.extend(events)
+                return []
+            return np.empty(0)
+        stride = values.strides[0]
+        windows = as_strided(values[first_window:],
+                             shape=(window_count, length),
+                             strides=(stride, stride))
+        filtered_values = self.filteredValues(windows)
+
+        if not is_events:
+            return filtered_values
+        prior_events = list(self._events)[len(self._events) - prior_count:]
+        self._events.extend(events)
+        active_events = (prior_events + list(events))[
+            first_window + self._active_index:][:window_count]
+        if self._inplace:
+            field_index = self._event_field_index
+            for e, v in zip(active_events, filtered_values):
+                e[field_index] = v
+        return list(zip(active_events, filtered_values))
+
+    def _canFilterMany(self):
+        # Only use filteredValues if the class that implements it also
+        # implements, or inherits, the filteredValue used by add.
+        if type(self).add is not MovingWindowFilter.add:
+            return False
+        for cls in type(self).__mro__:
+            if 'filteredValues' in cls.__dict__:
+                return True
+            if 'filteredValue' in cls.__dict__:
+                return False
+        return False
+
+    def _append(self, value):
+        self._filtering_buffer.append(value)
+
+    def _extend(self, values):
+        self._filtering_buffer.extend(values)
+
     def isFull(self):
         return self._filtering_buffer.isFull()
 
@@ -242,6 +335,9 @@ class PassThroughFilter(MovingWindowFilter):
     def filteredValue(self):
         return self._filtering_buffer[0]
 
+    def filteredValues(self, windows):
+        return windows[:, 0]
+
 # ------
 
 
@@ -250,13 +346,59 @@ class MedianFilter(MovingWindowFilter):
 
     Length must be odd.
 
+    The window values are also kept in sorted order as they are added, so
+    the median is found with a binary search per value added instead of
+    a numpy median of the window.
+
     """
 
     def __init__(self, **kwargs):
+        if kwargs.get('length', 0) % 2 == 0:
+            raise ValueError('MedianFilter length must be odd.')
         MovingWindowFilter.__init__(self, **kwargs)
+        self._sorted_values = []
+        # NaN can not be sorted, so NaN values are counted instead.
+        self._nan_count = 0
 
     def filteredValue(self):
-        return np.median(self._filtering_buffer.getElements())
+        if self._nan_count:
+            return np.nan
+        return self._sorted_values[len(self._sorted_values) // 2]
+
+    def filteredValues(self, windows):
+        return np.median(windows, axis=1)
+
+    def _append(self, value):
+        buf = self._filtering_buffer
+        if buf.isFull():
+            self._removeSorted(buf[0])
+        buf.append(value)
+        self._insertSorted(buf[-1])
+
+    def _insertSorted(self, value):
+        if value != value:
+            self._nan_count += 1
+        else:
+            insort(self._sorted_values, value)
+
+    def _removeSorted(self, value):
+        if value != value:
+            self._nan_count -= 1
+        else:
+            del self._sorted_values[bisect_left(self._sorted_values, value)]
+
+    def _extend(self, values):
+        MovingWindowFilter._extend(self, values)
+        buf = self._filtering_buffer
+        values = buf.getElements()[buf.max_size - len(buf):]
+        nans = np.isnan(values)
+        self._nan_count = int(nans.sum())
+        self._sorted_values = sorted(values[~nans])
+
+    def clear(self):
+        MovingWindowFilter.clear(self)
+        self._sorted_values = []
+        self._nan_count = 0
 
 # ------
 
@@ -278,12 +420,16 @@ class WeightedAverageFilter(MovingWindowFilter):
         MovingWindowFilter.__init__(self, **kwargs)
         weights = np.asanyarray(weights)
         self._weights = weights / np.sum(weights)
+        # windows are weighted as np.convolve(window, weights, 'valid')
+        # would weight them, which reverses the weights.
+        self._window_weights = self._weights[::-1].copy()
 
     def filteredValue(self):
-        return np.convolve(
-            self._filtering_buffer.getElements(),
-            self._weights,
-            'valid')
+        return np.dot(self._filtering_buffer.getElements(),
+                      self._window_weights)
+
+    def filteredValues(self, windows):
+        return np.dot(windows, self._window_weights)
 
 
 # ------
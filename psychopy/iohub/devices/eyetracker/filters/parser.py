@@ -25,6 +25,17 @@ for a sample, the positions are averaged together. If only one of the two eyes
 has valid data, then that eye data is used for the sample. So the only case
 where a sample will be tagged as missing data is when both eyes do not have
 valid eye position / pupil size data.
+* By default each input sample is parsed as it is received. If the parser is
+created with chunked=True, input samples are buffered and all pending samples
+are parsed together each time the ioHub Server requests the parser's output
+events. Samples are then converted and categorised with numpy over the whole
+chunk, adaptive velocity thresholds are found from a sorted copy of the
+velocity buffer, and the parser state machine only steps through changes in
+sample category. The events created are the same as when samples are parsed
+one at a time, apart from adaptive velocity threshold values, which can differ
+in the last bits due to summation order, and the angle fields of samples that
+a position filter with a longer delay than the velocity filter has not yet
+filtered when the sample is parsed.
 
 POSITION_FILTER and VELOCITY_FILTER can be set to one of the following event
 field filter types. Example values for any input arguments are given. The filter
@@ -135,8 +146,15 @@ from ....constants import EventConstants
 from ....errors import print2err
 from ... import DeviceEvent, eventfilters
 from collections import OrderedDict
+from math import sqrt
+from operator import itemgetter
 from ....util.visualangle import VisualAngleCalc
 
+import numpy as np
+np_abs = np.abs
+arctan = np.arctan2
+rad2deg = np.rad2deg
+
 MONOCULAR_EYE_SAMPLE = EventConstants.MONOCULAR_EYE_SAMPLE
 BINOCULAR_EYE_SAMPLE = EventConstants.BINOCULAR_EYE_SAMPLE
 FIXATION_START = EventConstants.FIXATION_START
@@ -165,7 +183,14 @@ class EyeTrackerEventParser(eventfilters.DeviceEventFilter):
         self._last_parser_sample = None
         self.open_parser_events = OrderedDict()
         self.convertEvent = None
+        self.convertEvents = None
         self.isValidSample = None
+        self.isValidStatus = None
+        self._mono_array_fields = None
+        # If True, input events are only buffered as they arrive, and all
+        # pending samples are parsed together when the output events are
+        # requested by the ioHub Server.
+        self.chunked = kwargs.get('chunked', False)
         self.vel_thresh_history_dur = kwargs.get(
             'adaptive_vel_thresh_history', 3.0)
         position_filter = kwargs.get('position_filter')
@@ -183,7 +208,7 @@ class EyeTrackerEventParser(eventfilters.DeviceEventFilter):
             pos_filter_class, pos_filter_kwargs = eventfilters.PassThroughFilter, {}
 
         if velocity_filter:
-            vel_filter_class_name = position_filter.get(
+            vel_filter_class_name = velocity_filter.get(
                 'name', 'PassThroughFilter')
             vel_filter_class = getattr(eventfilters, vel_filter_class_name)
             del velocity_filter['name']
@@ -192,10 +217,10 @@ class EyeTrackerEventParser(eventfilters.DeviceEventFilter):
             vel_filter_class, vel_filter_kwargs = eventfilters.PassThroughFilter, {}
 
         self.adaptive_x_vthresh_buffer = np.zeros(
-            self.vel_thresh_history_dur * sampling_rate)
+            int(self.vel_thresh_history_dur * sampling_rate))
         self.x_vthresh_buffer_index = 0
         self.adaptive_y_vthresh_buffer = np.zeros(
-            self.vel_thresh_history_dur * sampling_rate)
+            int(self.vel_thresh_history_dur * sampling_rate))
         self.y_vthresh_buffer_index = 0
 
         pos_filter_kwargs['event_type'] = MONOCULAR_EYE_SAMPLE
@@ -236,8 +261,22 @@ class EyeTrackerEventParser(eventfilters.DeviceEventFilter):
         event_type_and_filter_ids[MONOCULAR_EYE_SAMPLE] = [0, ]
         return event_type_and_filter_ids
 
+    def _addInputEvent(self, evt):
+        if self.chunked:
+            self._input_events.append(evt)
+        else:
+            eventfilters.DeviceEventFilter._addInputEvent(self, evt)
+
+    def _removeOutputEvents(self):
+        if self.chunked and self._input_events:
+            self.process()
+        return eventfilters.DeviceEventFilter._removeOutputEvents(self)
+
     def process(self):
         """"""
+        if self.chunked:
+            return self.processChunk()
+
         samples_for_processing = []
         for in_evt in self.getInputEvents():
             if self.sample_type is None:
@@ -254,10 +293,12 @@ class EyeTrackerEventParser(eventfilters.DeviceEventFilter):
                 # check for a previous missing data run and handle.
                 if self.invalid_samples_run:
                     if self.last_valid_sample:
-                        samples_for_processing.extend(
-                            self.interpolateMissingData(current_mono_evt))
-                        self._addVelocity(
-                            samples_for_processing[-1], current_mono_evt)
+                        interpolated = self.interpolateMissingData(
+                            current_mono_evt)
+                        if interpolated:
+                            samples_for_processing.extend(interpolated)
+                            self._addVelocity(
+                                interpolated[-1], current_mono_evt)
                     # Discard all invalid samples that occurred prior
                     # to the first valid sample.
                     del self.invalid_samples_run[:]
@@ -289,6 +330,130 @@ class EyeTrackerEventParser(eventfilters.DeviceEventFilter):
 
         self.clearInputEvents()
 
+    def processChunk(self):
+        """Parse all pending input events at once.
+
+        Samples are converted and categorised over arrays of the chunk's
+        samples. Missing data interpolation, the field filters and the
+        adaptive velocity thresholds are still updated one sample at a
+        time, as each sample's velocity depends on the filtered position
+        of the previous one.
+        """
+        in_evts = self.getInputEvents()
+        if not in_evts:
+            return
+        if self.sample_type is None:
+            self.initializeForSampleType(in_evts[0])
+
+        mono_evts, valid = self.convertEvents(in_evts)
+
+        samples_for_processing = []
+        # index in samples_for_processing of the samples that get an
+        # adaptive velocity threshold.
+        thresholded = []
+        # (index in samples_for_processing, sample) of the invalid samples,
+        # which are output before the sample at that index is parsed.
+        invalid_outputs = []
+        last_sample = self.last_sample
+        for current_mono_evt, is_valid in zip(mono_evts, valid):
+            if is_valid:
+                if last_sample:
+                    self._addVelocity(last_sample, current_mono_evt)
+                if self.invalid_samples_run:
+                    if self.last_valid_sample:
+                        interpolated = self.interpolateMissingData(
+                            current_mono_evt)
+                        if interpolated:
+                            samples_for_processing.extend(interpolated)
+                            self._addVelocity(
+                                interpolated[-1], current_mono_evt)
+                    del self.invalid_samples_run[:]
+
+                filtered_event = self.addToFieldFilters(current_mono_evt)
+                if filtered_event:
+                    thresholded.append(len(samples_for_processing))
+                    samples_for_processing.append(filtered_event[0])
+                self.last_valid_sample = current_mono_evt
+            else:
+                self.invalid_samples_run.append(current_mono_evt)
+                invalid_outputs.append(
+                    (len(samples_for_processing), current_mono_evt))
+            last_sample = current_mono_evt
+        self.last_sample = last_sample
+
+        if thresholded:
+            thresholded = [samples_for_processing[i] for i in thresholded]
+            getVelocity = itemgetter(self.io_event_ix('velocity_x'),
+                                     self.io_event_ix('velocity_y'))
+            velocities = np.array([getVelocity(s) for s in thresholded],
+                                  dtype=np.float64).reshape(-1, 2)
+            x_vel_thresh = self.addVelocitiesToAdaptiveThreshold(
+                0, velocities[:, 0])
+            y_vel_thresh = self.addVelocitiesToAdaptiveThreshold(
+                1, velocities[:, 1])
+            raw_x_ix = self.io_event_ix('raw_x')
+            raw_y_ix = self.io_event_ix('raw_y')
+            for s, xt, yt in zip(thresholded, x_vel_thresh.tolist(),
+                                 y_vel_thresh.tolist()):
+                s[raw_x_ix] = xt
+                s[raw_y_ix] = yt
+
+        self.parseEvents(samples_for_processing, invalid_outputs)
+        self.clearInputEvents()
+
+    def parseEvents(self, samples, invalid_outputs=()):
+        """Parse a list of samples as parseEvent does, adding each valid
+        sample to the output events after it has been parsed.
+
+        invalid_outputs is a list of (index, sample) of samples that are
+        output, unparsed, before samples[index] is parsed.
+
+        The samples are split into runs of samples with the same category;
+        parser events can only start or end on the first sample of a run.
+        """
+        categories = self.getSampleEventCategories(samples)
+        sample_count = len(samples)
+        bounds = {0, sample_count}
+        if sample_count > 1:
+            cats = np.asarray(categories)
+            bounds.update((np.flatnonzero(cats[1:] != cats[:-1]) + 1).tolist())
+        bounds.update(i for i, _s in invalid_outputs if i < sample_count)
+        bounds = sorted(bounds)
+
+        invalid_outputs = list(invalid_outputs)
+        invalid_outputs.reverse()
+        last_sample = self._last_parser_sample
+        last_sec = None
+        if last_sample:
+            last_sec = self.getSampleEventCategory(last_sample)
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            while invalid_outputs and invalid_outputs[-1][0] <= start:
+                self.addOutputEvent(invalid_outputs.pop()[1])
+            sample = samples[start]
+            current_sec = categories[start]
+            run_samples = samples[start + 1:end]
+            if last_sample:
+                if last_sec and last_sec != current_sec:
+                    start_event, end_event = self.createEyeEvents(
+                        last_sec, current_sec, last_sample, sample)
+                    if start_event:
+                        self.addOutputEvent(start_event)
+                    if end_event:
+                        self.addOutputEvent(end_event)
+                else:
+                    run_samples = samples[start:end]
+            if run_samples:
+                self.open_parser_events.setdefault(
+                    current_sec + '_SAMPLES', []).extend(run_samples)
+            if current_sec != 'MIS':
+                for s in samples[start:end]:
+                    self.addOutputEvent(s)
+            last_sample = samples[end - 1]
+            last_sec = current_sec
+        for _i, s in reversed(invalid_outputs):
+            self.addOutputEvent(s)
+        self._last_parser_sample = last_sample
+
     def parseEvent(self, sample):
         if self._last_parser_sample:
             last_sec = self.getSampleEventCategory(self._last_parser_sample)
@@ -309,7 +474,7 @@ class EyeTrackerEventParser(eventfilters.DeviceEventFilter):
         if self.isValidSample(sample):
             x_velocity_threshold = sample[self.io_event_ix('raw_x')]
             y_velocity_threshold = sample[self.io_event_ix('raw_y')]
-            if x_velocity_threshold == np.NaN:
+            if x_velocity_threshold == np.nan:
                 return None
             sample_vx = sample[self.io_event_ix('velocity_x')]
             sample_vy = sample[self.io_event_ix('velocity_y')]
@@ -318,6 +483,23 @@ class EyeTrackerEventParser(eventfilters.DeviceEventFilter):
             return 'FIX'
         return 'MIS'
 
+    def getSampleEventCategories(self, samples):
+        """getSampleEventCategory for a list of samples."""
+        if not samples:
+            return []
+        getFields = itemgetter(self.io_event_ix('status'),
+                               self.io_event_ix('velocity_x'),
+                               self.io_event_ix('velocity_y'),
+                               self.io_event_ix('raw_x'),
+                               self.io_event_ix('raw_y'))
+        fields = np.array([getFields(s) for s in samples], dtype=np.float64)
+        status, vx, vy, x_thresh, y_thresh = fields.T
+        with np.errstate(invalid='ignore'):
+            saccade = (vx >= x_thresh) | (vy >= y_thresh)
+        categories = np.where(saccade, 'SAC', 'FIX')
+        categories[~self.isValidStatus(status)] = 'MIS'
+        return categories.tolist()
+
     def createEyeEvents(
             self,
             last_sample_category,
@@ -440,9 +622,92 @@ class EyeTrackerEventParser(eventfilters.DeviceEventFilter):
                         pt_list.append(PT)
                     vthresh_values.append(PT)
             if len(vthresh_values) != v + 1:
-                vthresh_values.append(np.NaN)
+                vthresh_values.append(np.nan)
+        return vthresh_values
+
+    def addVelocitiesToAdaptiveThreshold(self, v, velocities):
+        """addVelocityToAdaptiveThreshold for an array of the velocities of
+        one axis, v being 0 for x and 1 for y velocity.
+
+        Returns an array of the velocity threshold calculated for each
+        velocity.
+        """
+        if v == 0:
+            vbuffer = self.adaptive_x_vthresh_buffer
+            vbuffer_index = self.x_vthresh_buffer_index
+        else:
+            vbuffer = self.adaptive_y_vthresh_buffer
+            vbuffer_index = self.y_vthresh_buffer_index
+        blen = len(vbuffer)
+        vthresh_values = np.full(len(velocities), np.nan)
+
+        added = np.flatnonzero(velocities > 0.0)
+        # A sorted copy of the buffer is updated as each velocity is added,
+        # so the velocities below each iteration's threshold are a prefix
+        # of it.
+        sorted_buffer = np.sort(vbuffer[:min(vbuffer_index, blen)])
+        for i, velocity in zip(added.tolist(), velocities[added].tolist()):
+            slot = vbuffer_index % blen
+            if vbuffer_index >= blen:
+                self._replaceSorted(sorted_buffer, vbuffer[slot], velocity)
+                vthresh_values[i] = self._adaptiveVelocityThreshold(
+                    sorted_buffer)
+            else:
+                sorted_buffer = np.insert(
+                    sorted_buffer, sorted_buffer.searchsorted(velocity),
+                    velocity)
+            vbuffer[slot] = velocity
+            vbuffer_index += 1
+
+        if v == 0:
+            self.x_vthresh_buffer_index = vbuffer_index
+        else:
+            self.y_vthresh_buffer_index = vbuffer_index
         return vthresh_values
 
+    @staticmethod
+    def _replaceSorted(sorted_buffer, old, new):
+        """Replace the value old in sorted_buffer with new, keeping it
+        sorted."""
+        i = int(sorted_buffer.searchsorted(old))
+        j = int(sorted_buffer.searchsorted(new))
+        if j > i + 1:
+            sorted_buffer[i:j - 1] = sorted_buffer[i + 1:j]
+            sorted_buffer[j - 1] = new
+        elif j < i:
+            sorted_buffer[j + 1:i + 1] = sorted_buffer[j:i]
+            sorted_buffer[j] = new
+        else:
+            sorted_buffer[i] = new
+
+    @staticmethod
+    def _adaptiveVelocityThreshold(sorted_buffer):
+        """The threshold addVelocityToAdaptiveThreshold iterates to for a
+        full velocity buffer, found from cumulative sums of the sorted
+        buffer values instead of selecting the values below each
+        iteration's threshold."""
+        count = len(sorted_buffer)
+        low = float(sorted_buffer[0])
+        deviation = sorted_buffer - low
+        csum = np.cumsum(deviation)
+        csum_sq = np.cumsum(deviation * deviation)
+
+        mean = float(csum[-1]) / count
+        PT = low + 3.0 * sqrt(max(float(csum_sq[-1]) / count - mean * mean,
+                                  0.0))
+        PTd = 2.0
+        while PTd >= 1.0:
+            below_count = int(sorted_buffer.searchsorted(PT))
+            if below_count == 0:
+                return np.nan
+            mean = float(csum[below_count - 1]) / below_count
+            new_PT = low + mean + 3.0 * sqrt(max(
+                float(csum_sq[below_count - 1]) / below_count - mean * mean,
+                0.0))
+            PTd = abs(new_PT - PT)
+            PT = new_PT
+        return PT
+
     def reset(self):
         eventfilters.DeviceEventFilter.reset(self)
         self._last_parser_sample = None
@@ -469,10 +734,15 @@ class EyeTrackerEventParser(eventfilters.DeviceEventFilter):
 
         if in_evt[DeviceEvent.EVENT_TYPE_ID_INDEX] == BINOCULAR_EYE_SAMPLE:
             self.convertEvent = self._convertToMonoAveraged
+            self.convertEvents = self._convertToMonoAveragedArray
+            self._initMonoAveragedArray()
             self.isValidSample = lambda x: x[self.io_event_ix('status')] != 22
+            self.isValidStatus = lambda status: status != 22
         else:
             self.convertEvent = self._convertMonoFields
+            self.convertEvents = self._convertMonoFieldsArray
             self.isValidSample = lambda x: x[self.io_event_ix('status')] == 0
+            self.isValidStatus = lambda status: status == 0
 
     def interpolateMissingData(self, current_sample):
         samples_for_processing = []
@@ -550,9 +820,118 @@ class EyeTrackerEventParser(eventfilters.DeviceEventFilter):
 
     def _convertMonoFields(self, prev_event, current_event):
         if self.isValidSample(current_event):
-            self._convertPosToAngles(self, current_event)
+            self._convertPosToAngles(current_event)
             if prev_event:
                 self._addVelocity(prev_event, current_event)
+        return current_event
+
+    def _convertPosToAnglesArray(self, gaze_x, gaze_y):
+        """_convertPosToAngles for arrays of gaze positions. The angles are
+        returned as lists of numpy float64 scalars, the type
+        _convertPosToAngles sets."""
+        angle_x, angle_y = self.pix2deg(gaze_x, gaze_y)
+        return list(angle_x), list(angle_y)
+
+    def _convertMonoFieldsArray(self, in_evts):
+        """Convert the pix positions of a list of mono samples to angles.
+
+        Returns the list of samples and a list of which samples are
+        valid. Velocity is not calculated.
+        """
+        status_ix = self.io_event_ix('status')
+        valid = self.isValidStatus(
+            np.array([e[status_ix] for e in in_evts], dtype=np.float64))
+        if valid.any():
+            gx_ix = self.io_event_ix('gaze_x')
+            gy_ix = self.io_event_ix('gaze_y')
+            ax_ix = self.io_event_ix('angle_x')
+            ay_ix = self.io_event_ix('angle_y')
+            valid_evts = [e for e, v in zip(in_evts, valid) if v]
+            gaze = np.array([(e[gx_ix], e[gy_ix]) for e in valid_evts],
+                            dtype=np.float64)
+            angle_x, angle_y = self._convertPosToAnglesArray(gaze[:, 0],
+                                                             gaze[:, 1])
+            for e, ax, ay in zip(valid_evts, angle_x, angle_y):
+                e[ax_ix] = ax
+                e[ay_ix] = ay
+        return in_evts, valid.tolist()
+
+    def _initMonoAveragedArray(self):
+        """Map the binocular sample fields each mono sample field is
+        converted from."""
+        binoc_field_names = EventConstants.getClass(
+            EventConstants.BINOCULAR_EYE_SAMPLE).CLASS_ATTRIBUTE_NAMES
+        copied = []
+        typed = []
+        averaged = []
+        for i, field in enumerate(self.io_event_fields):
+            if field in binoc_field_names:
+                copied.append((i, binoc_field_names.index(field)))
+            elif field == 'eye':
+                eye_ix = i
+            elif field.endswith('_type'):
+                typed.append(
+                    (i, binoc_field_names.index('left_%s' % (field))))
+            else:
+                averaged.append(
+                    (i, binoc_field_names.index('left_%s' % (field)),
+                     binoc_field_names.index('right_%s' % (field))))
+
+        self._mono_array_fields = dict(
+            eye=eye_ix,
+            copied=[i for i, _b in copied],
+            getCopied=itemgetter(*[b for _i, b in copied]),
+            typed=[i for i, _b in typed],
+            getTyped=itemgetter(*[b for _i, b in typed]),
+            averaged=[i for i, _l, _r in averaged],
+            getLeft=itemgetter(*[l for _i, l, _r in averaged]),
+            getRight=itemgetter(*[r for _i, _l, r in averaged]),
+            status=binoc_field_names.index('status'))
+
+    def _convertToMonoAveragedArray(self, in_evts):
+        """_convertToMonoAveraged for a list of binocular samples, without
+        the velocity calculation.
+
+        Returns the list of mono samples and a list of which samples are
+        valid.
+        """
+        fields = self._mono_array_fields
+        count = len(in_evts)
+
+        status = np.array([e[fields['status']] for e in in_evts],
+                          dtype=np.float64)
+        left = np.array([fields['getLeft'](e) for e in in_evts],
+                        dtype=np.float64)
+        right = np.array([fields['getRight'](e) for e in in_evts],
+                         dtype=np.float64)
+        eye_fields = np.where((status == 0)[:, np.newaxis],
+                              (left + right) / 2.0,
+                              np.where((status == 20)[:, np.newaxis],
+                                       right, left))
+
+        mono_evts = np.empty((count, len(self.io_event_fields)),
+                             dtype=object)
+        mono_evts[:, fields['averaged']] = eye_fields
+        valid = self.isValidStatus(status)
+        if valid.any():
+            averaged = fields['averaged']
+            gaze_x = eye_fields[valid, averaged.index(
+                self.io_event_ix('gaze_x'))]
+            gaze_y = eye_fields[valid, averaged.index(
+                self.io_event_ix('gaze_y'))]
+            angles = np.empty((2, len(gaze_x)), dtype=object)
+            angles[0, :], angles[1, :] = self._convertPosToAnglesArray(
+                gaze_x, gaze_y)
+            mono_evts[valid, self.io_event_ix('angle_x')] = angles[0]
+            mono_evts[valid, self.io_event_ix('angle_y')] = angles[1]
+        mono_evts[:, fields['copied']] = np.array(
+            [fields['getCopied'](e) for e in in_evts], dtype=object)
+        mono_evts[:, fields['typed']] = np.array(
+            [fields['getTyped'](e) for e in in_evts],
+            dtype=np.float64).astype(np.int64).astype(object)
+        mono_evts[:, fields['eye']] = LEFT_EYE
+        mono_evts[:, self.io_event_ix('type')] = MONOCULAR_EYE_SAMPLE
+        return mono_evts.tolist(), valid.tolist()
 
     def _convertToMonoAveraged(self, prev_event, current_event):
         mono_evt = []
@@ -911,3 +1290,102 @@ class EyeTrackerEventParser(eventfilters.DeviceEventFilter):
                                         self.io_event_ix('time')] - existing_start_event[
                                             self.io_event_ix('time')], sample[
                                                 self.io_event_ix('status')]]
+
+
+def _simulatedBinocularSamples(count, sampling_rate=1000, seed=0):
+    """Binocular samples of fixations and saccades between random display
+    positions, with blinks and runs of samples missing one eye's data."""
+    rs = np.random.RandomState(seed)
+    ms = sampling_rate / 1000.0
+    gaze = []
+    status = []
+    pos = np.zeros(2)
+    sample_count = 0
+    while sample_count < count:
+        fix_len = int(rs.randint(150, 400) * ms)
+        fix = pos + rs.normal(0.0, 0.5, (fix_len, 2))
+        fix_status = np.zeros(fix_len, dtype=int)
+        if rs.rand() < 0.2:
+            # data from one eye missing for part of the fixation
+            lost = int(rs.randint(5, 30) * ms)
+            fix_status[fix_len // 2:fix_len // 2 + lost] = rs.choice((2, 20))
+        gaze.append(fix)
+        status.append(fix_status)
+        if rs.rand() < 0.15:
+            blink_len = int(rs.randint(50, 150) * ms)
+            gaze.append(np.zeros((blink_len, 2)))
+            status.append(np.full(blink_len, 22, dtype=int))
+        target = rs.uniform(-400.0, 400.0, 2)
+        sac_len = max(2, int(rs.randint(20, 50) * ms))
+        gaze.append(pos + np.linspace(0.0, 1.0, sac_len)[:, np.newaxis] *
+                    (target - pos))
+        status.append(np.zeros(sac_len, dtype=int))
+        pos = target
+        sample_count += fix_len + sac_len
+    gaze = np.concatenate(gaze)[:count]
+    status = np.concatenate(status)[:count]
+
+    fields = EventConstants.getClass(
+        BINOCULAR_EYE_SAMPLE).CLASS_ATTRIBUTE_NAMES
+    ix = fields.index
+    samples = []
+    for i, ((gx, gy), s) in enumerate(zip(gaze.tolist(), status.tolist())):
+        evt = [0] * len(fields)
+        t = i / sampling_rate
+        evt[ix('event_id')] = i + 1
+        evt[ix('type')] = BINOCULAR_EYE_SAMPLE
+        evt[ix('device_time')] = t
+        evt[ix('logged_time')] = t
+        evt[ix('time')] = t
+        evt[ix('status')] = s
+        if s in (0, 2):
+            evt[ix('left_gaze_x')] = gx - 5.0
+            evt[ix('left_gaze_y')] = gy
+            evt[ix('left_pupil_measure1')] = 4.0
+        if s in (0, 20):
+            evt[ix('right_gaze_x')] = gx + 5.0
+            evt[ix('right_gaze_y')] = gy
+            evt[ix('right_pupil_measure1')] = 4.2
+        samples.append(evt)
+    return samples
+
+
+if __name__ == '__main__':
+    # Compare the time taken to parse 20 seconds of 1000 Hz binocular
+    # samples, one sample at a time and in chunks of the samples received
+    # each 10 msec.
+    import timeit
+    from ..eye_events import (MonocularEyeSampleEvent,
+                              BinocularEyeSampleEvent)
+
+    EventConstants.addClassMappings(
+        (MONOCULAR_EYE_SAMPLE, BINOCULAR_EYE_SAMPLE),
+        dict(MonocularEyeSampleEvent=MonocularEyeSampleEvent,
+             BinocularEyeSampleEvent=BinocularEyeSampleEvent))
+
+    sampling_rate = 1000
+    tick_samples = 10
+    samples = _simulatedBinocularSamples(20 * sampling_rate, sampling_rate)
+
+    def parse(chunked):
+        parser = EyeTrackerEventParser(
+            sampling_rate=sampling_rate, chunked=chunked,
+            display_device=dict(mm_size=dict(width=500, height=280),
+                                pixel_res=(1920, 1080), eye_distance=550))
+        events = []
+        for i in range(0, len(samples), tick_samples):
+            for s in samples[i:i + tick_samples]:
+                parser._addInputEvent(list(s))
+            events.extend(parser._removeOutputEvents())
+        return events
+
+    type_ix = DeviceEvent.EVENT_TYPE_ID_INDEX
+    sample_events = [e[type_ix] for e in parse(False)]
+    chunked_events = [e[type_ix] for e in parse(True)]
+    assert sample_events == chunked_events
+    print('%d samples, %d output events' % (len(samples), len(sample_events)))
+
+    for chunked in (False, True):
+        dur = min(timeit.repeat(lambda: parse(chunked), repeat=3, number=1))
+        print('chunked=%s: %.3f sec, %.1f usec / sample' % (
+            chunked, dur, dur * 1000000.0 / len(samples)))
@@ -227,6 +227,15 @@ class Serial(Device):
     def isConnected(self):
         return self._serial is not None
 
+    def _getPollFileno(self):
+        # pyserial only provides fileno() on posix
+        if self._serial is not None and hasattr(self._serial, 'fileno'):
+            try:
+                return self._serial.fileno()
+            except Exception:
+                pass
+        return None
+
     def getDeviceTime(self):
         return getTime()
 
@@ -71,7 +71,13 @@ def run(rootScriptPathDir, configFilePath):
             m.start()
             glets.append(m)
 
-        tlet = gevent.spawn(s.processEventsTasklet, 0.01)
+        # Without GET_EVENTS requests to trigger event processing, events
+        # are only sent through shared memory by processEventsTasklet.
+        proc_events_interval = 0.01
+        if s.eventWriter:
+            proc_events_interval = s.config.get('shared_memory_interval',
+                                                0.001)
+        tlet = gevent.spawn(s.processEventsTasklet, proc_events_interval)
         glets.append(tlet)
 
         if Computer.psychopy_process:
@@ -15,6 +15,7 @@ import msgpack
 import gevent
 from gevent.server import DatagramServer
 from gevent import Greenlet
+from gevent.socket import wait_read, timeout as socket_timeout
 
 try:
     import msgpack_numpy
@@ -28,7 +29,8 @@ from . import _pkgroot
 from . import IOHUB_DIRECTORY, EXP_SCRIPT_DIRECTORY, _DATA_STORE_AVAILABLE
 from .errors import print2err, printExceptionDetailsToStdErr, ioHubError
 from .net import MAX_PACKET_SIZE
-from .util import convertCamelToSnake, win32MessagePump
+from .shmem import SharedEventWriter, SHARED_MEMORY_AVAILABLE
+from .util import convertCamelToSnake, win32MessagePump, updateDict
 from .util import yload, yLoader
 from .constants import DeviceConstants, EventConstants
 from .devices import DeviceEvent, import_device
@@ -65,6 +67,9 @@ class udpServer(DatagramServer):
         self.unpacker = msgpack.Unpacker(use_list=True)
         self.unpack = self.unpacker.unpack
         self.feed = self.unpacker.feed
+        # greenlet: list of the responses collected instead of being sent
+        # while that greenlet handles an ASYNC, BATCH or NO_REPLY request.
+        self._replies = {}
         DatagramServer.__init__(self, address)
 
     def handle(self, request, replyTo):
@@ -73,8 +78,29 @@ class udpServer(DatagramServer):
         self.feed(request)
         request = self.unpack()
         # print2err(">> Rx Packet: {}, {}".format(request, replyTo))
+        return self.handleRequest(request, replyTo)
+
+    def handleRequest(self, request, replyTo):
         request_type = unicode(request.pop(0), 'utf-8') # convert bytes to string for compatibility
-        if request_type == 'SYNC_REQ':
+        if request_type == 'ASYNC':
+            # ['ASYNC', request_id, request]: reply tagged with request_id
+            request_id = request.pop(0)
+            reply = self._handleForReply(request.pop(0), replyTo)
+            self.sendResponse(('ASYNC_RESULT', request_id, reply), replyTo)
+            return True
+        elif request_type == 'BATCH':
+            # ['BATCH', request_id, [request, ...]]: one reply, listing the
+            # reply to each request.
+            request_id = request.pop(0)
+            replies = [self._handleForReply(r, replyTo)
+                       for r in request.pop(0)]
+            self.sendResponse(('BATCH_RESULT', request_id, replies), replyTo)
+            return True
+        elif request_type == 'NO_REPLY':
+            # ['NO_REPLY', request]: the client does not wait for a reply.
+            self._handleForReply(request.pop(0), replyTo)
+            return True
+        elif request_type == 'SYNC_REQ':
             self.sendResponse(['SYNC_REPLY', getTime()], replyTo)
             return True
         elif request_type == 'PING':
@@ -216,6 +242,9 @@ class udpServer(DatagramServer):
             exp_dev_cb = io_dev_dict['Experiment']._nativeEventCallback
             for eventAsTuple in exp_events:
                 exp_dev_cb(eventAsTuple)
+            if self.iohub.eventWriter:
+                # make the events readable by the next getEvents() call
+                self.iohub.processDeviceEvents()
             self.sendResponse(('EVENT_TX_RESULT', len(exp_events)), replyTo)
             return True
         elif request_type == 'DEV_RPC':
@@ -327,7 +356,34 @@ class udpServer(DatagramServer):
             self.sendResponse('DEVICE_RPC_TYPE_NOT_SUPPORTED_ERROR', replyTo)
             return False
 
+    def _handleForReply(self, request, replyTo):
+        """Handle a request, returning its response rather than sending
+        it."""
+        glet = gevent.getcurrent()
+        reply = []
+        outer = self._replies.get(glet)
+        self._replies[glet] = reply
+        try:
+            self.handleRequest(request, replyTo)
+        except Exception:
+            print2err('IOHUB_REQUEST_ERROR')
+            printExceptionDetailsToStdErr()
+            reply.append('IOHUB_REQUEST_ERROR')
+        finally:
+            if outer is None:
+                del self._replies[glet]
+            else:
+                self._replies[glet] = outer
+        if reply:
+            return reply[0]
+        return None
+
     def sendResponse(self, data, address):
+        if self._replies:
+            replies = self._replies.get(gevent.getcurrent())
+            if replies is not None:
+                replies.append(data)
+                return
         reply_data_sz = -1
         max_pkt_sz = int(MAX_PACKET_SIZE / 2 - 20)
         pkt_cnt = -1
@@ -467,10 +523,26 @@ class udpServer(DatagramServer):
     def flushIODataStoreFile(self):
         dsfile = self.iohub.dsfile
         if dsfile:
-            dsfile.emrtFile.flush()
+            dsfile.flush()
             return True
         return False
 
+    def getDataStoreStats(self):
+        dsfile = self.iohub.dsfile
+        if dsfile:
+            return dsfile.getStats()
+        return None
+
+    def getDeviceMonitorStats(self):
+        return {m.device.name: m.getStats()
+                for m in self.iohub.deviceMonitors if m.device}
+
+    def getEventTransport(self):
+        ewriter = self.iohub.eventWriter
+        if ewriter:
+            return 'shared_memory', ewriter.name
+        return 'udp', None
+
     def shutDown(self):
         try:
             self.setPriority('normal')
@@ -484,24 +556,90 @@ class udpServer(DatagramServer):
 
 
 class DeviceMonitor(Greenlet):
-    def __init__(self, device, sleep_interval):
+    """Calls the _poll() method of a device.
+
+    If the device's _getPollFileno() returns a file descriptor and the device
+    is reporting events, _poll() is called when it becomes readable (or at
+    least every fileno_timeout sec.). If a poll after such a wakeup found no
+    new events, the data is being left unread, so the monitor sleeps for the
+    interval instead of waiting on the file descriptor again.
+    Otherwise the device is polled every sleep_interval; if max_interval is
+    longer, the interval is doubled after each poll that found no new
+    events, up to max_interval, and goes back to sleep_interval as soon as
+    a poll finds some.
+    """
+    fileno_timeout = 0.1
+
+    def __init__(self, device, sleep_interval, max_interval=None):
         Greenlet.__init__(self)
         self.device = device
         self.sleep_interval = sleep_interval
+        self.max_interval = max(sleep_interval, max_interval or 0.0)
         self.running = False
+        self._wait_on_fileno = Computer.platform != 'win32'
+        # the last wait returned because the file descriptor was readable
+        self._fileno_ready = False
+
+        # counters returned by getStats()
+        self.polls = 0
+        self.empty_polls = 0
+        self.fileno_wakeups = 0
+        self.interval = sleep_interval
 
     def _run(self):
         self.running = True
         ctime = Computer.getTime
+        device = self.device
         while self.running is True:
             stime = ctime()
-            self.device._poll()
-            i = self.sleep_interval - (ctime() - stime)
+            event_count = device._native_event_count
+            device._poll()
+            self.polls += 1
+            found_events = device._native_event_count != event_count
+            if found_events:
+                self.interval = self.sleep_interval
+            else:
+                self.empty_polls += 1
+                self.interval = min(self.interval * 2, self.max_interval)
+
+            wait_on_fileno = (self._wait_on_fileno and
+                              device.isReportingEvents() and
+                              (found_events or not self._fileno_ready))
+            self._fileno_ready = wait_on_fileno and self._waitForFileno()
+            if self._fileno_ready:
+                continue
+            i = self.interval - (ctime() - stime)
             if i > 0.001:
                 gevent.sleep(i)
             else:
                 gevent.sleep(0.001)
 
+    def _waitForFileno(self):
+        """Wait for the device's file descriptor to become readable. Returns
+        True if it did, False if the device does not provide one, the wait
+        timed out or failed."""
+        fileno = self.device._getPollFileno()
+        if fileno is None:
+            return False
+        try:
+            wait_read(fileno, timeout=self.fileno_timeout)
+        except socket_timeout:
+            return False
+        except Exception:
+            # not supported for this kind of file; poll instead.
+            print2err('DeviceMonitor: can not wait for the file descriptor '
+                      'of ', self.device, '. Polling instead.')
+            self._wait_on_fileno = False
+            return False
+        self.fileno_wakeups += 1
+        return True
+
+    def getStats(self):
+        return dict(polls=self.polls,
+                    empty_polls=self.empty_polls,
+                    fileno_wakeups=self.fileno_wakeups,
+                    interval=self.interval)
+
     def __del__(self):
         self.device = None
 
@@ -534,6 +672,9 @@ class ioServer(object):
         self._all_dev_conf_errors = []
         ebuf_sz = config.get('global_event_buffer', 2048)
         ioServer.eventBuffer = deque(maxlen=ebuf_sz)
+        self.eventWriter = None
+        if config.get('event_transport', 'udp') == 'shared_memory':
+            self._initEventWriter(ebuf_sz)
 
         self._running = True
         # start UDP service
@@ -554,9 +695,10 @@ class ioServer(object):
                                                 'default_datastore.yaml')
                 _, def_ds_conf = yload(open(def_ds_conf_path, 'r'),
                                        Loader=yLoader).popitem()
-                for dkey, dvalue in def_ds_conf.items():
-                    if dkey not in ds_conf:
-                        ds_conf[dkey] = dvalue
+                # nested settings (e.g. event_tables, event_table_profiles)
+                # are merged too, so that a user entry only overrides the
+                # defaults it names
+                updateDict(ds_conf, def_ds_conf)
 
                 if ds_conf.get('enable', True):
                     ds_dir = script_dir
@@ -575,6 +717,21 @@ class ioServer(object):
             print2err('Error during ioDataStore creation....')
             printExceptionDetailsToStdErr()
 
+    def _initEventWriter(self, ring_size):
+        if not SHARED_MEMORY_AVAILABLE:
+            print2err('WARNING: multiprocessing.shared_memory is not '
+                      'available (Python 3.8+). Using the udp event '
+                      'transport.')
+            return
+        try:
+            self.eventWriter = SharedEventWriter(capacity=ring_size)
+            self.log('Shared Memory Event Transport: {}'.format(
+                self.eventWriter.name))
+        except Exception:
+            print2err('Error creating shared memory event transport. '
+                      'Using the udp event transport.')
+            printExceptionDetailsToStdErr()
+
     def _addDevices(self, config):
         # built device list and config from initial yaml config settings
         try:
@@ -819,7 +976,8 @@ class ioServer(object):
 
             if 'device_timer' in dev_conf:
                 interval = dev_conf['device_timer'].get('interval', 0.001)
-                dPoller = DeviceMonitor(dev_instance, interval)
+                max_interval = dev_conf['device_timer'].get('max_interval')
+                dPoller = DeviceMonitor(dev_instance, interval, max_interval)
                 self.deviceMonitors.append(dPoller)
                 ltxt = '%s timer period: %.3f' % (dev_cls_name, interval)
                 self.log(ltxt)
@@ -879,6 +1037,8 @@ class ioServer(object):
         while self._running:
             stime = Computer.getTime()
             self.processDeviceEvents()
+            if self.dsfile:
+                self.dsfile.writeBufferedEvents()
             dur = sleep_interval - (Computer.getTime() - stime)
             gevent.sleep(max(0.001, dur))
 
@@ -913,7 +1073,10 @@ class ioServer(object):
                 print2err('--------------------------------------')
 
     def _handleEvent(self, event):
-        self.eventBuffer.append(event)
+        if self.eventWriter:
+            self.eventWriter.put(event)
+        else:
+            self.eventBuffer.append(event)
 
     def clearEventBuffer(self, call_proc_events=True):
         if call_proc_events is True:
@@ -963,6 +1126,10 @@ class ioServer(object):
 
             self.closeDataStoreFile()
 
+            if self.eventWriter:
+                self.eventWriter.close()
+                self.eventWriter = None
+
             while self.devices:
                 self.devices.pop(0)._close()
         except Exception:
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+# Part of the psychopy.iohub library.
+# Copyright (C) 2012-2016 iSolver Software Solutions
+# Distributed under the terms of the GNU General Public License (GPL).
+"""Shared memory transport of events from the ioHub Server to the
+experiment process.
+
+For each event type the ioHub Server writes events to a ring of fixed
+width records (the event class's NUMPY_DTYPE) in shared memory. The
+experiment process reads new events straight from the rings, so
+ioHubConnection.getEvents() does not need a UDP request / reply. RPC's
+still use UDP.
+
+Each ring has one writer (the ioHub Server) and one reader (the
+experiment process). The writer only moves the ring's write count, the
+reader keeps its own read count, so neither waits on the other. When the
+reader falls behind by more than the ring's capacity, the oldest events
+are overwritten and counted as lost, as the global event buffer does.
+
+A directory segment lists the event types that have a ring, so rings can
+be created by the server as event types are first seen.
+"""
+from __future__ import division, absolute_import
+
+import os
+from operator import itemgetter
+
+import numpy as np
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+from .devices import DeviceEvent
+
+SHARED_MEMORY_AVAILABLE = shared_memory is not None
+
+# Max. number of event types that can have a ring.
+MAX_RINGS = 256
+# Size of the header at the start of each ring segment; holds the
+# write count.
+RING_HEADER_SIZE = 64
+
+
+def _eventDtype(event_type):
+    from .constants import EventConstants
+    return EventConstants.getClass(event_type).NUMPY_DTYPE
+
+
+def _attachSegment(name):
+    """Open an existing shared memory segment without registering it with
+    this process's resource tracker, which would otherwise unlink the
+    segment (owned by the ioHub Server) when this process ends."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:  # pylint: disable=broad-except
+            pass
+        return shm
+
+
+class SharedEventRing(object):
+    """A ring of capacity records of dtype in a shared memory segment.
+
+    The ring has one slot more than its capacity, for the record being
+    written, so that capacity records written before it can still be read.
+    """
+    def __init__(self, name, dtype, capacity, create=False, event_type=None):
+        self.name = name
+        self.event_type = event_type
+        self.dtype = np.dtype(dtype)
+        self.capacity = int(capacity)
+        self._slots = self.capacity + 1
+        size = RING_HEADER_SIZE + self._slots * self.dtype.itemsize
+        if create:
+            self._shm = shared_memory.SharedMemory(name=name, create=True,
+                                                   size=size)
+        else:
+            self._shm = _attachSegment(name)
+        buf = self._shm.buf
+        self._header = np.ndarray((1,), dtype=np.uint64, buffer=buf)
+        self._rows = np.ndarray((self._slots,), dtype=self.dtype,
+                                buffer=buf, offset=RING_HEADER_SIZE)
+        if create:
+            self._header[0] = 0
+
+        # reader side state
+        self.read_count = self.write_count
+        self.lost = 0
+        self._str_fields = [i for i, n in enumerate(self.dtype.names)
+                            if self.dtype[n].kind == 'S']
+
+    @property
+    def write_count(self):
+        return int(self._header[0])
+
+    def put(self, event):
+        """Write an event; only called by the ioHub Server."""
+        wcount = int(self._header[0])
+        self._rows[wcount % self._slots] = tuple(event)
+        self._header[0] = wcount + 1
+
+    def read(self):
+        """Return a copy of the records written since the last read."""
+        capacity = self.capacity
+        rcount = self.read_count
+        wcount = self.write_count
+        if wcount == rcount:
+            return self._rows[:0].copy()
+        start = max(rcount, wcount - capacity)
+        islots = np.arange(start, wcount) % self._slots
+        rows = self._rows[islots]
+        # Records the writer reached while they were copied are
+        # discarded; the spare slot is the one of the record being written.
+        valid = max(start, self.write_count - capacity)
+        if valid > start:
+            rows = rows[valid - start:]
+            start = valid
+        self.lost += start - rcount
+        self.read_count = wcount
+        return rows
+
+    def readLists(self):
+        """Read the new records, each as a list of event attribute values."""
+        events = [list(r) for r in self.read().tolist()]
+        str_fields = self._str_fields
+        if str_fields:
+            for e in events:
+                for i in str_fields:
+                    e[i] = e[i].decode('utf-8', 'replace')
+        return events
+
+    def clear(self):
+        self.read_count = self.write_count
+
+    def close(self, unlink=False):
+        self._header = self._rows = None
+        if self._shm is not None:
+            self._shm.close()
+            if unlink:
+                self._shm.unlink()
+            self._shm = None
+
+
+class _RingDirectory(object):
+    """Lists the (event_type, capacity) of each ring."""
+    def __init__(self, name, create=False):
+        self.name = name
+        size = (1 + 2 * MAX_RINGS) * 4
+        if create:
+            self._shm = shared_memory.SharedMemory(name=name, create=True,
+                                                   size=size)
+        else:
+            self._shm = _attachSegment(name)
+        self._data = np.ndarray((1 + 2 * MAX_RINGS,), dtype=np.uint32,
+                                buffer=self._shm.buf)
+        if create:
+            self._data[0] = 0
+
+    def __len__(self):
+        return int(self._data[0])
+
+    def add(self, event_type, capacity):
+        count = int(self._data[0])
+        if count >= MAX_RINGS:
+            raise ValueError('No more than %d event types can use the '
+                             'shared memory event transport.' % MAX_RINGS)
+        self._data[1 + 2 * count] = event_type
+        self._data[2 + 2 * count] = capacity
+        self._data[0] = count + 1
+
+    def entries(self, start=0):
+        count = int(self._data[0])
+        return [(int(self._data[1 + 2 * i]), int(self._data[2 + 2 * i]))
+                for i in range(start, count)]
+
+    def close(self, unlink=False):
+        self._data = None
+        if self._shm is not None:
+            self._shm.close()
+            if unlink:
+                self._shm.unlink()
+            self._shm = None
+
+
+def ringName(name, event_type):
+    return '%s_%d' % (name, event_type)
+
+
+class SharedEventWriter(object):
+    """ioHub Server side of the shared memory event transport.
+
+    A ring of `capacity` events is created the first time an event type is
+    put.
+    """
+    def __init__(self, name=None, capacity=2048, getDtype=_eventDtype):
+        if name is None:
+            name = 'iohub_%d' % os.getpid()
+        self.name = name
+        self.capacity = int(capacity)
+        self._getDtype = getDtype
+        self._directory = _RingDirectory(name, create=True)
+        self._rings = {}
+
+    def put(self, event):
+        etype = event[DeviceEvent.EVENT_TYPE_ID_INDEX]
+        ring = self._rings.get(etype)
+        if ring is None:
+            ring = self._addRing(etype)
+        ring.put(event)
+
+    def _addRing(self, event_type):
+        ring = SharedEventRing(ringName(self.name, event_type),
+                               self._getDtype(event_type), self.capacity,
+                               create=True, event_type=event_type)
+        self._rings[event_type] = ring
+        self._directory.add(event_type, self.capacity)
+        return ring
+
+    def close(self):
+        for ring in self._rings.values():
+            ring.close(unlink=True)
+        self._rings.clear()
+        if self._directory is not None:
+            self._directory.close(unlink=True)
+            self._directory = None
+
+
+class SharedEventReader(object):
+    """Experiment process side of the shared memory event transport."""
+    def __init__(self, name, getDtype=_eventDtype):
+        self.name = name
+        self._getDtype = getDtype
+        self._directory = _RingDirectory(name)
+        self._rings = []
+
+    def _attachNewRings(self):
+        for etype, capacity in self._directory.entries(len(self._rings)):
+            ring = SharedEventRing(ringName(self.name, etype),
+                                   self._getDtype(etype), capacity,
+                                   event_type=etype)
+            # events written before the ring was first seen are new
+            ring.read_count = 0
+            self._rings.append(ring)
+
+    def read(self):
+        """Return the events written since the last read, as lists of
+        event attribute values sorted by hub time. None if there are
+        no new events."""
+        if len(self._directory) != len(self._rings):
+            self._attachNewRings()
+        events = []
+        for ring in self._rings:
+            if ring.write_count != ring.read_count:
+                events.extend(ring.readLists())
+        if not events:
+            return None
+        if len(events) > 1:
+            events.sort(key=itemgetter(DeviceEvent.EVENT_HUB_TIME_INDEX))
+        return events
+
+    def readArrays(self):
+        """Return the events written since the last read as a dict of
+        event type id: structured array of the events of that type."""
+        if len(self._directory) != len(self._rings):
+            self._attachNewRings()
+        arrays = {}
+        for ring in self._rings:
+            if ring.write_count != ring.read_count:
+                rows = ring.read()
+                if len(rows):
+                    arrays[ring.event_type] = rows
+        return arrays
+
+    def clear(self):
+        if len(self._directory) != len(self._rings):
+            self._attachNewRings()
+        for ring in self._rings:
+            ring.clear()
+
+    @property
+    def lost(self):
+        """Number of events overwritten before they were read."""
+        return sum(ring.lost for ring in self._rings)
+
+    def close(self):
+        for ring in self._rings:
+            ring.close()
+        self._rings = []
+        if self._directory is not None:
+            self._directory.close()
+            self._directory = None
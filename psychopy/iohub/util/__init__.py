@@ -246,6 +246,24 @@ class NumPyRingBuffer(object):
         self._npa[(i % self.max_size) + self.max_size] = element
         self._index += 1
 
+    def extend(self, elements):
+        """Add each element of the sequence elements to the end of the
+        RingBuffer, as calling append for each element would, but only
+        writing the elements that will remain in the buffer.
+
+        :param sequence elements: The elements to add to the RingBuffer.
+        :returns None:
+
+        """
+        elements = numpy.asarray(elements, dtype=self._dtype)
+        count = len(elements)
+        elements = elements[count - min(count, self.max_size):]
+        start = self._index + count - len(elements)
+        slots = (numpy.arange(len(elements)) + start) % self.max_size
+        self._npa[slots] = elements
+        self._npa[slots + self.max_size] = elements
+        self._index += count
+
     def getElements(self):
         """Return the numpy array being used by the RingBuffer, the length of
         which will be equal to the number of elements added to the list, or the
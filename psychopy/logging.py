@@ -26,22 +26,33 @@ messages, (which PsychoPy doesn't use) using the commands::
     from psychopy import logging
     logging.console.setLevel(logging.CRITICAL)
 
+Messages are normally written to their targets only when :func:`flush` is
+called (e.g. between routines). For long or very verbose runs the writing can
+be moved to a background thread instead, so that neither logging nor
+flushing ever waits on the disk::
+
+    logging.setAsync(True)
+
 """
 
 # Much of the code below is based conceptually, if not syntactically, on the
-# python logging module but it's simpler (no threading) and maintaining a
-# stack of log entries for later writing (don't want files written while
-# drawing)
+# python logging module but it's simpler (no threading, unless the optional
+# asynchronous writer is used) and maintaining a stack of log entries for
+# later writing (don't want files written while drawing)
 
 from __future__ import absolute_import, print_function
 
 from builtins import object
 from past.builtins import basestring
 from os import path
+from collections import deque
+import os
 import atexit
 import sys
 import codecs
 import locale
+import struct
+import threading
 from psychopy import clock
 from psychopy.constants import PY3
 
@@ -122,16 +133,34 @@ def setDefaultClock(clock):
 
 
 class _LogEntry(object):
+    """A single logged message. Uses __slots__ (and derives `t_ms` and
+    `levelname` on demand) to stay small, as a logger may retain many of
+    these (see :meth:`_Logger.setRetention`).
+    """
+    __slots__ = ('t', 'level', 'message', 'obj')
 
     def __init__(self, level, message, t=None, obj=None):
         super(_LogEntry, self).__init__()
         self.t = t
-        self.t_ms = t * 1000
         self.level = level
-        self.levelname = getLevel(level)
         self.message = message
         self.obj = obj
 
+    @property
+    def t_ms(self):
+        return self.t * 1000
+
+    @property
+    def levelname(self):
+        return getLevel(self.level)
+
+    def asDict(self):
+        """Return the attributes of the entry, as used to format it
+        """
+        return {'t': self.t, 't_ms': self.t * 1000, 'level': self.level,
+                'levelname': getLevel(self.level), 'message': self.message,
+                'obj': self.obj}
+
 
 class LogFile(object):
     """A text stream to receive inputs from the logging system
@@ -210,6 +239,233 @@ class LogFile(object):
             pass
 
 
+class BinaryLogFile(object):
+    """A compact binary file to receive inputs from the logging system.
+
+    Much smaller and much faster to read back than a text :class:`LogFile`
+    at verbose (EXP or DEBUG) levels. Use
+    :func:`psychopy.tools.logtools.readBinaryLog` to load the file into a
+    NumPy structured array or a pandas DataFrame.
+
+    The file starts with an 8-byte signature (repeated each time the file
+    is appended to) followed by one block per flush of the logger. Each
+    block has a header (`'BLK\\x00'`, number of strings, number of entries
+    as little-endian uint32), the strings that first appear in this block
+    (uint32 id, uint32 length and the utf-8 encoded text) and then the
+    entries as fixed-size records: float64 time, int16 level, and uint32
+    ids of the message and of the object's name (0 for none).
+
+    Messages and object names are interned, so a repeated message is
+    stored only once. To bound memory use, the table of interned strings is
+    cleared when it holds more than `maxInterned` strings (a string seen
+    again after that is simply stored again).
+    """
+    signature = b'PSYBLOG1'
+    blockTag = b'BLK\x00'
+    blockHeader = struct.Struct('<4sII')
+    stringHeader = struct.Struct('<II')
+    entryRecord = struct.Struct('<dhII')
+
+    def __init__(self, f, level=WARNING, filemode='w', logger=None,
+                 maxInterned=10000):
+        """Create a binary log file as a target for logged entries of a
+        given level
+
+        :parameters:
+
+            - f:
+                a path to the file, that will be created if it doesn't
+                exist, or a file object opened in binary mode
+
+            - level:
+                The minimum level of importance that a message must have
+                to be logged by this target.
+
+            - filemode: 'a', 'w'
+                Append or overwrite existing log file
+
+            - maxInterned:
+                The maximum number of interned strings held in memory
+
+        """
+        super(BinaryLogFile, self).__init__()
+        if hasattr(f, 'write'):
+            self.stream = f
+        else:
+            self.stream = open(f, filemode.replace('b', '') + 'b')
+        self.stream.write(self.signature)
+        self.level = level
+        self.maxInterned = maxInterned
+        self._ids = {}
+        self._nextId = 1
+        if logger is None:
+            logger = root
+        self.logger = logger
+        self.logger.addTarget(self)
+
+    def setLevel(self, level):
+        """Set a new minimal level for the log file
+        """
+        if type(level) is not int:
+            raise TypeError("BinaryLogFile.setLevel() should be given an "
+                            "int, which is usually one of logging.INFO (not "
+                            "logging.info)")
+        self.level = level
+        self.logger._calcLowestTarget()
+
+    def _intern(self, text, newStrings):
+        """Return the id of `text`, adding it to `newStrings` if it hasn't
+        been written yet
+        """
+        strId = self._ids.get(text)
+        if strId is None:
+            if len(self._ids) >= self.maxInterned:
+                self._ids.clear()
+            strId = self._nextId
+            self._nextId += 1
+            self._ids[text] = strId
+            newStrings.append((strId, text))
+        return strId
+
+    def writeEntries(self, entries):
+        """Write a block of log entries (called by the logger when it is
+        flushed)
+        """
+        if not entries:
+            return
+        newStrings = []
+        records = []
+        for entry in entries:
+            msgId = self._intern(u'%s' % (entry.message,), newStrings)
+            if entry.obj is None:
+                objId = 0
+            else:
+                objName = getattr(entry.obj, 'name', None)
+                if objName is None:
+                    objName = type(entry.obj).__name__
+                objId = self._intern(u'%s' % (objName,), newStrings)
+            records.append(self.entryRecord.pack(
+                entry.t, entry.level, msgId, objId))
+        chunks = [self.blockHeader.pack(self.blockTag, len(newStrings),
+                                        len(records))]
+        for strId, text in newStrings:
+            encoded = text.encode('utf-8')
+            chunks.append(self.stringHeader.pack(strId, len(encoded)))
+            chunks.append(encoded)
+        chunks.extend(records)
+        self.stream.write(b''.join(chunks))
+
+    def write(self, txt):
+        """Write a message directly to this file at the current time (as
+        an entry with the level of this target)
+        """
+        self.writeEntries([_LogEntry(t=defaultClock.getTime(),
+                                     level=self.level, message=txt)])
+        self.stream.flush()
+
+
+class _AsyncLogWriter(threading.Thread):
+    """Writes the entries of a :class:`_Logger` to its targets from a
+    background thread (see :meth:`_Logger.setAsync`).
+
+    Entries are added to a deque, whose append and popleft are atomic, so
+    logging never takes a lock. The number of waiting entries is bounded by
+    `maxEntries`, beyond which new entries are either dropped (and the
+    number dropped is reported in the log) or the logging thread waits for
+    the writer to catch up.
+    """
+
+    def __init__(self, logger, maxEntries=100000, whenFull='drop',
+                 interval=0.1, fsync=False):
+        threading.Thread.__init__(self, name='AsyncLogWriter')
+        self.daemon = True
+        if whenFull not in ('drop', 'block'):
+            raise ValueError("whenFull should be 'drop' or 'block', not %r"
+                             % whenFull)
+        self.logger = logger
+        self.maxEntries = maxEntries
+        self.whenFull = whenFull
+        self.interval = interval
+        self.fsync = fsync
+        self.nDropped = 0
+        self._buffer = deque()
+        self._wake = threading.Event()
+        self._spaceFreed = threading.Condition()
+        self._stopping = False
+
+    def put(self, entry):
+        """Queue a log entry to be written (called by the logging thread)
+        """
+        if len(self._buffer) >= self.maxEntries:
+            if self.whenFull == 'drop':
+                self.nDropped += 1
+                return
+            # apply back-pressure: wait for the writer to make space
+            with self._spaceFreed:
+                while (len(self._buffer) >= self.maxEntries and
+                       self.is_alive()):
+                    self._wake.set()
+                    self._spaceFreed.wait(self.interval)
+        self._buffer.append(entry)
+
+    def flush(self, wait=False):
+        """Ask the writer to write all queued entries now. If `wait` is True
+        then block until they have been written.
+        """
+        if not self.is_alive():
+            self._writeBatch()
+        elif wait:
+            done = threading.Event()
+            self._buffer.append(done)
+            self._wake.set()
+            while not done.wait(self.interval):
+                if not self.is_alive():  # stopped before reaching our marker
+                    self._writeBatch()
+                    break
+        else:
+            self._wake.set()
+
+    def stop(self):
+        """Write all queued entries then end the thread
+        """
+        self._stopping = True
+        self._wake.set()
+        if self.is_alive():
+            self.join()
+        self._writeBatch()  # anything logged while we were stopping
+
+    def run(self):
+        while not self._stopping:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self._writeBatch()
+
+    def _writeBatch(self):
+        entries = []
+        markers = []
+        buffer = self._buffer
+        while buffer:
+            entry = buffer.popleft()
+            if isinstance(entry, _LogEntry):
+                entries.append(entry)
+            else:  # a flush(wait=True) is waiting for this point
+                markers.append(entry)
+        if self.nDropped:
+            nDropped, self.nDropped = self.nDropped, 0
+            msg = ("%i log messages were dropped because the asynchronous "
+                   "log buffer was full" % nDropped)
+            entries.append(_LogEntry(t=defaultClock.getTime(), level=WARNING,
+                                     message=msg))
+        with self._spaceFreed:
+            self._spaceFreed.notify_all()
+        try:
+            if entries:
+                self.logger._writeEntries(entries, fsync=self.fsync)
+        finally:
+            for marker in markers:
+                marker.set()
+
+
 class _Logger(object):
     """Maintains a set of log targets (text streams such as files of stdout)
 
@@ -217,17 +473,23 @@ class _Logger(object):
 
     """
 
-    def __init__(self, format="%(t).4f \t%(levelname)s \t%(message)s"):
+    def __init__(self, format="%(t).4f \t%(levelname)s \t%(message)s",
+                 maxFlushed=None):
         """The string-formatted elements %(xxxx)f can be used, where
         each xxxx is an attribute of the LogEntry.
         e.g. t, t_ms, level, levelname, message
+
+        `maxFlushed` sets how many already-written entries are kept in
+        self.flushed (see :meth:`setRetention`).
         """
         super(_Logger, self).__init__()
         self.targets = []
         self.flushed = []
+        self.setRetention(maxFlushed)
         self.toFlush = []
         self.format = format
         self.lowestTarget = 50
+        self._asyncWriter = None
 
     def __del__(self):
         self.flush()
@@ -254,6 +516,81 @@ class _Logger(object):
         for target in self.targets:
             self.lowestTarget = min(self.lowestTarget, target.level)
 
+    def setRetention(self, maxFlushed=None):
+        """Set how many entries are kept (in self.flushed) after they have
+        been written to the targets.
+
+        By default (`None`) all entries are kept for the whole session. For
+        long and verbose (e.g. EXP or DEBUG level) recordings that can
+        amount to millions of entries, so give a number to keep only the
+        most recent ones, in a ring buffer, and memory use stays flat.
+        0 keeps none.
+        """
+        if maxFlushed is None:
+            flushed = list(self.flushed)
+        else:
+            flushed = deque(self.flushed, maxlen=maxFlushed)
+        self.flushed = flushed
+
+    def getRecentEntries(self, n=None, level=NOTSET):
+        """Return a list of the most recent `n` (or all retained) entries
+        that have been written, optionally only those of at least `level`
+        """
+        entries = [entry for entry in list(self.flushed)
+                   if entry.level >= level]
+        if n is not None:
+            entries = entries[-n:] if n > 0 else []
+        return entries
+
+    @property
+    def isAsync(self):
+        """True if entries are being written by a background thread
+        """
+        return self._asyncWriter is not None
+
+    def setAsync(self, enabled=True, maxEntries=100000, whenFull='drop',
+                 interval=0.1, fsync=False):
+        """Write log entries from a background thread rather than when
+        :meth:`flush` is called.
+
+        In asynchronous mode `log()` only queues the entry and `flush()`
+        returns immediately (unless called with `wait=True`), while a
+        writer thread formats, writes and flushes the entries in batches.
+
+        :parameters:
+
+            - enabled:
+                True to start writing asynchronously, False to write all
+                queued entries and go back to writing on `flush()`
+
+            - maxEntries:
+                The maximum number of entries waiting to be written
+
+            - whenFull: 'drop', 'block'
+                What to do with a new entry when `maxEntries` are already
+                waiting: 'drop' discards it (the number of dropped entries
+                is then logged as a warning), 'block' waits until the writer
+                has made space
+
+            - interval:
+                The longest time (s) an entry waits for the writer if
+                `flush()` isn't called
+
+            - fsync:
+                Also call `os.fsync` on file targets after each batch
+
+        """
+        if self._asyncWriter is not None:
+            writer, self._asyncWriter = self._asyncWriter, None
+            writer.stop()
+        if not enabled:
+            return
+        self.flush()  # anything logged before now is written synchronously
+        self._asyncWriter = _AsyncLogWriter(
+            self, maxEntries=maxEntries, whenFull=whenFull,
+            interval=interval, fsync=fsync)
+        self._asyncWriter.start()
+
     def log(self, message, level, t=None, obj=None):
         """Add the `message` to the log stack at the appropriate `level`
 
@@ -268,38 +605,82 @@ class _Logger(object):
             global defaultClock
             t = defaultClock.getTime()
         # add message to list
-        self.toFlush.append(
-            _LogEntry(t=t, level=level, message=message, obj=obj))
+        entry = _LogEntry(t=t, level=level, message=message, obj=obj)
+        writer = self._asyncWriter
+        if writer is None:
+            self.toFlush.append(entry)
+        else:
+            writer.put(entry)
 
-    def flush(self):
+    def flush(self, wait=False):
         """Process all current messages to each target
+
+        If the logger is asynchronous (see :meth:`setAsync`) this only wakes
+        the writer thread, unless `wait` is True in which case it blocks
+        until all messages logged so far have been written.
+        """
+        writer = self._asyncWriter
+        if writer is not None:
+            writer.flush(wait=wait)
+            return
+        toFlush = self.toFlush
+        self.toFlush = []  # a new empty list
+        self._writeEntries(toFlush)
+
+    def _writeEntries(self, entries, fsync=False):
+        """Write `entries` to each target and move them to self.flushed
         """
-        # loop through targets then entries in toFlush
+        # loop through targets then entries
         # so that stream.flush can be called just once
         formatted = {}  # keep a dict - so only do the formatting once
-        for target in self.targets:
-            for thisEntry in self.toFlush:
-                if thisEntry.level >= target.level:
+        for target in list(self.targets):
+            if hasattr(target, 'writeEntries'):
+                # e.g. a BinaryLogFile, which doesn't need formatting
+                target.writeEntries([thisEntry for thisEntry in entries
+                                     if thisEntry.level >= target.level])
+            else:
+                for thisEntry in entries:
+                    if thisEntry.level < target.level:
+                        continue
                     if not thisEntry in formatted:
                         # convert the entry into a formatted string
-                        formatted[thisEntry] = self.format % thisEntry.__dict__
+                        formatted[thisEntry] = (self.format %
+                                                thisEntry.asDict())
                     target.write(formatted[thisEntry] + '\n')
             if hasattr(target.stream, 'flush'):
                 target.stream.flush()
+            if fsync and hasattr(target.stream, 'fileno'):
+                try:
+                    os.fsync(target.stream.fileno())
+                except (OSError, ValueError):
+                    pass  # e.g. the console or a closed file
         # finished processing entries - move them to self.flushed
-        self.flushed.extend(self.toFlush)
-        self.toFlush = []  # a new empty list
+        self.flushed.extend(entries)
 
 root = _Logger()
 console = LogFile()
 
 
-def flush(logger=root):
+def flush(logger=root, wait=False):
     """Send current messages in the log to all targets
+
+    If the logger is asynchronous (see :func:`setAsync`) this returns
+    immediately, unless `wait` is True.
     """
-    logger.flush()
+    logger.flush(wait=wait)
 # make sure this function gets called as python closes
-atexit.register(flush)
+atexit.register(flush, wait=True)
+
+
+def setAsync(enabled=True, logger=root, **kwargs):
+    """Write log messages from a background thread so that neither logging
+    nor flushing waits on the disk. See :meth:`_Logger.setAsync` for the
+    options (`maxEntries`, `whenFull`, `interval` and `fsync`).
+
+    usage::
+        logging.setAsync(True, maxEntries=50000, whenFull='block')
+    """
+    logger.setAsync(enabled, **kwargs)
 
 
 def critical(msg, t=None, obj=None):
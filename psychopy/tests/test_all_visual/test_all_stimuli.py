@@ -1,5 +1,6 @@
 from __future__ import division
 from builtins import object
+from builtins import chr
 
 import sys, os, copy
 from psychopy import visual, monitors, prefs, constants
@@ -464,6 +465,30 @@ class _baseVisualTest(object):
             utils.compareScreenshot('text2_%s.png' %self.contextName,
                                     win, crit=20)
 
+    def test_text_glyphAtlas(self):
+        win = self.win
+        if win.winType == 'pygame':
+            pytest.skip("glyph atlas only available for pyglet backend")
+        fontFile = os.path.join(prefs.paths['resources'], 'DejaVuSerif.ttf')
+        stim = visual.TextStim(win, text=u'\u03A8a', font=fontFile,
+                               height=0.8*self.scaleFactor,
+                               useGlyphAtlas=True)
+        stim.draw()
+        w, h = stim.boundingBox
+        assert w > 0 and h > 0
+        # a second stim with the same font and size shares the atlas
+        stim2 = visual.TextStim(win, text='12:00', font=fontFile,
+                                height=0.8*self.scaleFactor,
+                                useGlyphAtlas=True)
+        assert stim2._glyphAtlas is stim._glyphAtlas
+        for n in range(100):
+            stim2.text = '%i' % n
+            stim2.draw()
+        # letters beyond the first atlas page are added as needed
+        stim2.text = u''.join(chr(n) for n in range(0x20, 0x17f))
+        stim2.draw()
+        win.flip()
+
     def test_text_with_add(self):
         # pyglet text will reset the blendMode to 'avg' so check that we are
         # getting back to 'add' if we want it
@@ -663,6 +688,34 @@ class _baseVisualTest(object):
         assert not numpy.alltrue(prevVerticesPix==dots.verticesPix), \
             "dots.verticesPix failed to change after dots.setPos()"
 
+    def test_dots_precomputed(self):
+        win = self.win
+        dots = visual.DotStim(win, nDots=500, fieldShape='circle',
+            fieldSize=1*self.scaleFactor, dotLife=5, noiseDots='walk',
+            speed=0.01*self.scaleFactor, coherence=0.5)
+        for background in (True, False):
+            dots.precomputeFrames(10, background=background)
+            trajectory = dots._trajectory
+            frames = trajectory.frames.copy()
+            for frameN in range(5):
+                dots.draw()
+                assert numpy.all(dots._verticesBase == frames[frameN])
+            # the rest of the frames go when the motion changes
+            dots.coherence = 0.8
+            assert dots._trajectory is None
+            assert numpy.all(dots._verticesBase == frames[4])
+            # and the dots carry on from the state of the last frame drawn
+            assert numpy.all(dots._dotsLife == trajectory.lives[4])
+            dots.draw()
+        # and the dots carry on after the last frame
+        dots.precomputeFrames(3)
+        for frameN in range(5):
+            dots.draw()
+        assert dots._trajectory is None
+        radius = numpy.hypot(*dots._verticesBase.T)
+        assert radius.max() <= 0.5*self.scaleFactor + 1e-5
+        win.flip()
+
     def test_element_array(self):
         win = self.win
         if not win._haveShaders:
@@ -688,6 +741,79 @@ class _baseVisualTest(object):
         utils.compareScreenshot('elarray1_%s.png' %(self.contextName), win)
         win.flip()
 
+    def test_element_array_instanced(self):
+        win = self.win
+        if not win._haveShaders:
+            pytest.skip("ElementArray requires shaders, which aren't available")
+        thetas = numpy.arange(0,360,10)
+        N=len(thetas)
+
+        radii = numpy.linspace(0,1.0,N)*self.scaleFactor
+        x, y = pol2cart(theta=thetas, radius=radii)
+        xys = numpy.array([x,y]).transpose()
+        spiral = visual.ElementArrayStim(
+                win, opacities = 0, nElements=N, sizes=0.5*self.scaleFactor,
+                sfs=1.0, xys=xys, oris=-thetas, instanced=True)
+        if not spiral.isInstanced:
+            pytest.skip("Instanced drawing isn't supported in this context")
+        spiral.draw()
+        # check that changed arrays are sent after the first draw() call
+        spiral.opacities = 1.0
+        spiral.sfs = 3.0
+        spiral.draw()
+        win.flip()
+        spiral.draw()
+        # should look the same as the standard drawing
+        utils.compareScreenshot('elarray1_%s.png' %(self.contextName), win,
+                                crit=20)
+        win.flip()
+
+    def test_element_array_indices(self):
+        win = self.win
+        if not win._haveShaders:
+            pytest.skip("ElementArray requires shaders, which aren't available")
+        thetas = numpy.arange(0,360,10)
+        N=len(thetas)
+
+        radii = numpy.linspace(0,1.0,N)*self.scaleFactor
+        x, y = pol2cart(theta=thetas, radius=radii)
+        xys = numpy.array([x,y]).transpose()
+        # start from the wrong values and fix them a few elements at a time
+        spiral = visual.ElementArrayStim(
+                win, opacities = 0, nElements=N, sizes=0.5*self.scaleFactor,
+                sfs=3.0, xys=xys, oris=0)
+        spiral.draw()
+        for first in range(0, N, 6):
+            indices = numpy.arange(first, min(first + 6, N))
+            spiral.setOris(-thetas[indices], indices=indices)
+            spiral.setOpacities(1.0, indices=indices)
+            spiral.draw()
+        assert numpy.all(spiral.oris == -thetas)
+        assert numpy.all(spiral.opacities == 1)
+        # operations and masks only affect the chosen elements
+        spiral.setOris(90, operation='+', indices=thetas < 100)
+        assert numpy.all(spiral.oris[thetas < 100] == 90 - thetas[thetas < 100])
+        spiral.setOris(-90, operation='+', indices=thetas < 100)
+        assert numpy.all(spiral.oris == -thetas)
+        # arrays from the user are left alone, even integer ones
+        userXYs = numpy.zeros((N, 2), dtype=int)
+        spiral.setXYs(userXYs)
+        spiral.setXYs([0.5, 0.5], indices=[0])
+        assert not userXYs.any()
+        assert numpy.all(spiral.xys[0] == 0.5)
+        spiral.setXYs(xys)
+        # as a subclass might store them
+        oris = numpy.zeros(N, dtype=int)
+        spiral.__dict__['oris'] = oris
+        spiral.setOris(0.5, indices=[0])
+        assert not oris.any()
+        assert spiral.oris[0] == 0.5
+        spiral.setOris(-thetas)
+        win.flip()
+        spiral.draw()
+        utils.compareScreenshot('elarray1_%s.png' %(self.contextName), win)
+        win.flip()
+
     def test_aperture(self):
         win = self.win
         if not win.allowStencil:
@@ -2,7 +2,13 @@ from builtins import object
 from psychopy import visual, event
 from psychopy.visual import Window
 from psychopy.visual.textbox import TextBox
+from psychopy.visual.textbox.fontmanager import (FontAtlasCache,
+                                                  GlyphAtlasTextures)
 
+import os
+import gc
+import shutil
+from tempfile import mkdtemp
 import pytest
 
 # cd psychopy/psychopy
@@ -31,3 +37,52 @@ class Test_textbox(object):
     def test_something(self):
         # to-do: test visual display, char position, etc
         pass
+
+
+@pytest.mark.textbox
+class Test_fontAtlasCache(object):
+    def setup_class(self):
+        self.temp_dir = mkdtemp(prefix='psychopy-tests-fontcache')
+
+    def teardown_class(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_lru(self):
+        cache = FontAtlasCache(max_size=2)
+        atlas = cache.getGlyphAtlas('', 20)
+        assert cache.getGlyphAtlas('', 20) is atlas
+        cache.getGlyphAtlas('', 21)
+        cache.getGlyphAtlas('', 20)  # now more recent than 21
+        cache.getGlyphAtlas('', 22)
+        assert len(cache) == 2
+        assert [key[2] for key in cache.keys()] == [20, 22]
+
+    def test_evicted_textures(self):
+        cache = FontAtlasCache(max_size=1)
+        textures = GlyphAtlasTextures()
+        atlas = cache.getGlyphAtlas('', 20)
+        textures.set(atlas, 'texture', atlas.cache_revision)
+        assert textures.get(atlas) == ('texture', atlas.cache_revision)
+        cache.getGlyphAtlas('', 21)
+        # still in use after being evicted
+        assert len(textures) == 1
+        del atlas
+        gc.collect()
+        # the texture is deleted next time the window binds one
+        assert len(textures) == 0
+        assert textures._released == ['texture']
+
+    def test_persistence(self):
+        cache = FontAtlasCache(cache_dir=self.temp_dir)
+        atlas = cache.getGlyphAtlas('', 20)
+        vertices, texCoords, w, h = atlas.layout(u'abc DEF')
+        cache.save()
+        assert len(os.listdir(self.temp_dir)) == 1
+        # a new cache (as in the next session) loads the glyphs from disk
+        cache2 = FontAtlasCache(cache_dir=self.temp_dir)
+        atlas2 = cache2.getGlyphAtlas('', 20)
+        assert atlas2 is not atlas
+        assert len(atlas2._codes) == len(atlas._codes)
+        vertices2, texCoords2, w2, h2 = atlas2.layout(u'abc DEF')
+        assert (vertices2 == vertices).all()
+        assert (texCoords2 == texCoords).all()
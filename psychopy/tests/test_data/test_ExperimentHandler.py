@@ -2,6 +2,7 @@
 
 from builtins import object
 from psychopy import data, logging
+from psychopy.tools.filetools import fromFile
 import numpy as np
 import os, glob, shutil
 import io
@@ -99,6 +100,154 @@ class TestExperimentHandler(object):
             contents = f.read()
         assert contents == "mutable,\n[1],\n[9999],\n"
 
+    def test_columnar_matches_default(self):
+        # columnar storage must produce exactly the same data file
+        contents = []
+        for columnar in (False, True):
+            exp = data.ExperimentHandler(
+                name='testExp',
+                extraInfo={'participant': 'jwp, 01'},
+                savePickle=False,
+                saveWideText=False,
+                dataFileName=self.tmpDir + 'columnar%s' % columnar,
+                columnar=columnar
+            )
+            conds = data.createFactorialTrialList(
+                {'faceExpression': ['happy', 'sad'], 'presTime': [0.2, 0.3]}
+            )
+            trials = data.TrialHandler(trialList=conds, nReps=2,
+                                       method='sequential')
+            exp.addLoop(trials)
+            for trialN, trial in enumerate(trials):
+                trials.addData('resp.rt', trialN * 0.1)
+                if trialN % 3:
+                    exp.addData('resp.key', 'left')
+                exp.addData('resp.corr', bool(trialN % 2))
+                exp.addData('mixed', trialN if trialN < 3 else 'none')
+                exp.addData('mutable', [trialN])
+                exp.nextEntry()
+            exp.addData('orphan', 1)
+            exp.saveAsWideText(exp.dataFileName + '.csv', delim=',')
+            with io.open(exp.dataFileName + '.csv', 'r',
+                         encoding='utf-8-sig') as f:
+                contents.append(f.read())
+            assert len(exp.entries) == 8
+            assert exp.getAllEntries()[-1] == {'orphan': 1}
+            assert exp.getAllEntries()[5]['mutable'] == [5]
+            df = exp.getDataFrame()
+            assert list(df['resp.rt'][:2]) == [0.0, 0.1]
+
+        assert contents[0] == contents[1]
+
+    def test_columnar_pickle(self):
+        exp = data.ExperimentHandler(
+            savePickle=False,
+            saveWideText=False,
+            dataFileName=self.tmpDir + 'columnarPickle',
+            columnar=True
+        )
+        for n in range(100):  # more than the initial column capacity
+            exp.addData('n', n)
+            exp.addData('val', n / 2.0)
+            exp.nextEntry()
+        exp.saveAsPickle(exp.dataFileName)
+
+        loaded = fromFile(exp.dataFileName + '.psydat')
+        assert len(loaded.entries) == 100
+        assert loaded.entries[-1] == {'n': 99, 'val': 49.5}
+        assert loaded.entries == exp.entries
+
+    def test_streamWideText(self):
+        exp = data.ExperimentHandler(
+            extraInfo={'participant': 'jwp'},
+            savePickle=False,
+            saveWideText=True,
+            dataFileName=self.tmpDir + 'streamed',
+            streamWideText=True
+        )
+        fileName = self.tmpDir + 'streamed.csv'
+        for trialN in range(4):
+            exp.addData('resp.rt', trialN)
+            if trialN >= 2:  # a column that only appears late in the run
+                exp.addData('resp.key', 'a,b')
+            exp.nextEntry()
+
+        # data are on disk before the experiment ends
+        exp._streamWriter.flush()
+        with io.open(fileName, 'r', encoding='utf-8-sig') as f:
+            contents = f.read()
+        # in the same column order as saveAsWideText
+        assert contents == ("resp.rt,resp.key,participant,\n"
+                            "0,,jwp,\n"
+                            "1,,jwp,\n"
+                            "2,\"a,b\",jwp,\n"
+                            "3,\"a,b\",jwp,\n")
+
+        exp.addData('resp.rt', 4)  # orphan entry is written on close
+        exp.close()
+        with io.open(fileName, 'r', encoding='utf-8-sig') as f:
+            contents = f.read()
+        assert contents.endswith("3,\"a,b\",jwp,\n4,,,\n")
+
+    def test_streamWideText_layout(self):
+        files = {}
+        for stream in (False, True):
+            name = self.tmpDir + 'layout%s' % stream
+            exp = data.ExperimentHandler(
+                extraInfo={'participant': u'jwp-ö'},
+                savePickle=False,
+                saveWideText=True,
+                dataFileName=name,
+                streamWideText=stream
+            )
+            for loopName in ('practice', 'main'):
+                trials = data.TrialHandler(
+                    trialList=[{'ori': 0}, {'ori': 90}], nReps=2,
+                    method='sequential', name=loopName)
+                exp.addLoop(trials)
+                for trial in trials:
+                    exp.addData('resp.rt', 0.5)
+                    if loopName == 'main':
+                        exp.addData('resp.key', u'ä')
+                    exp.nextEntry()
+            exp.close()
+            with io.open(name + '.csv', 'r', encoding='utf-8-sig') as f:
+                files[stream] = f.read()
+        assert files[True] == files[False]
+
+    def test_streamWideText_rewrite_fails(self, monkeypatch):
+        from psychopy.data import streaming
+
+        def replaceFile(src, dst):
+            raise OSError('disk full')
+        monkeypatch.setattr(streaming, 'replaceFile', replaceFile)
+        writer = streaming.WideTextStreamWriter(self.tmpDir + 'failed.csv')
+        writer.addEntry({'a': 1})
+        writer.flush()
+        writer.addEntry({'a': 2, 'b': 3})  # needs the file to be rewritten
+        writer.addEntry({'a': 4})
+        writer.close()
+        # the data written before are never lost
+        with io.open(writer.fileName, 'r', encoding='utf-8-sig') as f:
+            assert f.read() == "a,\n1,\n4,\n"
+
+    def test_streamWideText_append(self):
+        name = self.tmpDir + 'appended'
+        for run in range(2):
+            exp = data.ExperimentHandler(
+                savePickle=False,
+                saveWideText=True,
+                dataFileName=name,
+                appendFiles=True,
+                streamWideText=True
+            )
+            exp.addData('run', run)
+            exp.nextEntry()
+            exp.close()
+        with io.open(name + '.csv', 'r', encoding='utf-8-sig') as f:
+            contents = f.read()
+        assert contents == "run,\n0,\nrun,\n1,\n"
+
     def test_unicode_conditions(self):
         fileName = self.tmpDir + 'unicode_conds'
 
@@ -6,6 +6,7 @@ from builtins import range
 from builtins import object
 import numpy as np
 import shutil
+import gc
 import json_tricks
 from tempfile import mkdtemp, mkstemp
 from operator import itemgetter
@@ -622,6 +623,96 @@ class TestQuestHandler(_BaseTestStairHandler):
         
         assert np.isclose(q.epsilon, epsilon, atol=1e-4)
 
+    def test_speculative(self):
+        kwargs = dict(startVal=0.5, startValSd=0.2, pThreshold=0.63,
+                      gamma=0.01, nTrials=20, minVal=0, maxVal=1)
+        q1 = data.QuestHandler(**kwargs)
+        q2 = data.QuestHandler(speculative=True, **kwargs)
+        responses = [1, 1, 0, 1, 1, 0, 0, 1, 1, 1] * 2
+        for trialN, (intensity, response) in enumerate(zip(q1, responses)):
+            assert next(q2) == intensity
+            # the intensity actually presented differs on some trials
+            if trialN % 7 == 3:
+                intensity = intensity / 2
+                q1.addResponse(response, intensity)
+                q2.addResponse(response, intensity)
+            else:
+                q1.addResponse(response)
+                q2.addResponse(response)
+        assert q2.intensities == q1.intensities
+        assert q2.mean() == q1.mean()
+
+        q2.origin = ''
+        assert q2 == json_tricks.loads(q2.saveAsJson())
+
+    def test_speculative_cleanup(self):
+        from psychopy.data.staircase import _speculations
+        q = data.QuestHandler(startVal=0.5, startValSd=0.2, nTrials=1,
+                              speculative=True)
+        next(q)
+        key = id(q)
+        assert key in _speculations
+        # an abandoned staircase doesn't keep its speculation alive
+        del q
+        gc.collect()
+        assert key not in _speculations
+
+        q = data.QuestHandler(startVal=0.5, startValSd=0.2, nTrials=1,
+                              speculative=True)
+        for intensity in q:
+            q.addResponse(1)
+        assert id(q) not in _speculations
+
+    def test_speculative_missing(self):
+        # handlers saved before the speculative option existed
+        q = data.QuestHandler(startVal=0.5, startValSd=0.2, nTrials=5)
+        del q.__dict__['speculative']
+        for intensity in q:
+            q.addResponse(1)
+        assert len(q.data) == 5
+
+    def test_importData(self):
+        rng = np.random.RandomState(3)
+        intensities = list(rng.uniform(-0.5, 1.5, 300))
+        results = list(rng.randint(0, 2, 300))
+        kwargs = dict(startVal=0.5, startValSd=0.2, pThreshold=0.63,
+                      gamma=0.01, nTrials=20, range=2)
+        # trial by trial, as stopInterval is checked after each
+        q1 = data.QuestHandler(stopInterval=1e-9, **kwargs)
+        q1._quest.warnPdf = False
+        q1.importData(intensities, results)
+        q2 = data.QuestHandler(**kwargs)
+        q2.importData(intensities, results)
+
+        assert q2.intensities == q1.intensities
+        assert q2.data == q1.data
+        assert q2.thisTrialN == q1.thisTrialN == 299
+        assert q2.nTrials == q1.nTrials == 320
+        assert not q2.finished
+        np.testing.assert_allclose(q2._quest.pdf, q1._quest.pdf, rtol=1e-9,
+                                   atol=1e-300)
+        assert np.isclose(q2._nextIntensity, q1._nextIntensity)
+        assert np.isclose(next(q2), next(q1))
+
+    def test_recompute_long_history(self):
+        # the product of the likelihoods of 5000 trials underflows, but not
+        # their sum in log space
+        rng = np.random.RandomState(4)
+        q = data.QuestHandler(startVal=0, startValSd=0.5, pThreshold=0.82,
+                              nTrials=10, range=4)
+        intensities = rng.uniform(-1, 1, 5000)
+        q._quest.intensity = list(intensities)
+        probs = [q._quest.p(x - 0.2) for x in intensities]
+        q._quest.response = list((rng.rand(5000) < probs).astype(int))
+        q._quest.recompute()
+        assert np.all(np.isfinite(q._quest.pdf)) and q._quest.pdf.max() > 0
+        assert abs(q.mean() - 0.2) < 0.05 and q.sd() < 0.05
+
+        # the psychometric function tables are shared
+        q2 = data.QuestHandler(startVal=1, startValSd=0.5, pThreshold=0.82,
+                               nTrials=10, range=4)
+        assert q2._quest.s2 is q._quest.s2
+
 
 class TestPsiHandler(_BaseTestStairHandler):
     def test_comparison_equals(self):
@@ -750,6 +841,62 @@ class TestPsiHandler(_BaseTestStairHandler):
         p_loaded = fromFile(path)
         assert p == p_loaded
 
+    @pytest.mark.parametrize('engineOptions', [
+        dict(dtype='float64'),
+        dict(dtype='float32', threads=2, chunkSize=8)])
+    def test_lean_engine(self, engineOptions):
+        kwargs = dict(nTrials=20, intensRange=[0.1, 10],
+                      alphaRange=[0.1, 10], betaRange=[0.1, 3],
+                      intensPrecision=0.1, alphaPrecision=0.1,
+                      betaPrecision=0.1, delta=0.01)
+        p1 = data.PsiHandler(**kwargs)
+        p2 = data.PsiHandler(engine='lean', engineOptions=engineOptions,
+                             **kwargs)
+        responses = [1, 1, 0, 1, 1, 0, 0, 1, 1, 1] * 2
+        for intensity, response in zip(p1, responses):
+            assert next(p2) == intensity
+            p1.addResponse(response)
+            p2.addResponse(response)
+        np.testing.assert_allclose(p2.estimateLambda(), p1.estimateLambda())
+        np.testing.assert_allclose(
+            p2._psi._expectedEntropyX,
+            p1._psi._expectedEntropyX.ravel(), rtol=1e-5)
+
+    @pytest.mark.parametrize('engine', ['full', 'lean'])
+    def test_speculative(self, engine):
+        kwargs = dict(nTrials=20, intensRange=[0.1, 10],
+                      alphaRange=[0.1, 10], betaRange=[0.1, 3],
+                      intensPrecision=0.1, alphaPrecision=0.1,
+                      betaPrecision=0.1, delta=0.01, engine=engine)
+        p1 = data.PsiHandler(**kwargs)
+        p2 = data.PsiHandler(speculative=True, **kwargs)
+        responses = [1, 1, 0, 1, 1, 0, 0, 1, 1, 1] * 2
+        for intensity, response in zip(p1, responses):
+            assert next(p2) == intensity
+            p1.addResponse(response)
+            p2.addResponse(response)
+        assert p2.intensities == p1.intensities
+        np.testing.assert_array_equal(p2.estimateLambda(),
+                                      p1.estimateLambda())
+
+    def test_lean_engine_json_dump(self):
+        p = data.PsiHandler(nTrials=10, intensRange=[0.1, 10],
+                            alphaRange=[0.1, 10], betaRange=[0.1, 3],
+                            intensPrecision=1, alphaPrecision=1,
+                            betaPrecision=0.5, delta=0.01, engine='lean')
+        p.addResponse(1)
+        p.__next__()
+        dump = p.saveAsJson()
+
+        p.origin = ''
+        assert p == json_tricks.loads(dump)
+
+        with pytest.raises(ValueError):
+            data.PsiHandler(nTrials=10, intensRange=[0.1, 10],
+                            alphaRange=[0.1, 10], betaRange=[0.1, 3],
+                            intensPrecision=1, alphaPrecision=1,
+                            betaPrecision=0.5, delta=0.01, engine='fast')
+
 
 class TestMultiStairHandler(_BaseTestMultiStairHandler):
     """
@@ -1005,6 +1152,37 @@ def test_QuestPlusHandler_saveAsJson():
     shutil.rmtree(temp_dir)
 
 
+def test_QuestPlusHandler_old_attribs():
+    import sys
+    if not (sys.version_info.major == 3 and sys.version_info.minor >= 6):
+        pytest.skip('QUEST+ only works on Python 3.6+')
+
+    from psychopy.data.staircase import QuestPlusHandler
+
+    thresholds = np.arange(-40, 0 + 1)
+    q = QuestPlusHandler(nTrials=20,
+                         intensityVals=thresholds.copy(),
+                         thresholdVals=thresholds,
+                         slopeVals=3.5,
+                         lowerAsymptoteVals=0.5,
+                         lapseRateVals=0.02,
+                         responseVals=['Correct', 'Incorrect'],
+                         stimScale='dB')
+
+    # handlers saved before these attributes existed
+    for attrib in ('engine', 'speculative', '_qpNextIntensity'):
+        del q.__dict__[attrib]
+    q.__next__()
+    q.addResponse(response='Correct')
+    q.__next__()
+    assert len(q.intensities) == 2
+    assert 'threshold' in q.paramEstimate
+    assert 'threshold' in q.prior
+    assert 'threshold' in q.posterior
+    q.origin = ''
+    q.saveAsJson()
+
+
 def test_QuestPlusHandler_paramEstimate_weibull():
     import sys
     if not (sys.version_info.major == 3 and sys.version_info.minor >= 6):
@@ -1231,6 +1409,132 @@ def test_QuesPlusHandler_unknown_stimSelectionOptions():
                              stimSelectionOptions=stim_selection_options)
 
 
+@pytest.mark.parametrize('scale', ['dB', 'log10', 'linear'])
+def test_QuestPlusHandler_native_engine(scale):
+    pytest.importorskip('questplus')
+    from psychopy.data.staircase import QuestPlusHandler
+
+    if scale == 'dB':
+        thresholds = np.arange(-40, 0 + 1)
+        contrasts = thresholds.copy()
+    else:
+        thresholds = np.linspace(0.02, 1, 30)
+        contrasts = np.linspace(0.01, 1, 50)
+        if scale == 'log10':
+            thresholds = np.log10(thresholds)
+            contrasts = np.log10(contrasts)
+    kwargs = dict(nTrials=20, intensityVals=contrasts,
+                  thresholdVals=thresholds, slopeVals=[2, 3.5, 5],
+                  lowerAsymptoteVals=0.5, lapseRateVals=[0.01, 0.02],
+                  responseVals=['Correct', 'Incorrect'],
+                  prior=dict(slope=[0.25, 0.5, 0.25]), stimScale=scale)
+    q1 = QuestPlusHandler(**kwargs)
+    q2 = QuestPlusHandler(engine='native', **kwargs)
+    q3 = QuestPlusHandler(engine='native', engineOptions=dict(dtype='float32'),
+                          **kwargs)
+    responses = ['Correct', 'Correct', 'Incorrect', 'Correct'] * 5
+    for intensity, response in zip(q1, responses):
+        assert next(q2) == intensity
+        assert next(q3) == intensity
+        for q in q1, q2, q3:
+            q.addResponse(response)
+
+    for q in q2, q3:
+        for name, estimate in q1.paramEstimate.items():
+            np.testing.assert_allclose(q.paramEstimate[name], estimate)
+        for name, posterior in q1.posterior.items():
+            np.testing.assert_allclose(q.posterior[name], posterior,
+                                       atol=1e-12)
+            np.testing.assert_allclose(q.prior[name], q1.prior[name])
+
+
+@pytest.mark.parametrize('func', ['weibull', 'logistic', 'normal', 'gumbel'])
+def test_QuestPlusHandler_native_psychometricFunc(func):
+    from psychopy.data.questplus import psychometricFunction
+    from psychopy.data.staircase import QuestPlusHandler
+
+    thresholds = np.arange(-40, 0 + 1)
+    q = QuestPlusHandler(nTrials=60, intensityVals=thresholds,
+                         thresholdVals=thresholds, slopeVals=3.5,
+                         lowerAsymptoteVals=0.5, lapseRateVals=0.02,
+                         responseVals=[1, 0], psychometricFunc=func,
+                         stimScale='dB', engine='native')
+    rng = np.random.RandomState(1)
+    for intensity in q:
+        p = psychometricFunction(func, intensity, threshold=-20, slope=3.5,
+                                 lowerAsymptote=0.5, lapseRate=0.02,
+                                 stimScale='dB')
+        q.addResponse(int(rng.rand() < p))
+    assert abs(q.paramEstimate['threshold'] + 20) < 5
+
+    with pytest.raises(ValueError):
+        QuestPlusHandler(nTrials=60, intensityVals=thresholds,
+                         thresholdVals=thresholds, slopeVals=3.5,
+                         lowerAsymptoteVals=0.5, lapseRateVals=0.02,
+                         psychometricFunc=func, engine='quest')
+
+
+def test_QuestPlusHandler_native_prune():
+    from psychopy.data.staircase import QuestPlusHandler
+
+    thresholds = np.arange(-40, 0 + 1)
+    prior = dict(threshold=np.where(thresholds < -30, 0, 1),
+                 lapseRate=[0.1, 0.8, 0.1])
+    kwargs = dict(nTrials=20, intensityVals=thresholds,
+                  thresholdVals=thresholds, slopeVals=[2, 3.5],
+                  lowerAsymptoteVals=0.5, lapseRateVals=[0, 0.01, 0.02],
+                  prior=prior, stimScale='dB', engine='native',
+                  stimSelectionMethod='minNEntropy',
+                  stimSelectionOptions=dict(randomSeed=0))
+    q1 = QuestPlusHandler(engineOptions=dict(pruneBelow=-1), **kwargs)
+    q2 = QuestPlusHandler(**kwargs)
+    q3 = QuestPlusHandler(engineOptions=dict(pruneBelow=0.01), **kwargs)
+    assert len(q2._qp.posterior) < len(q1._qp.posterior)
+    assert len(q3._qp.posterior) < len(q2._qp.posterior)
+
+    responses = ['Yes', 'Yes', 'No', 'Yes'] * 5
+    for intensity, response in zip(q1, responses):
+        assert next(q2) == intensity
+        next(q3)
+        for q in q1, q2, q3:
+            q.addResponse(response)
+    for name, posterior in q1.posterior.items():
+        np.testing.assert_allclose(q2.posterior[name], posterior, atol=1e-15)
+    assert q3.posterior['lapseRate'][0] == 0
+
+
+def test_QuestPlusHandler_native_saveAsJson():
+    from psychopy.data.staircase import QuestPlusHandler
+
+    thresholds = np.arange(-40, 0 + 1)
+    q = QuestPlusHandler(nTrials=20, intensityVals=thresholds,
+                         thresholdVals=thresholds, slopeVals=3.5,
+                         lowerAsymptoteVals=0.5, lapseRateVals=0.02,
+                         responseVals=['Correct', 'Incorrect'],
+                         stimSelectionMethod='minNEntropy',
+                         stimSelectionOptions=dict(randomSeed=3),
+                         stimScale='dB', engine='native')
+    q.origin = ''
+    q.__next__()
+    q.addResponse(response='Correct')
+    q.__next__()
+
+    temp_dir = mkdtemp(prefix='psychopy-tests-testdata')
+    _, path = mkstemp(dir=temp_dir, suffix='.json')
+    q.saveAsJson(fileName=path, fileCollisionMethod='overwrite')
+    q_loaded = fromFile(path)
+    assert q == q_loaded
+    # the likelihood tables are shared rather than saved
+    assert q_loaded._qp._probFirstXParams is q._qp._probFirstXParams
+
+    # and the random number generator continues where it was
+    q.addResponse(response='Incorrect')
+    q_loaded.addResponse(response='Incorrect')
+    assert q_loaded.__next__() == q.__next__()
+
+    shutil.rmtree(temp_dir)
+
+
 if __name__ == '__main__':
     test_QuestPlusHandler()
     test_QuestPlusHandler_startIntensity()
@@ -0,0 +1,77 @@
+"""Test simulateStaircase"""
+
+from __future__ import division, print_function
+
+import numpy as np
+import pytest
+
+from psychopy import data
+from psychopy.data.simulation import simulateStaircase
+
+
+@pytest.mark.parametrize('kwargs', [
+    dict(startVal=0.5, stepType='db', stepSizes=[8, 4, 4, 2], nTrials=30,
+         nUp=1, nDown=3, minVal=0.001),
+    dict(startVal=0.5, stepType='lin', stepSizes=0.05, nTrials=20, nUp=1,
+         nDown=2, minVal=0, maxVal=1, nReversals=6),
+    dict(startVal=0.5, stepType='log', stepSizes=[0.4, 0.2, 0.1], nTrials=10,
+         nUp=2, nDown=3, applyInitialRule=False),
+])
+def test_simple(kwargs):
+    observer = dict(threshold=np.linspace(0.05, 0.3, 200),
+                    stimScale='linear', lapseRate=0.05)
+    sim = simulateStaircase(observer, nObservers=200, seed=1, maxTrials=150,
+                            reversalsToAverage=4, **kwargs)
+    assert sim.finished.sum() > 150
+
+    # the same responses give the same intensities with a StairHandler
+    for i in range(len(sim.thresholds)):
+        stairs = data.StairHandler(**kwargs)
+        for trialN, intensity in enumerate(stairs):
+            if trialN == len(sim.responses[i]):
+                break
+            assert np.isclose(intensity, sim.intensities[i, trialN],
+                              rtol=1e-12)
+            stairs.addResponse(int(sim.responses[i, trialN]))
+        assert stairs.finished == sim.finished[i]
+        assert len(stairs.data) == sim.nTrials[i]
+        if stairs.reversalIntensities:
+            assert np.isclose(sim.estimates[i],
+                              np.mean(stairs.reversalIntensities[-4:]))
+        else:
+            assert np.isnan(sim.estimates[i])
+    assert np.all(sim.responses[np.arange(200), sim.nTrials - 1] >= 0)
+    assert np.all(sim.responses[np.isnan(sim.intensities)] == -1)
+
+    summary = sim.summary()
+    assert summary['unfinished'] == 200 - sim.finished.sum()
+    assert summary['meanTrials'] == np.mean(sim.nTrials)
+
+
+def test_quest():
+    observer = dict(threshold=-1, slope=3.5, lowerAsymptote=0.5,
+                    lapseRate=0.01)
+    kwargs = dict(startVal=-0.5, startValSd=0.5, pThreshold=0.82, nTrials=40,
+                  gamma=0.5, delta=0.01)
+    sim = simulateStaircase(observer, nObservers=16, stairType='quest',
+                            processes=1, seed=2, **kwargs)
+    assert np.all(sim.finished) and np.all(sim.nTrials == 40)
+    assert abs(sim.bias) < 0.1
+
+    # results don't depend on the number of processes
+    sim2 = simulateStaircase(observer, nObservers=16, stairType='quest',
+                             processes=2, seed=2, **kwargs)
+    np.testing.assert_array_equal(sim2.estimates, sim.estimates)
+    np.testing.assert_array_equal(sim2.responses, sim.responses)
+
+    sim3 = simulateStaircase(observer, nObservers=4, stairType='quest',
+                             processes=1, maxTrials=10, **kwargs)
+    assert not np.any(sim3.finished) and np.all(sim3.nTrials == 10)
+
+
+def test_invalid():
+    with pytest.raises(ValueError):
+        simulateStaircase(dict(threshold=0.1), stairType='interleaved',
+                          startVal=0.5)
+    with pytest.raises(ValueError):
+        simulateStaircase(dict(slope=3), startVal=0.5)
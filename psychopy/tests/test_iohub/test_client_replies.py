@@ -0,0 +1,47 @@
+""" Test how ioHubConnection handles the replies of the ioHub Server.
+"""
+import pytest
+
+pytest.importorskip('gevent')
+pytest.importorskip('msgpack')
+pytest.importorskip('psutil')
+
+from psychopy.iohub.client import ioHubConnection, ioHubRPCFuture
+
+
+class _UDPClient(object):
+    """Returns the given replies, as msgpack decodes them (bytes)."""
+    def __init__(self, replies):
+        self.replies = list(replies)
+
+    def receive(self):
+        return self.replies.pop(0), ('127.0.0.1', 9034)
+
+
+def makeConnection(replies):
+    # only what _receiveReply needs of a connection
+    connection = ioHubConnection.__new__(ioHubConnection)
+    connection.udp_client = _UDPClient(replies)
+    connection._pending_replies = {}
+    return connection
+
+
+def test_rpc_result():
+    reply = [b'RPC_RESULT', b'getTime', 1.5]
+    connection = makeConnection([reply])
+    assert connection._receiveReply() == reply
+
+
+def test_async_result():
+    connection = makeConnection([[b'ASYNC_RESULT', 3, 1.5],
+                                 [b'BATCH_RESULT', 4, [2, 3]]])
+    future = ioHubRPCFuture(connection)
+    connection._pending_replies[3] = future
+    assert connection._receiveReply() is connection._pending_replies
+    assert future.done() and future._reply == 1.5
+
+    futures = [ioHubRPCFuture(connection), ioHubRPCFuture(connection)]
+    connection._pending_replies[4] = futures
+    connection._receiveReply()
+    assert [f._reply for f in futures] == [2, 3]
+    assert not connection._pending_replies
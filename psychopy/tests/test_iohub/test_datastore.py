@@ -0,0 +1,162 @@
+""" Test the buffering of events written to the ioHub DataStore.
+"""
+import os
+import shutil
+import threading
+import time
+from tempfile import mkdtemp
+
+import numpy as np
+import pytest
+
+tables = pytest.importorskip('tables')
+pytest.importorskip('gevent')
+pytest.importorskip('msgpack')
+
+from psychopy.iohub.datastore import (EventTableBuffer, DataStoreWriter,
+                                      getEventTableOptions)
+
+event_dtype = np.dtype([('event_id', 'u4'), ('time', 'f8'),
+                        ('text', 'S16')])
+
+
+class _DataStoreFile(object):
+    """What a DataStoreWriter needs of a DataStoreFile."""
+    def __init__(self):
+        self._fileLock = threading.RLock()
+        self.flushed_events = 0
+
+    def bufferedFlush(self, eventCount=1):
+        self.flushed_events += eventCount
+
+
+class TestEventTableBuffer(object):
+
+    def setup_method(self, method):
+        self.temp_dir = mkdtemp(prefix='psychopy-tests-iohub')
+        self.h5file = tables.open_file(os.path.join(self.temp_dir,
+                                                    'events.hdf5'), 'w')
+        self.table = self.h5file.create_table(self.h5file.root, 'Events',
+                                              event_dtype)
+
+    def teardown_method(self, method):
+        self.h5file.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_size(self):
+        ebuffer = EventTableBuffer(self.table, event_dtype, size=4,
+                                   interval=10.0)
+        written = [ebuffer.add([i, i * 0.5, b'evt %d' % i], 0.0)
+                   for i in range(10)]
+        # written in chunks, when the buffer is full
+        assert written == [0, 0, 0, 4, 0, 0, 0, 4, 0, 0]
+        assert self.table.nrows == 8 and ebuffer.count == 2
+        assert ebuffer.write(0.0) == 2
+        assert self.table.nrows == 10
+        assert list(self.table.col('event_id')) == list(range(10))
+        assert self.table[9]['text'] == b'evt 9'
+
+        stats = ebuffer.getStats()
+        assert stats['buffered'] == 0 and stats['max_buffered'] == 4
+        assert stats['events_written'] == 10 and stats['writes'] == 3
+
+    def test_interval(self):
+        ebuffer = EventTableBuffer(self.table, event_dtype, size=100,
+                                   interval=0.1)
+        assert not ebuffer.isDue(1.0)
+        ebuffer.add([1, 1.0, b'first'], 1.0)
+        ebuffer.add([2, 1.05, b'second'], 1.05)
+        assert not ebuffer.isDue(1.09)
+        assert ebuffer.isDue(1.1)
+        assert ebuffer.write(1.1) == 2
+
+        stats = ebuffer.getStats()
+        assert stats['max_latency'] == pytest.approx(0.1)
+        assert stats['mean_latency'] == pytest.approx(0.075)
+
+    def test_writer(self):
+        dsfile = _DataStoreFile()
+        writer = DataStoreWriter(dsfile, queue_size=2)
+        ebuffer = EventTableBuffer(self.table, event_dtype, size=4,
+                                   interval=10.0, writer=writer)
+        for i in range(10):
+            # events are handed over to the writer rather than written
+            assert ebuffer.add([i, i * 0.5, b'evt %d' % i], 0.0) == 0
+        assert ebuffer.write(0.0) == 0
+        writer.join()
+        assert self.table.nrows == 10 and dsfile.flushed_events == 10
+        assert list(self.table.col('event_id')) == list(range(10))
+        assert ebuffer.getStats()['writes'] == 3
+        writer.stop()
+
+    def test_writer_overflow(self):
+        dsfile = _DataStoreFile()
+        writer = DataStoreWriter(dsfile, queue_size=1,
+                                 overflow_policy='drop')
+        ebuffer = EventTableBuffer(self.table, event_dtype, size=1,
+                                   interval=10.0, writer=writer)
+        # the writer can't write while the file is locked
+        with dsfile._fileLock:
+            ebuffer.add([0, 0.0, b''], 0.0)
+            while writer.getStats()['queued']:
+                time.sleep(0.001)  # wait for the writer to take the chunk
+            for i in range(1, 3):
+                ebuffer.add([i, 0.0, b''], 0.0)
+        writer.stop()
+        stats = writer.getStats()
+        # one chunk written, one waiting in the queue, the last one dropped
+        assert stats['dropped_events'] == 1
+        assert self.table.nrows == 2
+
+        with pytest.raises(ValueError):
+            DataStoreWriter(dsfile, overflow_policy='wait')
+
+
+def test_event_table_options():
+    settings = dict(event_table_profile='small',
+                    event_table_profiles=dict(
+                        small={'complib': 'blosc:zstd', 'complevel': 5,
+                               'shuffle': True}),
+                    event_tables=dict(BINOCULAR_EYE_SAMPLE=dict(
+                        expectedrows=1000000, complevel=7)))
+    options = getEventTableOptions(settings, 'KEYBOARD_PRESS')
+    assert options['filters'].complib == 'blosc:zstd'
+    assert options['filters'].complevel == 5 and options['filters'].shuffle
+    assert options['expectedrows'] == 10000 and 'chunkshape' not in options
+
+    # event_tables settings override the profile's
+    options = getEventTableOptions(settings, 'BINOCULAR_EYE_SAMPLE')
+    assert options['filters'].complevel == 7
+    assert options['expectedrows'] == 1000000
+
+    # no compression by default, or if the settings are invalid
+    options = getEventTableOptions(dict(), 'KEYBOARD_PRESS')
+    assert options['filters'].complevel == 0
+    settings['event_tables']['MOUSE_MOVE'] = dict(complib='unknown',
+                                                  chunkshape=256)
+    options = getEventTableOptions(settings, 'MOUSE_MOVE')
+    assert options['filters'].complevel == 0
+    assert options['chunkshape'] == (256,)
+
+
+def test_default_settings_merge():
+    from psychopy.iohub import IOHUB_DIRECTORY
+    from psychopy.iohub.util import updateDict, yload, yLoader
+    with open(os.path.join(IOHUB_DIRECTORY, 'datastore',
+                           'default_datastore.yaml'), 'r') as f:
+        _, defaults = yload(f, Loader=yLoader).popitem()
+    # as the ioHub Server merges a user's data_store settings with these
+    settings = dict(event_table_profile='fast',
+                    event_table_profiles=dict(fast=dict(complevel=9)),
+                    event_tables=dict(KEYBOARD_PRESS=dict(expectedrows=50)))
+    updateDict(settings, defaults)
+    assert sorted(settings['event_table_profiles']) == sorted(
+        defaults['event_table_profiles'])
+    options = getEventTableOptions(settings, 'KEYBOARD_PRESS')
+    assert options['filters'].complib == 'blosc:lz4'
+    assert options['filters'].complevel == 9
+    assert options['expectedrows'] == 50
+    # the default tuning of the other tables is kept
+    options = getEventTableOptions(settings, 'BINOCULAR_EYE_SAMPLE')
+    expected = defaults['event_tables']['BINOCULAR_EYE_SAMPLE']
+    assert options['expectedrows'] == expected['expectedrows']
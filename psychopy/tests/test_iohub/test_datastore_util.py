@@ -0,0 +1,152 @@
+""" Test reading the events of trials from ioHub DataStore files with the
+ExperimentDataAccessUtility.
+"""
+import json
+import os
+import shutil
+from tempfile import mkdtemp
+
+import numpy as np
+import pytest
+
+tables = pytest.importorskip('tables')
+pytest.importorskip('gevent')
+pytest.importorskip('msgpack')
+
+from psychopy.iohub.datastore import (ClassTableMappings, ExperimentMetaData,
+                                      SessionMetaData)
+from psychopy.iohub.datastore import util
+
+SAMPLE, OTHER = 50, 51
+event_dtype = np.dtype([('experiment_id', 'u4'), ('session_id', 'u4'),
+                        ('type', 'u2'), ('filter_id', 'i2'),
+                        ('time', 'f8'), ('x', 'f4')])
+cv_dtype = np.dtype([('EXPERIMENT_ID', 'i4'), ('SESSION_ID', 'i4'),
+                     ('trial', 'i4'), ('TRIAL_START', 'f8'),
+                     ('TRIAL_END', 'f8'), ('cond', 'S8')])
+
+
+def writeHubFile(filePath, seed=1):
+    """Write a DataStore file holding two sessions of five trials."""
+    rs = np.random.RandomState(seed)
+    h5file = tables.open_file(filePath, 'w')
+    mappings = h5file.create_table('/', 'class_table_mapping',
+                                   ClassTableMappings)
+    data = h5file.create_group('/', 'data_collection')
+    experiments = h5file.create_table(data, 'experiment_meta_data',
+                                      ExperimentMetaData)
+    experiments.append([(1, b'exp', b'', b'', b'1', 2)])
+    sessions = h5file.create_table(data, 'session_meta_data',
+                                   SessionMetaData)
+    for session_id in (1, 2):
+        sessions.append([(session_id, 1, b's%d' % session_id, b'', b'',
+                          json.dumps({}).encode('utf-8'))])
+
+    cvs = []
+    events = []
+    for session_id in (1, 2):
+        for trial in range(5):
+            start = session_id * 100.0 + trial * 10.0
+            cvs.append((1, session_id, trial, start, start + 5.0,
+                        b'ab'[trial % 2:][:1]))
+        for etype in (SAMPLE, SAMPLE, OTHER):
+            for t in rs.uniform(session_id * 100.0, session_id * 100.0 + 60,
+                                size=100):
+                events.append((1, session_id, etype, rs.randint(2), t,
+                               rs.normal()))
+    rs.shuffle(events)
+    cv_group = h5file.create_group(data, 'condition_variables')
+    h5file.create_table(cv_group, 'EXP_CV_1',
+                        np.array(cvs, dtype=cv_dtype))
+    event_group = h5file.create_group(data, 'events')
+    table = h5file.create_table(event_group, 'Samples',
+                                np.array(events, dtype=event_dtype))
+    for etype in (SAMPLE, OTHER):
+        mappings.append([(etype, 1, b'SampleEvent', table._v_pathname)])
+    h5file.close()
+
+
+class TestExperimentDataAccessUtility(object):
+
+    def setup_method(self, method):
+        self.temp_dir = mkdtemp(prefix='psychopy-tests-iohub')
+        writeHubFile(os.path.join(self.temp_dir, 'events.hdf5'))
+        self.util = util.ExperimentDataAccessUtility(self.temp_dir,
+                                                     'events.hdf5')
+        self.table = self.util.hdfFile.root.data_collection.events.Samples
+
+    def teardown_method(self, method):
+        self.util.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_condition_variables(self):
+        cvs = self.util.getConditionVariables()
+        assert len(cvs) == 10
+        assert [cv.trial for cv in cvs[:5]] == list(range(5))
+        cvs = self.util.getConditionVariables(dict(trial=(' in ', [1, 3]),
+                                                   cond=('==', 'b')))
+        assert [(cv.SESSION_ID, cv.trial) for cv in cvs] == [
+            (1, 1), (1, 3), (2, 1), (2, 3)]
+
+    @pytest.mark.parametrize('filter_id', [None, 1])
+    def test_event_attribute_values(self, filter_id):
+        results = self.util.getEventAttributeValues(
+            SAMPLE, ['time', 'x'], filter_id=filter_id,
+            startConditions=dict(time=('>=', '@TRIAL_START@')),
+            endConditions=dict(time=('<=', '@TRIAL_END@')))
+        assert len(results) == 10
+        for result in results:
+            # the same events as querying the table per trial
+            expected = np.sort(self.table.read_where(result.query_string),
+                               order='time')
+            assert len(expected) > 0
+            np.testing.assert_array_equal(result.time, expected['time'])
+            np.testing.assert_array_equal(result.x, expected['x'])
+            assert (result.time >= result.condition_set.TRIAL_START).all()
+
+        results = self.util.getEventAttributeValues(SAMPLE, 'time')
+        expected = self.table.read_where(results[-1].query_string,
+                                         field='time')
+        np.testing.assert_array_equal(results[-1].time, np.sort(expected))
+
+    def test_trial_events(self):
+        events = self.util.getTrialEvents(SAMPLE, 'TRIAL_START', 'TRIAL_END',
+                                          ['session_id', 'time', 'x'])
+        assert events.dtype.names == ('session_id', 'time', 'x',
+                                      'EXPERIMENT_ID', 'SESSION_ID', 'trial',
+                                      'TRIAL_START', 'TRIAL_END', 'cond')
+        samples = self.table.read_where('type == %d' % SAMPLE)
+        expected = 0
+        for cv in self.util.getConditionVariables():
+            in_trial = ((samples['session_id'] == cv.SESSION_ID) &
+                        (samples['time'] >= cv.TRIAL_START) &
+                        (samples['time'] <= cv.TRIAL_END))
+            trial_events = events[(events['SESSION_ID'] == cv.SESSION_ID) &
+                                  (events['trial'] == cv.trial)]
+            np.testing.assert_array_equal(
+                trial_events['time'], np.sort(samples['time'][in_trial]))
+            expected += in_trial.sum()
+        assert len(events) == expected
+        assert (events['session_id'] == events['SESSION_ID']).all()
+
+    def test_session_codes(self):
+        self.util.close()
+        self.util = util.ExperimentDataAccessUtility(
+            self.temp_dir, 'events.hdf5', sessionCodes=[b's2'])
+        events = self.util.getEventTableArray(SAMPLE)
+        assert len(events) == 200 and (events['session_id'] == 2).all()
+        assert (np.diff(events['time']) >= 0).all()
+        assert len(self.util.getConditionVariablesArray()) == 5
+
+    def test_export(self):
+        pd = pytest.importorskip('pandas')
+        pytest.importorskip('pyarrow')
+        filePaths = [os.path.join(self.temp_dir, 'events.hdf5')]
+        outputPaths = util.exportHubFiles(filePaths, self.temp_dir, SAMPLE,
+                                          'TRIAL_START', 'TRIAL_END',
+                                          processes=1)
+        assert outputPaths == [os.path.join(self.temp_dir, 'events.parquet')]
+        dataFrame = pd.read_parquet(outputPaths[0])
+        events = self.util.getTrialEvents(SAMPLE, 'TRIAL_START', 'TRIAL_END')
+        np.testing.assert_array_equal(dataFrame['time'], events['time'])
+        assert set(dataFrame['cond']) == {'a', 'b'}
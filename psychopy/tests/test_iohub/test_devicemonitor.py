@@ -0,0 +1,101 @@
+""" Test the polling of devices by the ioHub Server's DeviceMonitor.
+"""
+import os
+import sys
+
+import pytest
+
+gevent = pytest.importorskip('gevent')
+pytest.importorskip('msgpack')
+
+from psychopy.iohub.server import DeviceMonitor
+
+
+class _Device(object):
+    """What a DeviceMonitor needs of a Device."""
+    name = 'test'
+
+    def __init__(self, event_polls=(), fileno=None, reporting=True,
+                 read=True):
+        self._native_event_count = 0
+        self.event_polls = event_polls
+        self.fileno = fileno
+        self.reporting = reporting
+        self.read = read
+        self.polls = 0
+
+    def isReportingEvents(self):
+        return self.reporting
+
+    def _poll(self):
+        self.polls += 1
+        if not (self.reporting and self.read):
+            # like Serial._poll when not reporting, leaves the data unread
+            return
+        if self.fileno is not None:
+            try:
+                self._native_event_count += len(os.read(self.fileno, 64))
+            except OSError:
+                pass
+        elif self.polls in self.event_polls:
+            self._native_event_count += 1
+
+    def _getPollFileno(self):
+        return self.fileno
+
+
+def runMonitor(monitor, duration):
+    monitor.start()
+    gevent.sleep(duration)
+    monitor.running = False
+    monitor.join()
+    return monitor.getStats()
+
+
+def test_adaptive_interval():
+    device = _Device(event_polls=(3,))
+    stats = runMonitor(DeviceMonitor(device, 0.001, 0.008), 0.1)
+    assert stats['polls'] == device.polls
+    assert stats['empty_polls'] == device.polls - 1
+    # polled at up to 8 msec intervals rather than every msec
+    assert stats['interval'] == 0.008
+    assert device.polls < 50
+
+
+@pytest.mark.skipif(sys.platform == 'win32',
+                    reason="gevent can only wait on sockets on Windows")
+def test_fileno_wakeup():
+    rfd, wfd = os.pipe()
+    os.set_blocking(rfd, False)
+    try:
+        device = _Device(fileno=rfd)
+        monitor = DeviceMonitor(device, 0.001)
+        gevent.spawn_later(0.02, os.write, wfd, b'abc')
+        stats = runMonitor(monitor, 0.05)
+        assert device._native_event_count == 3
+        assert stats['fileno_wakeups'] == 1
+        # woken by the pipe, not polled every msec
+        assert device.polls <= 3
+    finally:
+        os.close(rfd)
+        os.close(wfd)
+
+
+@pytest.mark.skipif(sys.platform == 'win32',
+                    reason="gevent can only wait on sockets on Windows")
+@pytest.mark.parametrize('reporting, read', [(False, True),
+                                             (True, False)])
+def test_fileno_unread(reporting, read):
+    rfd, wfd = os.pipe()
+    os.set_blocking(rfd, False)
+    try:
+        os.write(wfd, b'abc')
+        device = _Device(fileno=rfd, reporting=reporting, read=read)
+        stats = runMonitor(DeviceMonitor(device, 0.001, 0.008), 0.1)
+        # the readable file descriptor doesn't make the monitor spin, and
+        # the interval still backs off
+        assert device.polls < 50
+        assert stats['interval'] == 0.008
+    finally:
+        os.close(rfd)
+        os.close(wfd)
@@ -4,6 +4,7 @@
 import pytest
 from psychopy.tests.utils import skip_under_travis
 from psychopy.tests.test_iohub.testutil import startHubProcess, stopHubProcess, getTime
+from psychopy.iohub.devices.experiment import MessageEvent
 
 @skip_under_travis
 def testGetEvents():
@@ -92,3 +93,54 @@ def testAllBuffersClear():
     assert len(exp_events) == 0
 
     stopHubProcess()
+
+@skip_under_travis
+def testGetEventsAsNumpy():
+    """
+    """
+    io = startHubProcess()
+
+    exp = io.devices.experiment
+    assert exp != None
+
+    io.sendMessageEvent("Test Message 1")
+    io.sendMessageEvent("Test Message 2", category="TEST")
+
+    events = io.getEvents(as_type='numpy')
+    messages = events[MessageEvent.EVENT_TYPE_ID]
+    assert messages.dtype == MessageEvent.NUMPY_DTYPE
+    assert list(messages['text']) == [b"Test Message 1", b"Test Message 2"]
+    assert messages['category'][1] == b"TEST"
+
+    assert io.getEvents(as_type='numpy') == {}
+
+    exp_events = exp.getEvents(asType='numpy')
+    assert len(exp_events[MessageEvent.EVENT_TYPE_ID]) == 2
+
+    stopHubProcess()
+
+@skip_under_travis
+def testBatchedRequests():
+    """
+    """
+    io = startHubProcess()
+
+    exp = io.devices.experiment
+    assert exp != None
+
+    with io.batch():
+        io.sendMessageEvent("Batched Message 1")
+        io.sendMessageEvent("Batched Message 2")
+        exp_events = exp.getEvents.future()
+        with pytest.raises(RuntimeError):
+            exp_events.result()
+    assert [e.text for e in exp_events.result()] == ["Batched Message 1",
+                                                     "Batched Message 2"]
+
+    io.sendMessageEvent("Async Message")
+    exp_events = exp.getEvents.future()
+    assert len(io.getEvents()) == 3
+    assert exp_events.done()
+    assert exp_events.result()[0].text == "Async Message"
+
+    stopHubProcess()
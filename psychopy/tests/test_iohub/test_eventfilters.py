@@ -0,0 +1,109 @@
+""" Test that the iohub moving window filters give the same results when
+values are added in a batch as when they are added one at a time.
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip('gevent')
+pytest.importorskip('msgpack')
+
+from psychopy.iohub.constants import EventConstants
+from psychopy.iohub.devices import eventfilters
+from psychopy.iohub.devices.eyetracker.eye_events import \
+    MonocularEyeSampleEvent
+from psychopy.iohub.util import NumPyRingBuffer
+
+EventConstants.addClassMappings(
+    (EventConstants.MONOCULAR_EYE_SAMPLE,),
+    dict(MonocularEyeSampleEvent=MonocularEyeSampleEvent))
+
+field_index = MonocularEyeSampleEvent.CLASS_ATTRIBUTE_NAMES.index('gaze_x')
+
+filter_types = [
+    (eventfilters.MovingWindowFilter, dict(length=4, knot_pos='latest')),
+    (eventfilters.PassThroughFilter, dict(knot_pos=0)),
+    (eventfilters.MedianFilter, dict(length=5, knot_pos='center')),
+    (eventfilters.WeightedAverageFilter, dict(weights=(1, 2, 4), knot_pos=1)),
+    (eventfilters.StampFilter, dict(level=1)),
+]
+
+
+def randomValues(count, seed=1):
+    values = np.random.RandomState(seed).normal(size=count)
+    values[[5, 17, 18]] = np.nan
+    return values
+
+
+def makeEvents(values):
+    events = []
+    for v in values:
+        event = [0] * len(MonocularEyeSampleEvent.CLASS_ATTRIBUTE_NAMES)
+        event[field_index] = v
+        events.append(event)
+    return events
+
+
+@pytest.mark.parametrize('filter_type, kwargs', filter_types)
+@pytest.mark.parametrize('batch_size', [1, 2, 9, 40])
+def test_add_many_values(filter_type, kwargs, batch_size):
+    values = randomValues(40)
+    efilter = filter_type(**kwargs)
+    expected = [r[1] for r in (efilter.add(v) for v in values) if r]
+
+    efilter = filter_type(**kwargs)
+    results = []
+    for i in range(0, len(values), batch_size):
+        results.extend(efilter.addMany(values[i:i + batch_size]))
+    np.testing.assert_allclose(results, expected, rtol=1e-6, equal_nan=True)
+
+
+@pytest.mark.parametrize('filter_type, kwargs', filter_types[:4])
+def test_add_many_events(filter_type, kwargs):
+    kwargs = dict(kwargs, inplace=True, event_field_name='gaze_x',
+                  event_type=EventConstants.MONOCULAR_EYE_SAMPLE)
+    values = randomValues(30)
+    events = makeEvents(values)
+    efilter = filter_type(**kwargs)
+    expected = [r for r in (efilter.add(e) for e in events) if r]
+
+    batch_events = makeEvents(values)
+    efilter = filter_type(**kwargs)
+    results = efilter.addMany(batch_events[:7])
+    results.extend(efilter.addMany(batch_events[7:]))
+    assert len(results) == len(expected)
+    for (e, v), (ee, ev) in zip(results, expected):
+        # the same events are filtered, in place
+        assert [e is b for b in batch_events] == [ee is b for b in events]
+        np.testing.assert_allclose(v, ev, rtol=1e-6, equal_nan=True)
+        np.testing.assert_allclose(e, ee, rtol=1e-6, equal_nan=True)
+
+
+def test_running_median():
+    values = randomValues(200, seed=2)
+    values[values > 1] = 1.0  # repeated values
+    efilter = eventfilters.MedianFilter(length=7, knot_pos='center')
+    for i, v in enumerate(values):
+        result = efilter.add(v)
+        if i >= 6:
+            window = values[i - 6:i + 1].astype(np.float32)
+            np.testing.assert_equal(result[1], np.median(window))
+    with pytest.raises(ValueError):
+        eventfilters.MedianFilter(length=4, knot_pos=0)
+
+
+@pytest.mark.parametrize('count', [0, 3, 5, 12])
+def test_ring_buffer_extend(count):
+    buf = NumPyRingBuffer(5)
+    expected = NumPyRingBuffer(5)
+    for b in (buf, expected):
+        b.append(-1.0)
+        b.append(-2.0)
+    values = np.arange(count, dtype=np.float32)
+    buf.extend(values)
+    for v in values:
+        expected.append(v)
+    assert len(buf) == len(expected)
+    assert buf.isFull() == expected.isFull()
+    valid = slice(5 - len(buf), None)
+    np.testing.assert_array_equal(buf.getElements()[valid],
+                                  expected.getElements()[valid])
@@ -0,0 +1,66 @@
+""" Test that the eye tracker event parser creates the same events when
+samples are parsed in chunks as when they are parsed one at a time.
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip('gevent')
+pytest.importorskip('msgpack')
+
+from psychopy.iohub.constants import EventConstants
+from psychopy.iohub.devices import DeviceEvent
+from psychopy.iohub.devices.eyetracker.eye_events import (
+    MonocularEyeSampleEvent, BinocularEyeSampleEvent)
+from psychopy.iohub.devices.eyetracker.filters import parser
+
+EventConstants.addClassMappings(
+    (EventConstants.MONOCULAR_EYE_SAMPLE,
+     EventConstants.BINOCULAR_EYE_SAMPLE),
+    dict(MonocularEyeSampleEvent=MonocularEyeSampleEvent,
+         BinocularEyeSampleEvent=BinocularEyeSampleEvent))
+
+sampling_rate = 250
+samples = parser._simulatedBinocularSamples(4000, sampling_rate, seed=1)
+
+
+def parse(chunked, tick_samples, field_filter=None):
+    kwargs = {}
+    if field_filter:
+        # the parser removes the filter name from the dicts
+        kwargs['position_filter'] = dict(field_filter)
+        kwargs['velocity_filter'] = dict(field_filter)
+    eparser = parser.EyeTrackerEventParser(
+        sampling_rate=sampling_rate, chunked=chunked,
+        adaptive_vel_thresh_history=1.0,
+        display_device=dict(mm_size=dict(width=500, height=280),
+                            pixel_res=(1920, 1080), eye_distance=550),
+        **kwargs)
+    events = []
+    for i in range(0, len(samples), tick_samples):
+        for s in samples[i:i + tick_samples]:
+            eparser._addInputEvent(list(s))
+        events.extend(eparser._removeOutputEvents())
+    return events
+
+
+@pytest.mark.parametrize('tick_samples', [1, 7, 50])
+@pytest.mark.parametrize('field_filter', [
+    None, dict(name='MedianFilter', length=3, knot_pos='center')])
+def test_chunked_events(tick_samples, field_filter):
+    events = parse(False, tick_samples, field_filter)
+    chunked_events = parse(True, tick_samples, field_filter)
+
+    type_ix = DeviceEvent.EVENT_TYPE_ID_INDEX
+    event_types = [e[type_ix] for e in events]
+    assert event_types == [e[type_ix] for e in chunked_events]
+    for etype in (EventConstants.FIXATION_END, EventConstants.SACCADE_END,
+                  EventConstants.BLINK_END):
+        assert etype in event_types
+
+    for e, ce in zip(events, chunked_events):
+        # event ids are taken from a count shared by both parsers
+        e = np.array(e[:DeviceEvent.EVENT_ID_INDEX] +
+                     e[DeviceEvent.EVENT_ID_INDEX + 1:], dtype=np.float64)
+        ce = np.array(ce[:DeviceEvent.EVENT_ID_INDEX] +
+                      ce[DeviceEvent.EVENT_ID_INDEX + 1:], dtype=np.float64)
+        np.testing.assert_allclose(ce, e, rtol=1e-12, equal_nan=True)
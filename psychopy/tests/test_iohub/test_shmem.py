@@ -0,0 +1,91 @@
+""" Test the shared memory transport of events from the ioHub Server.
+"""
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('gevent')
+pytest.importorskip('msgpack')
+
+from psychopy.iohub import shmem
+
+if not shmem.SHARED_MEMORY_AVAILABLE:
+    pytest.skip('multiprocessing.shared_memory is not available',
+                allow_module_level=True)
+
+from psychopy.iohub.devices import DeviceEvent
+
+# events only need an event type and hub time at the usual indices
+names = ['f%d' % i for i in range(DeviceEvent.EVENT_HUB_TIME_INDEX + 1)]
+names[DeviceEvent.EVENT_TYPE_ID_INDEX] = 'type'
+names[DeviceEvent.EVENT_HUB_TIME_INDEX] = 'time'
+event_dtype = np.dtype([(n, 'f8') for n in names] + [('text', 'S16')])
+
+
+def makeEvent(etype, etime, text=''):
+    event = [0] * len(names) + [text]
+    event[DeviceEvent.EVENT_TYPE_ID_INDEX] = etype
+    event[DeviceEvent.EVENT_HUB_TIME_INDEX] = etime
+    return event
+
+
+class TestSharedEventTransport(object):
+
+    def setup_method(self, method):
+        name = 'iohub_test_%d' % os.getpid()
+        getDtype = lambda etype: event_dtype
+        self.writer = shmem.SharedEventWriter(name, capacity=4,
+                                              getDtype=getDtype)
+        self.reader = shmem.SharedEventReader(name, getDtype=getDtype)
+
+    def teardown_method(self, method):
+        self.reader.close()
+        self.writer.close()
+
+    def test_read(self):
+        assert self.reader.read() is None
+        self.writer.put(makeEvent(1, 2.0, 'second'))
+        self.writer.put(makeEvent(2, 1.0, 'first'))
+        events = self.reader.read()
+        # events of all types, sorted by time
+        assert [e[DeviceEvent.EVENT_TYPE_ID_INDEX] for e in events] == [2, 1]
+        assert events[0][-1] == 'first'
+        assert self.reader.read() is None
+
+    def test_overflow(self):
+        for i in range(10):
+            self.writer.put(makeEvent(1, float(i)))
+        events = self.reader.read()
+        # only the newest events are kept
+        times = [e[DeviceEvent.EVENT_HUB_TIME_INDEX] for e in events]
+        assert times == [6.0, 7.0, 8.0, 9.0]
+        assert self.reader.lost == 6
+
+    def test_full(self):
+        # a ring can hold as many unread events as its capacity
+        for i in range(4):
+            self.writer.put(makeEvent(1, float(i)))
+        events = self.reader.read()
+        times = [e[DeviceEvent.EVENT_HUB_TIME_INDEX] for e in events]
+        assert times == [0.0, 1.0, 2.0, 3.0]
+        assert self.reader.lost == 0
+
+    def test_clear(self):
+        self.writer.put(makeEvent(1, 1.0))
+        self.reader.clear()
+        assert self.reader.read() is None
+        self.writer.put(makeEvent(1, 2.0))
+        assert len(self.reader.read()) == 1
+
+    def test_read_arrays(self):
+        assert self.reader.readArrays() == {}
+        self.writer.put(makeEvent(1, 1.0, 'a'))
+        self.writer.put(makeEvent(2, 2.0, 'b'))
+        self.writer.put(makeEvent(1, 3.0, 'c'))
+        arrays = self.reader.readArrays()
+        assert sorted(arrays) == [1, 2]
+        assert arrays[1].dtype == event_dtype
+        assert list(arrays[1]['time']) == [1.0, 3.0]
+        assert list(arrays[1]['text']) == [b'a', b'c']
+        assert self.reader.readArrays() == {}
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""Tests for psychopy.logging"""
+
+from __future__ import print_function
+
+import io
+import numpy as np
+import shutil
+from tempfile import mkdtemp
+
+from psychopy import logging
+
+
+class TestAsyncLogging(object):
+    def setup_method(self):
+        self.tmpDir = mkdtemp(prefix='psychopy-tests-logging')
+        self.logger = logging._Logger()
+        self.logFile = logging.LogFile(self.tmpDir + '/async.log',
+                                       level=logging.INFO, filemode='w',
+                                       logger=self.logger)
+
+    def teardown_method(self):
+        self.logger.setAsync(False)
+        self.logger.removeTarget(self.logFile)
+        self.logFile.stream.close()
+        shutil.rmtree(self.tmpDir)
+
+    def readLog(self):
+        with io.open(self.tmpDir + '/async.log', 'r', encoding='utf8') as f:
+            return f.read().splitlines()
+
+    def test_flush_wait(self):
+        self.logger.setAsync(True, interval=10)
+        for n in range(100):
+            self.logger.log('msg %i' % n, level=logging.EXP, t=n)
+        self.logger.flush(wait=True)
+        lines = self.readLog()
+        assert len(lines) == 100
+        assert lines[-1] == '99.0000 \tEXP \tmsg 99'
+        assert len(self.logger.flushed) == 100
+
+    def test_drop_when_full(self):
+        self.logger.setAsync(True, maxEntries=10, whenFull='drop',
+                             interval=10)
+        for n in range(25):
+            self.logger.log('msg %i' % n, level=logging.EXP, t=n)
+        self.logger.setAsync(False)  # stopping drains the buffer
+        lines = self.readLog()
+        assert len(lines) == 11
+        assert '15 log messages were dropped' in lines[-1]
+
+    def test_block_when_full(self):
+        self.logger.setAsync(True, maxEntries=10, whenFull='block',
+                             interval=0.001)
+        for n in range(100):
+            self.logger.log('msg %i' % n, level=logging.EXP, t=n)
+        self.logger.setAsync(False)
+        assert len(self.readLog()) == 100
+
+
+def test_retention():
+    logger = logging._Logger(maxFlushed=5)
+    target = logging.LogFile(io.StringIO(), level=logging.DEBUG,
+                             logger=logger)
+    for n in range(20):
+        logger.log('msg %i' % n, level=logging.DEBUG if n % 2 else
+                   logging.EXP, t=n)
+    logger.flush()
+    assert len(logger.flushed) == 5
+    assert [e.message for e in logger.getRecentEntries(2)] == \
+        ['msg 18', 'msg 19']
+    assert [e.message for e in logger.getRecentEntries(level=logging.EXP)] \
+        == ['msg 16', 'msg 18']
+    # every entry was still written to the target
+    assert len(target.stream.getvalue().splitlines()) == 20
+    assert logger.flushed[-1].levelname == 'DEBUG'
+
+    logger.setRetention(None)  # unlimited, keeping what we have
+    logger.log('more', level=logging.EXP, t=20)
+    logger.flush()
+    assert len(logger.flushed) == 6
+
+
+def test_binaryLogFile():
+    from psychopy.tools.logtools import readBinaryLog
+
+    class Stim(object):
+        name = 'grating'
+
+    tmpDir = mkdtemp(prefix='psychopy-tests-logging')
+    fileName = tmpDir + '/test.blog'
+    try:
+        logger = logging._Logger()
+        target = logging.BinaryLogFile(fileName, level=logging.EXP,
+                                       logger=logger, maxInterned=3)
+        for n in range(10):
+            logger.log(u'frame %i' % (n % 4), level=logging.EXP, t=n * 0.5,
+                       obj=Stim() if n % 2 else None)
+        logger.log('ignored', level=logging.DEBUG, t=99)
+        logger.flush()
+        logger.log(u'umlauts-öäü', level=logging.DATA, t=10)
+        logger.flush()
+        logger.removeTarget(target)
+        target.stream.close()
+        # a second session appended to the same file
+        logger = logging._Logger()
+        target = logging.BinaryLogFile(fileName, level=logging.EXP,
+                                       logger=logger, filemode='a')
+        logger.log('again', level=logging.WARNING, t=11)
+        logger.flush()
+        logger.removeTarget(target)
+        target.stream.close()
+
+        log = readBinaryLog(fileName)
+        assert len(log) == 12
+        assert np.allclose(log['t'][:10], np.arange(10) * 0.5)
+        assert list(log['message'][:5]) == ['frame 0', 'frame 1', 'frame 2',
+                                            'frame 3', 'frame 0']
+        assert list(log['obj'][:2]) == [None, 'grating']
+        assert log['message'][10] == u'umlauts-öäü'
+        assert log['levelname'][10] == 'DATA'
+        assert log['message'][11] == 'again'
+        assert log['level'][11] == logging.WARNING
+
+        df = readBinaryLog(fileName, asDataFrame=True)
+        assert list(df.columns) == ['t', 'level', 'levelname', 'message',
+                                    'obj']
+    finally:
+        shutil.rmtree(tmpDir)
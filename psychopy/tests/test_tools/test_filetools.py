@@ -15,7 +15,7 @@ from builtins import zip
 from builtins import object
 from tempfile import mkdtemp, mkstemp
 from psychopy.tools.filetools import (genDelimiter, genFilenameFromDelimiter,
-                                      openOutputFile, fromFile)
+                                      openOutputFile, fromFile, replaceFile)
 from psychopy.constants import PY3
 
 
@@ -41,6 +41,22 @@ def test_genFilenameFromDelimiter():
         assert extension == correct_extension
 
 
+def test_replaceFile():
+    folder = mkdtemp(prefix='psychopy-tests-replaceFile')
+    try:
+        src = os.path.join(folder, 'new.tmp')
+        dst = os.path.join(folder, 'data.csv')
+        for contents in ('old', 'new'):
+            with open(src, 'w') as f:
+                f.write(contents)
+            replaceFile(src, dst)
+            assert not os.path.exists(src)
+            with open(dst) as f:
+                assert f.read() == contents
+    finally:
+        shutil.rmtree(folder)
+
+
 class TestOpenOutputFile(object):
     def setup_class(self):
         self.temp_dir = mkdtemp(prefix='psychopy-tests-testdata')
@@ -75,9 +75,10 @@ def fromFile(filename, encoding='utf-8-sig'):
         # QuestPlus.
         if sys.version_info.major == 3 and sys.version_info.minor >= 6:
             from psychopy.data.staircase import QuestPlusHandler
-            from questplus import QuestPlus
-            if isinstance(contents, QuestPlusHandler):
+            if (isinstance(contents, QuestPlusHandler) and
+                    hasattr(contents, '_qp_json')):
                 # Restore the questplus.QuestPlus object.
+                from questplus import QuestPlus
                 contents._qp = QuestPlus.from_json(contents._qp_json)
                 del contents._qp_json
                 return contents
@@ -217,6 +218,24 @@ def genFilenameFromDelimiter(filename, delim):
     return filename
 
 
+def replaceFile(src, dst):
+    """Rename the file `src` to `dst` in one atomic step, replacing `dst`
+    if it exists, so that `dst` is never missing. Both must be on the same
+    file system.
+    """
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+    elif sys.platform == 'win32':
+        # python 2: os.rename doesn't replace existing files on Windows
+        import ctypes
+        MOVEFILE_REPLACE_EXISTING = 0x1
+        if not ctypes.windll.kernel32.MoveFileExW(
+                u'%s' % src, u'%s' % dst, MOVEFILE_REPLACE_EXISTING):
+            raise ctypes.WinError()
+    else:
+        os.rename(src, dst)  # atomic and replaces dst on POSIX
+
+
 class DictStorage(dict):
     """Helper class based on dictionary with storage to json
     """
@@ -2313,7 +2313,9 @@ def createVAO(attribBuffers, indexBuffer=None, attribDivisors=None, legacy=False
         setVertexAttribPointer(i, buffer, size, offset, normalize, legacy)
 
         activeAttribs[i] = buffer
-        bufferIndices.append(buffer.shape[0])
+        # per-instance attributes don't determine the number of vertices
+        if attribDivisors is None or not attribDivisors.get(i, 0):
+            bufferIndices.append(buffer.shape[0])
 
     # bind the EBO if available
     if indexBuffer is not None:
@@ -2783,20 +2785,32 @@ def mapBuffer(vbo, start=0, length=None, read=True, write=True, noSync=False):
         del arr
 
     Modify a sub-range of data by specifying `start` and `length`, indices
-    correspond to values, not byte offsets::
+    correspond to values, not byte offsets. A range covering whole rows of a
+    2D buffer is returned as rows, otherwise the view is flat::
 
-        arr = mapBuffer(vbo, start=12, end=24)
+        arr = mapBuffer(vbo, start=12, length=24)
         arr[:, :] *= 10.0
         unmapBuffer(vbo)
 
     """
     npType, glType = GL_COMPAT_TYPES[vbo.dataType]
-    start *= ctypes.sizeof(glType)
+    valueSize = ctypes.sizeof(glType)
+    start *= valueSize
 
     if length is None:
-        length = vbo.size
+        length = vbo.size - start
     else:
-        length *= ctypes.sizeof(glType)
+        length *= valueSize
+
+    # shape of the returned view, whole rows are kept as rows
+    nValues = length // valueSize
+    if start == 0 and length == vbo.size:
+        shape = vbo.shape
+    elif (len(vbo.shape) == 2 and not (start // valueSize) % vbo.shape[1] and
+            not nValues % vbo.shape[1]):
+        shape = (nValues // vbo.shape[1], vbo.shape[1])
+    else:
+        shape = (nValues,)
 
     accessFlags = GL.GL_NONE
     if noSync:  # if set, don't set GL_MAP_READ_BIT
@@ -2818,7 +2832,7 @@ def mapBuffer(vbo, start=0, length=None, read=True, write=True, noSync=False):
 
     bufferArray = np.ctypeslib.as_array(
         ctypes.cast(bufferPtr, ctypes.POINTER(glType)),
-        shape=vbo.shape)
+        shape=shape)
 
     return bufferArray
 
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Part of the PsychoPy library
+# Copyright (C) 2002-2018 Jonathan Peirce (C) 2019 Open Science Tools Ltd.
+# Distributed under the terms of the GNU General Public License (GPL).
+
+"""Functions for reading log files written by :mod:`psychopy.logging`
+"""
+from __future__ import absolute_import, division, print_function
+
+__all__ = ["readBinaryLog"]
+
+import numpy as np
+
+from psychopy.logging import BinaryLogFile, getLevel
+from psychopy.tools.filetools import pathToString
+
+# layout of the entries in the file (see BinaryLogFile.entryRecord)
+_recordDtype = np.dtype([('t', '<f8'), ('level', '<i2'),
+                         ('msgId', '<u4'), ('objId', '<u4')])
+
+
+def readBinaryLog(fileName, asDataFrame=False):
+    """Load a whole log written by a :class:`~psychopy.logging.BinaryLogFile`.
+
+    The entries of each block in the file are read with a single
+    `numpy.frombuffer` call and the interned messages are looked up for all
+    entries at once at the end, so even very long logs load quickly. An
+    incomplete final block (e.g. after a crash) is ignored.
+
+    Parameters
+    ----------
+    fileName : str
+        Path to the binary log file.
+    asDataFrame : bool
+        Return a :class:`pandas.DataFrame` rather than a NumPy array.
+
+    Returns
+    -------
+    ndarray or DataFrame
+        A structured array with fields `t` (float64), `level` (int16),
+        `levelname`, `message` and `obj` (objects; `obj` is the name of the
+        object given to the log call, or None), one row per entry.
+
+    Examples
+    --------
+    Find the times of all EXP messages about a stimulus called 'grating'::
+
+        log = readBinaryLog('participant1.blog')
+        times = log['t'][(log['level'] == logging.EXP) &
+                         (log['obj'] == 'grating')]
+
+    """
+    with open(pathToString(fileName), 'rb') as f:
+        contents = f.read()
+
+    signature = BinaryLogFile.signature
+    blockHeader = BinaryLogFile.blockHeader
+    stringHeader = BinaryLogFile.stringHeader
+    strings = {0: None}
+    records = []
+    idOffset = 0  # ids restart every time the file was (re)opened
+    maxId = 0
+    pos = 0
+    nBytes = len(contents)
+    while pos < nBytes:
+        if contents.startswith(signature, pos):
+            idOffset = maxId
+            pos += len(signature)
+            continue
+        if pos + blockHeader.size > nBytes:
+            break
+        tag, nStrings, nEntries = blockHeader.unpack_from(contents, pos)
+        if tag != BinaryLogFile.blockTag:
+            raise ValueError("%s is not a valid binary log file (bad block "
+                             "at byte %i)" % (fileName, pos))
+        blockPos = pos + blockHeader.size
+        newStrings = {}
+        for n in range(nStrings):
+            if blockPos + stringHeader.size > nBytes:
+                break
+            strId, length = stringHeader.unpack_from(contents, blockPos)
+            blockPos += stringHeader.size
+            text = contents[blockPos:blockPos + length]
+            newStrings[strId + idOffset] = text.decode('utf-8')
+            blockPos += length
+        blockEnd = blockPos + nEntries * _recordDtype.itemsize
+        if blockEnd > nBytes:
+            break  # an incomplete block at the end of the file
+        strings.update(newStrings)
+        block = np.frombuffer(contents, dtype=_recordDtype, count=nEntries,
+                              offset=blockPos).copy()
+        if idOffset:
+            # keep 0 (no object) as it is
+            block['msgId'] += idOffset
+            block['objId'][block['objId'] > 0] += idOffset
+        if newStrings:
+            maxId = max(maxId, max(newStrings))
+        records.append(block)
+        pos = blockEnd
+
+    if records:
+        records = np.concatenate(records)
+    else:
+        records = np.zeros(0, dtype=_recordDtype)
+
+    # look up all the messages at once
+    lookup = np.empty(maxId + 1, dtype=object)
+    for strId, text in strings.items():
+        lookup[strId] = text
+    levels = np.unique(records['level'])
+    levelNames = np.empty(len(levels), dtype=object)
+    levelNames[:] = [getLevel(int(level)) for level in levels]
+
+    log = np.zeros(len(records), dtype=[('t', 'f8'), ('level', 'i2'),
+                                        ('levelname', object),
+                                        ('message', object),
+                                        ('obj', object)])
+    log['t'] = records['t']
+    log['level'] = records['level']
+    log['levelname'] = levelNames[np.searchsorted(levels, records['level'])]
+    log['message'] = lookup[records['msgId']]
+    log['obj'] = lookup[records['objId']]
+    if asDataFrame:
+        import pandas as pd
+        return pd.DataFrame(log)
+    return log
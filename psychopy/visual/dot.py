@@ -30,16 +30,18 @@ from builtins import range
 # Shaders will work but require OpenGL2.0 drivers AND PyOpenGL3.0+
 import pyglet
 pyglet.options['debug_gl'] = False
-import ctypes
 GL = pyglet.gl
+import threading
 
 import psychopy  # so we can get the __path__
 from psychopy import logging
+import psychopy.tools.gltools as gltools
 
 # tools must only be imported *after* event or MovieStim breaks on win32
 # (JWP has no idea why!)
 from psychopy.tools.attributetools import attributeSetter, setAttribute
 from psychopy.tools.arraytools import val2array
+from psychopy.tools.monitorunittools import convertToPix
 from psychopy.visual.basevisual import (BaseVisualStim, ColorMixin,
                                         ContainerMixin)
 
@@ -49,6 +51,8 @@ import numpy as np
 _piOver2 = np.pi / 2.
 _piOver180 = np.pi / 180.
 _2pi = 2 * np.pi
+# units for which conversion to pixels is just a scaling (and offset)
+_linearUnits = ('pix', 'pixels', 'cm', 'deg', 'degs', 'norm', 'height')
 
 
 class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
@@ -74,6 +78,12 @@ class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
     If further customisation is required, then the DotStim should be subclassed
     and its _update_dotsXY and _newDotsXY methods overridden.
 
+    The dots are moved by a single vectorised pass over preallocated arrays
+    and sent to the graphics card through a vertex buffer that is kept
+    between frames, so several thousand dots can be drawn on every frame of
+    high refresh rate displays. To take the motion computations out of the
+    frame loop altogether, use :meth:`precomputeFrames`.
+
     The maximum number of dots that can be drawn is limited by system
     performance.
 
@@ -236,6 +246,8 @@ class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
 
         super(DotStim, self).__init__(win, units=units, name=name,
                                       autoLog=False)  # set at end of init
+        self._trajectory = None  # see precomputeFrames()
+        self._dotsVBO = None
 
         self.nDots = nDots
         # pos and size are ambiguous for dots so DotStim explicitly has
@@ -274,13 +286,13 @@ class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
         self.noiseDots = noiseDots
 
         # initialise a random array of X,Y
-        self._verticesBase = self._dotsXY = self._newDotsXY(self.nDots)
-        # all dots have the same speed
-        self._dotsSpeed = np.ones(self.nDots, dtype=float) * self.speed
+        self._verticesBase = self._dotsXY = np.require(
+            self._newDotsXY(self.nDots), np.float32, 'C')
         # abs() means we can ignore the -1 case (no life)
         self._dotsLife = np.abs(dotLife) * np.random.rand(self.nDots)
-        # pre-allocate array for flagging dead dots
+        # pre-allocate array for flagging dead dots, and those used each frame
         self._deadDots = np.zeros(self.nDots, dtype=bool)
+        self._dotsBuffers = self._allocateDotsBuffers(self.nDots)
         # set directions (only used when self.noiseDots='direction')
         self._dotsDir = np.random.rand(self.nDots) * _2pi
         self._dotsDir[self._signalDots] = self.dir * _piOver180
@@ -305,6 +317,7 @@ class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
         """*'sqr'* or 'circle'. Defines the envelope used to present the dots.
         If changed while drawing, dots outside new envelope will be respawned.
         """
+        self._discardTrajectory()
         self.__dict__['fieldShape'] = fieldShape
 
     @attributeSetter
@@ -322,6 +335,7 @@ class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
 
         :ref:`operations <attrib-operations>` are supported.
         """
+        self._discardTrajectory()
         self.__dict__['dotLife'] = dotLife
         self._dotsLife = abs(self.dotLife) * np.random.rand(self.nDots)
 
@@ -333,6 +347,7 @@ class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
         randomised on each frame. This corresponds to Scase et al's (1996)
         categories of RDK.
         """
+        self._discardTrajectory()
         self.__dict__['signalDots'] = signalDots
 
     @attributeSetter
@@ -344,6 +359,7 @@ class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
         random, but constant direction. For 'walk' noise dots vary their
         direction every frame, but keep a constant speed.
         """
+        self._discardTrajectory()
         self.__dict__['noiseDots'] = noiseDots
         self.coherence = self.coherence  # update using attributeSetter
 
@@ -401,6 +417,7 @@ class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
         """
         # Isn't there a way to use BaseVisualStim.pos.__doc__ as docstring
         # here?
+        self._discardTrajectory()
         self.size = size  # using BaseVisualStim. we'll store this as both
         self.__dict__['fieldSize'] = self.size
 
@@ -415,6 +432,7 @@ class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
         """
         if not 0 <= coherence <= 1:
             raise ValueError('DotStim.coherence must be between 0 and 1')
+        self._discardTrajectory()
 
         _cohDots = coherence * self.nDots
 
@@ -443,6 +461,7 @@ class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
         """float (degrees). direction of the coherent dots. :ref:`operations 
         <attrib-operations>` are supported.
         """
+        self._discardTrajectory()
         # check which dots are signal before setting new dir
         signalDots = self._dotsDir == (self.dir * _piOver180)
         self.__dict__['dir'] = dir
@@ -462,6 +481,7 @@ class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
         """float. speed of the dots (in *units*/frame). :ref:`operations 
         <attrib-operations>` are supported.
         """
+        self._discardTrajectory()
         self.__dict__['speed'] = speed
 
     def setSpeed(self, val, op='', log=None):
@@ -487,7 +507,13 @@ class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
             win = self.win
         self._selectWindow(win)
 
-        self._update_dotsXY()
+        if self._trajectory is not None:
+            self._verticesBase[:] = self._trajectory.nextFrame()
+            if self._trajectory.finished:
+                self._discardTrajectory()
+            self._updateVertices()
+        else:
+            self._update_dotsXY()
 
         GL.glPushMatrix()  # push before drawing, pop after
 
@@ -505,16 +531,15 @@ class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
             GL.glEnable(GL.GL_TEXTURE_2D)
             GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
 
-            CPCD = ctypes.POINTER(ctypes.c_double)
-            GL.glVertexPointer(2, GL.GL_DOUBLE, 0,
-                               self.verticesPix.ctypes.data_as(CPCD))
+            self._uploadDots()
+            gltools.setVertexAttribPointer(
+                GL.GL_VERTEX_ARRAY, self._dotsVBO, legacy=True)
             desiredRGB = self._getDesiredRGB(self.rgb, self.colorSpace,
                                              self.contrast)
 
             GL.glColor4f(desiredRGB[0], desiredRGB[1], desiredRGB[2],
                          self.opacity)
-            GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
-            GL.glDrawArrays(GL.GL_POINTS, 0, self.nDots)
+            GL.glDrawArrays(GL.GL_POINTS, 0, self._dotsVBO.shape[0])
             GL.glDisableClientState(GL.GL_VERTEX_ARRAY)
         else:
             # we don't want to do the screen scaling twice so for each dot
@@ -528,6 +553,52 @@ class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
             self.element.setDepth(initialDepth)
         GL.glPopMatrix()
 
+    def _uploadDots(self):
+        """Send the dot positions to the vertex buffer used for drawing,
+        which is created on first use (and whenever `nDots` changes).
+        """
+        verticesPix = self.verticesPix
+        if self._dotsVBO is None or self._dotsVBO.shape[0] != len(verticesPix):
+            if self._dotsVBO is not None:
+                gltools.deleteVBO(self._dotsVBO)
+            self._dotsVBO = gltools.createVBO(verticesPix,
+                                              usage=GL.GL_STREAM_DRAW)
+        else:
+            mapped = gltools.mapBuffer(self._dotsVBO, read=False)
+            mapped[:] = verticesPix
+            gltools.unmapBuffer(self._dotsVBO)
+            gltools.unbindVBO(self._dotsVBO)
+
+    def _updateVertices(self):
+        """Sets Stim.verticesPix from the dot positions. For units that
+        are just a scaling of pixels this is done in place, without
+        allocating a new array each frame.
+        """
+        xy = self._verticesBase
+        if self.units not in _linearUnits or xy.dtype != np.float32:
+            super(DotStim, self)._updateVertices()
+            return
+        flip = np.array([1., 1.])
+        if getattr(self, 'flipHoriz', False):
+            flip[0] = -1
+        if getattr(self, 'flipVert', False):
+            flip[1] = -1
+        # the whole transform as one matrix and an offset
+        scale = convertToPix(vertices=np.array([1., 1.]), pos=(0., 0.),
+                             win=self.win, units=self.units)
+        offset = convertToPix(vertices=np.array([0., 0.]), pos=self.pos,
+                              win=self.win, units=self.units)
+        transform = flip[:, None] * self._rotationMatrix * scale
+        verticesPix = self.__dict__.get('verticesPix')
+        if (verticesPix is None or verticesPix.shape != xy.shape or
+                verticesPix.dtype != np.float32):
+            verticesPix = np.empty(xy.shape, dtype=np.float32)
+        np.dot(xy, transform.astype(np.float32), out=verticesPix)
+        verticesPix += offset
+        self.__dict__['verticesPix'] = verticesPix
+        self._needVertexUpdate = False
+        self._needUpdate = True
+
     def _newDotsXY(self, nDots):
         """Returns a uniform spread of dots, according to the `fieldShape` and
         `fieldSize`.
@@ -565,90 +636,248 @@ class DotStim(BaseVisualStim, ColorMixin, ContainerMixin):
 
     def refreshDots(self):
         """Callable user function to choose a new set of dots."""
-        self._verticesBase = self._dotsXY = self._newDotsXY(self.nDots)
+        self._discardTrajectory()
+        self._verticesBase = self._dotsXY = np.require(
+            self._newDotsXY(self.nDots), np.float32, 'C')
 
         # Don't allocate another array if the new number of dots is equal to
         # the last.
         if self.nDots != len(self._deadDots):
             self._deadDots = np.zeros(self.nDots, dtype=bool)
+            self._dotsBuffers = self._allocateDotsBuffers(self.nDots)
+
+    def precomputeFrames(self, nFrames, background=True):
+        """Compute the positions of the dots for the next `nFrames` calls
+        to :meth:`draw` ahead of time.
+
+        Each subsequent draw then only copies the next precomputed frame,
+        which keeps the motion computations out of the frame loop. After the
+        last precomputed frame the dots carry on moving as usual. Changing
+        any parameter of the motion (e.g. `coherence`, `dir`, `speed`,
+        `dotLife` or `fieldSize`) or calling :meth:`refreshDots` discards
+        the frames that were not drawn yet; the dots then continue from the
+        last frame drawn. Changing `fieldPos` doesn't.
+
+        Subclasses that override `_update_dotsXY` should not use this, as
+        the frames are computed by the default update rule.
+
+        Parameters
+        ----------
+        nFrames : int
+            Number of frames to compute.
+        background : bool
+            Compute the frames in a background thread, starting now. If the
+            stimulus is drawn faster than the frames are computed, `draw`
+            waits for the next frame. If `False`, all frames are computed
+            before this method returns.
+
+        Examples
+        --------
+        Compute a 2 s trial at 144 Hz during the inter-trial interval::
+
+            dots.precomputeFrames(288)
+            core.wait(0.5)
+            for frameN in range(288):
+                dots.draw()
+                win.flip()
 
-    def _update_dotsXY(self):
-        """The user shouldn't call this - its gets done within draw().
         """
-        # Find dead dots, update positions, get new positions for
-        # dead and out-of-bounds
+        self._discardTrajectory()
+        self._trajectory = _DotsTrajectory(self, int(nFrames), background)
+
+    def _discardTrajectory(self):
+        """Stop using precomputed frames and carry on from where the
+        computations got to (see precomputeFrames).
+        """
+        if self.__dict__.get('_trajectory') is not None:
+            self._trajectory.stop()
+            self._trajectory = None
+
+    def _allocateDotsBuffers(self, nDots):
+        """Working arrays for `_moveDots`, so that moving the dots does not
+        need to allocate new arrays on every frame.
+        """
+        return {'step': np.zeros((nDots, 2), dtype=np.float32),
+                'norm': np.zeros((nDots, 2), dtype=np.float32),
+                'dist': np.zeros(nDots, dtype=np.float32),
+                'renew': np.zeros(nDots, dtype=bool)}
+
+    def _moveDots(self, dotsXY, dotsLife, dotsDir, signalDots, deadDots,
+                  buffers):
+        """Move the dots by one frame, replacing those that die or leave the
+        field. All arrays are updated in place, apart from the signal dots
+        which are returned (they are chosen anew on each frame when
+        `signalDots` is 'different').
+        """
+        step = buffers['step']
+        renew = buffers['renew']
         # renew dead dots
         if self.dotLife > 0:  # if less than zero ignore it
             # decrement. Then dots to be reborn will be negative
-            self._dotsLife -= 1
-            self._deadDots[:] = (self._dotsLife <= 0)
-            self._dotsLife[self._deadDots] = self.dotLife
+            dotsLife -= 1
+            np.less_equal(dotsLife, 0, out=deadDots)
+            dotsLife[deadDots] = self.dotLife
         else:
-            self._deadDots[:] = False
+            deadDots[:] = False
 
-        # update XY based on speed and dir
-        # NB self._dotsDir is in radians, but self.dir is in degs
         # update which are the noise/signal dots
         if self.signalDots == 'different':
             #  **up to version 1.70.00 this was the other way around,
             # not in keeping with Scase et al**
             # noise and signal dots change identity constantly
-            np.random.shuffle(self._dotsDir)
-            # and then update _signalDots from that
-            self._signalDots = (self._dotsDir == (self.dir * _piOver180))
-
-        # update the locations of signal and noise; 0 radians=East!
-        reshape = np.reshape
+            np.random.shuffle(dotsDir)
+            # and then update signalDots from that
+            np.equal(dotsDir, self.dir * _piOver180, out=signalDots)
         if self.noiseDots == 'walk':
-            # noise dots are ~self._signalDots
-            sig = np.random.rand(np.sum(~self._signalDots))
-            self._dotsDir[~self._signalDots] = sig * _2pi
-            # then update all positions from dir*speed
-            cosDots = reshape(np.cos(self._dotsDir), (self.nDots,))
-            sinDots = reshape(np.sin(self._dotsDir), (self.nDots,))
-            self._verticesBase[:, 0] += self.speed * cosDots
-            self._verticesBase[:, 1] += self.speed * sinDots
-        elif self.noiseDots == 'direction':
-            # simply use the stored directions to update position
-            cosDots = reshape(np.cos(self._dotsDir), (self.nDots,))
-            sinDots = reshape(np.sin(self._dotsDir), (self.nDots,))
-            self._verticesBase[:, 0] += self.speed * cosDots
-            self._verticesBase[:, 1] += self.speed * sinDots
-        elif self.noiseDots == 'position':
-            # update signal dots
-            sd = self._signalDots
-            sdSum = self._signalDots.sum()
-            cosDots = reshape(np.cos(self._dotsDir[sd]), (sdSum,))
-            sinDots = reshape(np.sin(self._dotsDir[sd]), (sdSum,))
-            self._verticesBase[sd, 0] += self.speed * cosDots
-            self._verticesBase[sd, 1] += self.speed * sinDots
-            # update noise dots
-            self._deadDots[:] = self._deadDots + (~self._signalDots)
-
-        # handle boundaries of the field
+            # noise dots get a new direction on every frame
+            np.logical_not(signalDots, out=renew)
+            dotsDir[renew] = np.random.rand(np.count_nonzero(renew)) * _2pi
+
+        # all dots move by speed in their direction; 0 radians=East!
+        # NB dotsDir is in radians, but self.dir is in degs
+        np.cos(dotsDir, out=step[:, 0])
+        np.sin(dotsDir, out=step[:, 1])
+        step *= self.speed
+        if self.noiseDots == 'position':
+            # only the signal dots move, noise dots get a new position
+            step *= signalDots[:, None]
+            np.logical_not(signalDots, out=renew)
+            deadDots |= renew
+        dotsXY += step
+
+        # handle boundaries of the field, in a normalised field
+        # (radius = 1 all around)
+        norm = buffers['norm']
+        dist = buffers['dist']
+        np.divide(dotsXY, .5 * np.abs(self.fieldSize), out=norm)
         if self.fieldShape in (None, 'square', 'sqr'):
-            out0 = (np.abs(self._verticesBase[:, 0]) > .5 * self.fieldSize[0])
-            out1 = (np.abs(self._verticesBase[:, 1]) > .5 * self.fieldSize[1])
-            outofbounds = out0 + out1
+            np.abs(norm, out=norm)
+            np.max(norm, axis=1, out=dist)
         else:
-            # transform to a normalised circle (radius = 1 all around)
-            # then to polar coords to check
-            # the normalised XY position (where radius should be < 1)
-            normXY = self._verticesBase / .5 / self.fieldSize
-            # add out-of-bounds to those that need replacing
-            outofbounds = np.hypot(normXY[:, 0], normXY[:, 1]) > 1.
-
-        # update any dead dots
-        nDead = self._deadDots.sum()
-        if nDead:
-            self._verticesBase[self._deadDots, :] = self._newDotsXY(nDead)
-
-        # Reposition any dots that have gone out of bounds. Net effect is to
-        # place dot one step inside the boundary on the other side of the
-        # aperture.
-        nOutOfBounds = outofbounds.sum()
-        if nOutOfBounds:
-            self._verticesBase[outofbounds, :] = self._newDotsXY(nOutOfBounds)
+            np.hypot(norm[:, 0], norm[:, 1], out=dist)
+        np.greater(dist, 1., out=renew)
+
+        # new positions for dead dots and for those that went out of bounds
+        renew |= deadDots
+        nRenew = np.count_nonzero(renew)
+        if nRenew:
+            dotsXY[renew, :] = self._newDotsXY(nRenew)
+        return signalDots
+
+    def _update_dotsXY(self):
+        """The user shouldn't call this - its gets done within draw().
+        """
+        if len(self._dotsBuffers['renew']) != len(self._verticesBase):
+            self._dotsBuffers = self._allocateDotsBuffers(
+                len(self._verticesBase))
+        self._signalDots = self._moveDots(
+            self._verticesBase, self._dotsLife, self._dotsDir,
+            self._signalDots, self._deadDots, self._dotsBuffers)
 
         # update the pixel XY coordinates in pixels (using _BaseVisual class)
         self._updateVertices()
+
+    def __del__(self):
+        self._discardTrajectory()
+        if self.__dict__.get('_dotsVBO') is not None:
+            gltools.deleteVBO(self._dotsVBO)
+
+
+class _DotsTrajectory(object):
+    """Positions of the dots of a DotStim for a number of frames ahead
+    (see `DotStim.precomputeFrames`).
+
+    The frames are computed from copies of the state of the dots. The
+    state after the last frame drawn is handed back to the DotStim when the
+    frames are discarded (or all used).
+    """
+
+    def __init__(self, dots, nFrames, background=True):
+        self.dots = dots
+        self.frames = np.empty((nFrames,) + dots._verticesBase.shape,
+                               dtype=np.float32)
+        # the rest of the state of the dots after each frame
+        self.lives = np.empty((nFrames,) + dots._dotsLife.shape,
+                              dtype=dots._dotsLife.dtype)
+        self.dirs = np.empty((nFrames,) + dots._dotsDir.shape,
+                             dtype=dots._dotsDir.dtype)
+        self.signals = np.empty((nFrames,) + dots._signalDots.shape,
+                                dtype=bool)
+        self.deads = np.empty((nFrames,) + dots._deadDots.shape, dtype=bool)
+        self.nReady = 0  # frames computed so far
+        self.nShown = 0  # frames used so far
+        self.error = None
+        self._state = [dots._verticesBase.copy(), dots._dotsLife.copy(),
+                       dots._dotsDir.copy(), dots._signalDots.copy(),
+                       dots._deadDots.copy()]
+        self._stopping = False
+        self._done = False
+        self._ready = threading.Condition()
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._run,
+                                            name='DotStimFrames')
+            self._thread.daemon = True
+            self._thread.start()
+        else:
+            self._run()
+
+    @property
+    def finished(self):
+        return self.nShown >= len(self.frames)
+
+    def _run(self):
+        dots = self.dots
+        xy, life, dirs, signal, dead = self._state
+        buffers = dots._allocateDotsBuffers(len(xy))
+        try:
+            for frameN in range(len(self.frames)):
+                if self._stopping:
+                    break
+                signal = dots._moveDots(xy, life, dirs, signal, dead,
+                                        buffers)
+                self.frames[frameN] = xy
+                self.lives[frameN] = life
+                self.dirs[frameN] = dirs
+                self.signals[frameN] = signal
+                self.deads[frameN] = dead
+                with self._ready:
+                    self.nReady = frameN + 1
+                    self._ready.notify()
+        except Exception as err:
+            self.error = err
+        finally:
+            self._state = None
+            with self._ready:
+                self._done = True
+                self._ready.notify()
+
+    def nextFrame(self):
+        """Dot positions for the next frame (waits until computed).
+        """
+        with self._ready:
+            while self.nReady <= self.nShown and not self._done:
+                self._ready.wait()
+        if self.nReady <= self.nShown:
+            raise RuntimeError('Failed to compute the DotStim frames: %s'
+                               % self.error)
+        frame = self.frames[self.nShown]
+        self.nShown += 1
+        return frame
+
+    def stop(self):
+        """Stop computing frames and give the state of the dots back to the
+        DotStim. Its positions stay those of the last frame drawn.
+        """
+        self._stopping = True
+        if self._thread is not None:
+            self._thread.join()
+        if self.nShown == 0:
+            # the DotStim still has the state it had before the first frame
+            return
+        dots = self.dots
+        frameN = self.nShown - 1
+        dots._dotsLife = self.lives[frameN].copy()
+        dots._dotsDir = self.dirs[frameN].copy()
+        dots._signalDots = self.signals[frameN].copy()
+        dots._deadDots = self.deads[frameN].copy()
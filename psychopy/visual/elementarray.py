@@ -26,6 +26,8 @@ GL = pyglet.gl
 import psychopy  # so we can get the __path__
 from psychopy import logging
 from psychopy.visual import Window
+import psychopy.tools.gltools as gltools
+from . import shaders as _shaders
 
 # tools must only be imported *after* event or MovieStim breaks on win32
 # (JWP has no idea why!)
@@ -38,6 +40,46 @@ from . import globalVars
 
 import numpy
 
+# the flag telling which per-element values need recomputing before drawing
+_updateFlags = {'vertices': '_needVertexUpdate',
+                'colors': '_needColorUpdate',
+                'texCoords': '_needTexCoordUpdate'}
+# what needs recomputing when an attribute of some elements changes
+_attribUpdates = {'xys': ('vertices',),
+                  'oris': ('vertices',),
+                  'sizes': ('vertices', 'texCoords'),
+                  'sfs': ('texCoords',),
+                  'phases': ('texCoords',),
+                  'opacities': ('colors',),
+                  'contrs': ('colors',)}
+_operations = {'': lambda old, new: new + old * 0,
+               None: lambda old, new: new + old * 0,
+               '+': numpy.add,
+               '-': numpy.subtract,
+               '*': numpy.multiply,
+               '/': numpy.divide,
+               '**': numpy.power,
+               '%': numpy.mod}
+# above this many separate runs of changed elements, a single upload of the
+# range spanning them all is cheaper than one upload per run
+_maxUploadRuns = 16
+
+
+def _elementRuns(indices, nElements):
+    """Split the (sorted, unique) indices of changed elements into
+    (start, stop) runs of contiguous elements to upload.
+    """
+    if indices is None:
+        return [(0, nElements)]
+    if not len(indices):
+        return []
+    breaks = numpy.flatnonzero(numpy.diff(indices) != 1) + 1
+    if len(breaks) >= _maxUploadRuns:
+        return [(indices[0], indices[-1] + 1)]
+    starts = indices[numpy.r_[0, breaks]]
+    stops = indices[numpy.r_[breaks - 1, len(indices) - 1]] + 1
+    return list(zip(starts.tolist(), stops.tolist()))
+
 
 class ElementArrayStim(MinimalStim, TextureMixin):
     """This stimulus class defines a field of elements whose behaviour can
@@ -75,7 +117,8 @@ class ElementArrayStim(MinimalStim, TextureMixin):
                  interpolate=True,
                  name=None,
                  autoLog=None,
-                 maskParams=None):
+                 maskParams=None,
+                 instanced=False):
         """
         :Parameters:
 
@@ -89,6 +132,18 @@ class ElementArrayStim(MinimalStim, TextureMixin):
 
             nElements :
                 number of elements in the array.
+
+            instanced : True or False (default)
+                Draw the elements with GPU instancing: the vertices of each
+                element are computed by a shader from one position, size,
+                orientation, color and texture position per element, which
+                are kept in buffers on the graphics card. Changing e.g.
+                `xys` on every frame then only sends N positions to the
+                card (instead of N*4 vertices computed in Python), and
+                attributes that didn't change aren't sent at all. Needs
+                OpenGL 3.3 (or the equivalent extensions) and units other
+                than 'degFlat'/'degFlatPos'; otherwise the usual drawing
+                is used. See `isInstanced`.
         """
         # what local vars are defined (these are the init params) for use by
         # __repr__
@@ -113,6 +168,13 @@ class ElementArrayStim(MinimalStim, TextureMixin):
         # info for each element
         self.__dict__['sizes'] = sizes
         self.verticesBase = xys
+        # elements whose vertices, colors or texture coords need recomputing
+        # (None for all of them), and the rows of each buffer to upload
+        self._dirtyElements = dict.fromkeys(_updateFlags)
+        # the per-element arrays this stimulus made, which it can change in
+        # place (see _setElementValues)
+        self._ownElementValues = {}
+        self._needUpload = {}
         self._needVertexUpdate = True
         self._needColorUpdate = True
         self.useShaders = True
@@ -124,6 +186,14 @@ class ElementArrayStim(MinimalStim, TextureMixin):
         if not self.win._haveShaders:
             raise Exception("ElementArrayStim requires shaders support"
                             " and floating point textures")
+        # vertex buffers (kept between frames), per-element arrays for
+        # instanced drawing and the vertex array used to draw them
+        self._vbos = {}
+        self._instanceData = {}
+        self._instanceVAO = None
+        self.__dict__['isInstanced'] = False
+        if instanced:
+            self.__dict__['isInstanced'] = self._canDrawInstanced()
 
         self.colorSpace = colorSpace
         if rgbs != None:
@@ -164,6 +234,27 @@ class ElementArrayStim(MinimalStim, TextureMixin):
         if self.autoLog:
             logging.exp("Created %s = %s" % (self.name, str(self)))
 
+    def _canDrawInstanced(self):
+        """Whether the window's context and the units allow instanced
+        drawing (warns if not).
+        """
+        if self.units in ('degFlat', 'degFlatPos'):
+            logging.warning("ElementArrayStim can't draw elements in %s "
+                            "units with instancing; using the standard "
+                            "drawing instead" % self.units)
+            return False
+        self._selectWindow(self.win)
+        info = GL.gl_info
+        haveInstancing = info.have_version(3, 3) or (
+            info.have_extension('GL_ARB_instanced_arrays') and
+            info.have_extension('GL_ARB_draw_instanced') and
+            info.have_extension('GL_ARB_vertex_array_object'))
+        if not haveInstancing:
+            logging.warning("ElementArrayStim instancing needs OpenGL 3.3 "
+                            "or GL_ARB_instanced_arrays; using the standard "
+                            "drawing instead")
+        return haveInstancing
+
     def _selectWindow(self, win):
         # don't call switch if it's already the curr window
         if win != globalVars.currWindow and win.winType == 'pyglet':
@@ -259,12 +350,22 @@ class ElementArrayStim(MinimalStim, TextureMixin):
             self.__dict__['xys'] = self._makeNx2(value, ['Nx2'])
         # to keep a record if we are to alter things later.
         self._xysAsNone = value is None
-        self._needVertexUpdate = True
+        self._flagUpdate('vertices')
 
-    def setXYs(self, value=None, operation='', log=None):
+    def setXYs(self, value=None, operation='', log=None, indices=None):
         """Usually you can use 'stim.attribute = value' syntax instead,
-        but use this method if you need to suppress the log message.
+        but use this method if you need to suppress the log message or
+        to change only some of the elements.
+
+        If `indices` (element indices, a boolean mask or a slice) is given,
+        `value` is only applied to those elements, and only they are
+        recomputed and sent to the graphics card on the next draw. This is
+        much faster than setting all the values when only a few elements
+        change on each frame.
         """
+        if indices is not None:
+            self._setElementValues('xys', value, indices, operation, log)
+            return
         setAttribute(self, 'xys', value, log, operation)
 
     @attributeSetter
@@ -288,12 +389,19 @@ class ElementArrayStim(MinimalStim, TextureMixin):
         :ref:`operations <attrib-operations>` are supported.
         """
         self.__dict__['oris'] = self._makeNx1(value)  # set self.oris
-        self._needVertexUpdate = True
+        self._flagUpdate('vertices')
 
-    def setOris(self, value, operation='', log=None):
+    def setOris(self, value, operation='', log=None, indices=None):
         """Usually you can use 'stim.attribute = value' syntax instead,
-        but use this method if you need to suppress the log message.
+        but use this method if you need to suppress the log message or
+        to change only some of the elements.
+
+        If `indices` (element indices, a boolean mask or a slice) is given,
+        `value` is only applied to those elements. See :meth:`setXYs`.
         """
+        if indices is not None:
+            self._setElementValues('oris', value, indices, operation, log)
+            return
 
         # call attributeSetter
         setAttribute(self, 'oris', value, log, operation)
@@ -313,12 +421,19 @@ class ElementArrayStim(MinimalStim, TextureMixin):
         :ref:`operations <attrib-operations>` are supported.
         """
         self.__dict__['sfs'] = self._makeNx2(value)  # set self.sfs
-        self._needTexCoordUpdate = True
+        self._flagUpdate('texCoords')
 
-    def setSfs(self, value, operation='', log=None):
+    def setSfs(self, value, operation='', log=None, indices=None):
         """Usually you can use 'stim.attribute = value' syntax instead,
-        but use this method if you need to suppress the log message.
+        but use this method if you need to suppress the log message or
+        to change only some of the elements.
+
+        If `indices` (element indices, a boolean mask or a slice) is given,
+        `value` is only applied to those elements. See :meth:`setXYs`.
         """
+        if indices is not None:
+            self._setElementValues('sfs', value, indices, operation, log)
+            return
         # in the case of Nx1 list/array, setAttribute would fail if not this:
         value = self._makeNx2(value)
         # call attributeSetter
@@ -332,12 +447,19 @@ class ElementArrayStim(MinimalStim, TextureMixin):
         :ref:`Operations <attrib-operations>` are supported.
         """
         self.__dict__['opacities'] = self._makeNx1(value)
-        self._needColorUpdate = True
+        self._flagUpdate('colors')
 
-    def setOpacities(self, value, operation='', log=None):
+    def setOpacities(self, value, operation='', log=None, indices=None):
         """Usually you can use 'stim.attribute = value' syntax instead,
-        but use this method if you need to suppress the log message.
+        but use this method if you need to suppress the log message or
+        to change only some of the elements.
+
+        If `indices` (element indices, a boolean mask or a slice) is given,
+        `value` is only applied to those elements. See :meth:`setXYs`.
         """
+        if indices is not None:
+            self._setElementValues('opacities', value, indices, operation, log)
+            return
         setAttribute(self, 'opacities', value, log,
                      operation)  # call attributeSetter
 
@@ -352,13 +474,20 @@ class ElementArrayStim(MinimalStim, TextureMixin):
         :ref:`Operations <attrib-operations>` are supported.
         """
         self.__dict__['sizes'] = self._makeNx2(value)
-        self._needVertexUpdate = True
-        self._needTexCoordUpdate = True
+        self._flagUpdate('vertices')
+        self._flagUpdate('texCoords')
 
-    def setSizes(self, value, operation='', log=None):
+    def setSizes(self, value, operation='', log=None, indices=None):
         """Usually you can use 'stim.attribute = value' syntax instead,
-        but use this method if you need to suppress the log message.
+        but use this method if you need to suppress the log message or
+        to change only some of the elements.
+
+        If `indices` (element indices, a boolean mask or a slice) is given,
+        `value` is only applied to those elements. See :meth:`setXYs`.
         """
+        if indices is not None:
+            self._setElementValues('sizes', value, indices, operation, log)
+            return
         # in the case of Nx1 list/array, setAttribute would fail if not this:
         value = self._makeNx2(value)
         # call attributeSetter
@@ -375,12 +504,19 @@ class ElementArrayStim(MinimalStim, TextureMixin):
         :ref:`Operations <attrib-operations>` are supported.
         """
         self.__dict__['phases'] = self._makeNx2(value)
-        self._needTexCoordUpdate = True
+        self._flagUpdate('texCoords')
 
-    def setPhases(self, value, operation='', log=None):
+    def setPhases(self, value, operation='', log=None, indices=None):
         """Usually you can use 'stim.attribute = value' syntax instead,
-        but use this method if you need to suppress the log message.
+        but use this method if you need to suppress the log message or
+        to change only some of the elements.
+
+        If `indices` (element indices, a boolean mask or a slice) is given,
+        `value` is only applied to those elements. See :meth:`setXYs`.
         """
+        if indices is not None:
+            self._setElementValues('phases', value, indices, operation, log)
+            return
         # in the case of Nx1 list/array, setAttribute would fail if not this:
         value = self._makeNx2(value)
         setAttribute(self, 'phases', value, log,
@@ -417,10 +553,19 @@ class ElementArrayStim(MinimalStim, TextureMixin):
         """
         self.__dict__['colorSpace'] = colorSpace
 
-    def setColors(self, color, colorSpace=None, operation='', log=None):
+    def setColors(self, color, colorSpace=None, operation='', log=None,
+                  indices=None):
         """See ``color`` for more info on the color parameter  and
         ``colorSpace`` for more info in the colorSpace parameter.
+
+        If `indices` (element indices, a boolean mask or a slice) is given,
+        `color` is only applied to those elements. See :meth:`setXYs`.
+        This needs numeric colors in the current colorSpace.
         """
+        if indices is not None:
+            self._setElementColors(color, colorSpace, operation, log,
+                                   indices)
+            return
         setColor(self, color, colorSpace=colorSpace, operation=operation,
                  rgbAttrib='rgbs',  # or 'fillRGB' etc
                  colorAttrib='colors',
@@ -439,7 +584,79 @@ class ElementArrayStim(MinimalStim, TextureMixin):
         else:
             raise ValueError("New value for setRgbs should be either "
                              "Nx1, Nx3 or a single value")
-        self._needColorUpdate = True
+        self._flagUpdate('colors')
+
+    def _setElementColors(self, color, colorSpace, operation, log, indices):
+        """Change the colors of some elements only (see setColors).
+        """
+        if colorSpace not in (None, self.colorSpace):
+            raise ValueError("The colorSpace of an ElementArrayStim can't be "
+                             "changed for some of its elements only")
+        try:
+            colors = numpy.array(self.colors, dtype=float)
+            value = numpy.array(color, dtype=float)
+        except ValueError:
+            raise ValueError("Colors of some elements can only be set with "
+                             "numeric values (not names or hex values)")
+        N = self.nElements
+        if colors.shape in ((), (1,), (3,)):
+            colors = numpy.resize(colors, [N, 3])
+        elif colors.shape in ((N,), (N, 1)):
+            colors = colors.reshape([N, 1]).repeat(3, 1)
+        indices = self._getElementIndices(indices)
+        if value.shape == (len(indices),) and value.shape != (3,):
+            value = value.reshape([-1, 1])  # one intensity per element
+        colors[indices] = self._applyOperation(colors[indices], value,
+                                               operation, 'colors')
+        # the conversion is cheap, but only the given elements need to be
+        # recomputed and uploaded
+        setColor(self, colors, colorSpace=self.colorSpace,
+                 rgbAttrib='rgbs', colorAttrib='colors',
+                 colorSpaceAttrib='colorSpace')
+        self._flagUpdate('colors', indices)
+        logAttrib(self, log, 'colors', value='%s (%s)' % (self.colors,
+                                                          self.colorSpace))
+
+    def _getElementIndices(self, indices):
+        """Sorted, unique element indices from indices, a mask or a slice.
+        """
+        indices = numpy.arange(self.nElements)[indices]
+        return numpy.unique(indices)
+
+    def _applyOperation(self, oldValue, value, operation, attrib):
+        try:
+            operator = _operations[operation]
+        except KeyError:
+            msg = ('Unsupported value "%s" for operation when '
+                   'setting %s in %s')
+            vals = (operation, attrib, self.__class__.__name__)
+            raise ValueError(msg % vals)
+        return operator(oldValue, value)
+
+    def _setElementValues(self, attrib, value, indices, operation='',
+                          log=None):
+        """Change one of the per-element attributes for some elements only,
+        and flag just those elements to be recomputed and uploaded.
+        """
+        indices = self._getElementIndices(indices)
+        current = self.__dict__[attrib]
+        if self._ownElementValues.get(attrib) is not current:
+            # never write into an array given to us (or truncate floats
+            # written into an integer one)
+            current = numpy.array(current, dtype=float)
+            self.__dict__[attrib] = current
+            self._ownElementValues[attrib] = current
+        value = numpy.array(value, dtype=float)
+        if (current.ndim == 2 and value.shape == (len(indices),) and
+                value.shape != (2,)):
+            value = value.reshape([-1, 1])  # same value in x and y
+        current[indices] = self._applyOperation(current[indices], value,
+                                                operation, attrib)
+        if attrib == 'xys':
+            self._xysAsNone = False
+        for group in _attribUpdates[attrib]:
+            self._flagUpdate(group, indices)
+        logAttrib(self, log, attrib)
 
     @attributeSetter
     def contrs(self, value):
@@ -451,12 +668,19 @@ class ElementArrayStim(MinimalStim, TextureMixin):
         :ref:`Operations <attrib-operations>` are supported.
         """
         self.__dict__['contrs'] = self._makeNx1(value)
-        self._needColorUpdate = True
+        self._flagUpdate('colors')
 
-    def setContrs(self, value, operation='', log=None):
+    def setContrs(self, value, operation='', log=None, indices=None):
         """Usually you can use 'stim.attribute = value' syntax instead,
-        but use this method if you need to suppress the log message.
+        but use this method if you need to suppress the log message or
+        to change only some of the elements.
+
+        If `indices` (element indices, a boolean mask or a slice) is given,
+        `value` is only applied to those elements. See :meth:`setXYs`.
         """
+        if indices is not None:
+            self._setElementValues('contrs', value, indices, operation, log)
+            return
         setAttribute(self, 'contrs', value, log, operation)
 
     @attributeSetter
@@ -467,7 +691,7 @@ class ElementArrayStim(MinimalStim, TextureMixin):
         :ref:`Operations <attrib-operations>` are supported.
         """
         self.__dict__['fieldPos'] = val2array(value, False, False)
-        self._needVertexUpdate = True
+        self._flagUpdate('vertices')
 
     def setFieldPos(self, value, operation='', log=None):
         """Usually you can use 'stim.attribute = value' syntax instead,
@@ -509,12 +733,19 @@ class ElementArrayStim(MinimalStim, TextureMixin):
             win = self.win
         self._selectWindow(win)
 
+        # recompute what changed (only for the changed elements if set*()
+        # was called with `indices`) and send that to the graphics card
         if self._needVertexUpdate:
-            self._updateVertices()
+            self._updateVertices(self._dirtyElements['vertices'])
         if self._needColorUpdate:
-            self.updateElementColors()
+            self.updateElementColors(self._dirtyElements['colors'])
         if self._needTexCoordUpdate:
-            self.updateTextureCoords()
+            self.updateTextureCoords(self._dirtyElements['texCoords'])
+        buffersChanged = self._updateBuffers()
+
+        if self.isInstanced:
+            self._drawInstanced(win, buffersChanged)
+            return
 
         # scale the drawing frame and get to centre of field
         GL.glPushMatrix()  # push before drawing, pop after
@@ -524,11 +755,10 @@ class ElementArrayStim(MinimalStim, TextureMixin):
         # GL.glLoadIdentity()
         self.win.setScale('pix')
 
-        cpcd = ctypes.POINTER(ctypes.c_double)
-        GL.glColorPointer(4, GL.GL_DOUBLE, 0,
-                          self._RGBAs.ctypes.data_as(cpcd))
-        GL.glVertexPointer(3, GL.GL_DOUBLE, 0,
-                           self.verticesPix.ctypes.data_as(cpcd))
+        gltools.setVertexAttribPointer(
+            GL.GL_COLOR_ARRAY, self._vbos['colors'], legacy=True)
+        gltools.setVertexAttribPointer(
+            GL.GL_VERTEX_ARRAY, self._vbos['vertices'], legacy=True)
 
         # setup the shaderprogram
         _prog = self.win._progSignedTexMask
@@ -548,15 +778,13 @@ class ElementArrayStim(MinimalStim, TextureMixin):
 
         # setup client texture coordinates first
         GL.glClientActiveTexture(GL.GL_TEXTURE0)
-        GL.glTexCoordPointer(2, GL.GL_DOUBLE, 0, self._texCoords.ctypes)
-        GL.glEnableClientState(GL.GL_TEXTURE_COORD_ARRAY)
+        gltools.setVertexAttribPointer(
+            GL.GL_TEXTURE_COORD_ARRAY, self._vbos['texCoords'], legacy=True)
         GL.glClientActiveTexture(GL.GL_TEXTURE1)
-        GL.glTexCoordPointer(2, GL.GL_DOUBLE, 0, self._maskCoords.ctypes)
-        GL.glEnableClientState(GL.GL_TEXTURE_COORD_ARRAY)
+        gltools.setVertexAttribPointer(
+            GL.GL_TEXTURE_COORD_ARRAY, self._vbos['maskCoords'], legacy=True)
 
-        GL.glEnableClientState(GL.GL_COLOR_ARRAY)
-        GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
-        GL.glDrawArrays(GL.GL_QUADS, 0, self.verticesPix.shape[0] * 4)
+        GL.glDrawArrays(GL.GL_QUADS, 0, self._vbos['vertices'].shape[0])
 
         # unbind the textures
         GL.glActiveTexture(GL.GL_TEXTURE1)
@@ -570,27 +798,210 @@ class ElementArrayStim(MinimalStim, TextureMixin):
         GL.glDisableClientState(GL.GL_COLOR_ARRAY)
         GL.glDisableClientState(GL.GL_VERTEX_ARRAY)
         GL.glDisableClientState(GL.GL_TEXTURE_COORD_ARRAY)
+        GL.glClientActiveTexture(GL.GL_TEXTURE0)
+        GL.glDisableClientState(GL.GL_TEXTURE_COORD_ARRAY)
 
         GL.glUseProgram(0)
         GL.glPopClientAttrib()
         GL.glPopMatrix()
 
-    def _updateVertices(self):
-        """Sets Stim.verticesPix from fieldPos.
+    def _flagUpdate(self, group, indices=None):
+        """Flag the 'vertices', 'colors' or 'texCoords' of some elements
+        (all if `indices` is None) to be recomputed at the next draw.
+        """
+        flag = _updateFlags[group]
+        pending = self._dirtyElements[group]
+        if indices is None:
+            self._dirtyElements[group] = None
+        elif not getattr(self, flag, False):
+            self._dirtyElements[group] = indices  # only these so far
+        elif pending is not None:
+            self._dirtyElements[group] = numpy.union1d(pending, indices)
+        self.__dict__[flag] = True
+
+    def _flagUpload(self, name, indices=None):
+        """Flag the rows of a buffer that belong to some elements (all if
+        `indices` is None) to be sent to the graphics card.
+        """
+        if indices is None or self._needUpload.get(name, 0) is None:
+            self._needUpload[name] = None
+        elif name in self._needUpload:
+            self._needUpload[name] = numpy.union1d(self._needUpload[name],
+                                                   indices)
+        else:
+            self._needUpload[name] = indices
+
+    def _getBufferData(self, name):
+        """The data (one row per vertex) held by one of the buffers.
+        """
+        if self.isInstanced:
+            return self._instanceData[name]
+        if name == 'vertices':
+            return self.verticesPix.reshape([-1, 3])
+        elif name == 'colors':
+            return self._RGBAs.reshape([-1, 4])
+        elif name == 'texCoords':
+            return self._texCoords.reshape([-1, 2])
+        elif name == 'maskCoords':
+            return self._maskCoords.reshape([-1, 2])
+
+    def _updateBuffers(self):
+        """Create the vertex buffer objects or send them the rows that
+        changed. Returns True if any buffer was (re)created.
+        """
+        if self.isInstanced:
+            names = ('pos', 'sizeOri', 'color', 'texRect')
+            rowsPerElement = 1
+        else:
+            names = ('vertices', 'colors', 'texCoords', 'maskCoords')
+            rowsPerElement = 4
+        created = False
+        for name in names:
+            data = self._getBufferData(name)
+            vbo = self._vbos.get(name)
+            if vbo is None or tuple(vbo.shape) != data.shape:
+                # first draw, or the number of elements changed
+                if vbo is not None:
+                    gltools.deleteVBO(vbo)
+                self._vbos[name] = gltools.createVBO(
+                    data, usage=GL.GL_DYNAMIC_DRAW)
+                self._needUpload.pop(name, None)
+                created = True
+            elif name in self._needUpload:
+                indices = self._needUpload.pop(name)
+                for start, stop in _elementRuns(indices, len(data)
+                                                // rowsPerElement):
+                    start *= rowsPerElement
+                    stop *= rowsPerElement
+                    nCols = data.shape[1]
+                    mapped = gltools.mapBuffer(
+                        vbo, start=start * nCols,
+                        length=(stop - start) * nCols, read=False)
+                    mapped[:] = data[start:stop]
+                    gltools.unmapBuffer(vbo)
+                gltools.unbindVBO(vbo)
+        return created
+
+    def _getInstancedProgram(self, win):
+        """The shader program for instanced drawing in the window's
+        blendMode (compiled on first use).
+        """
+        name = 'signedTexMaskInstanced'
+        fragSource = _shaders.fragSignedColorTexMask
+        if win.blendMode == 'add':
+            name += '_adding'
+            fragSource = _shaders.fragSignedColorTexMask_adding
+        if name not in win._shaders:
+            win._shaders[name] = _shaders.compileProgram(
+                _shaders.vertElementArrayInstanced, fragSource)
+        return win._shaders[name]
+
+    def _drawInstanced(self, win, buffersChanged):
+        """Draw all elements with a single instanced draw call.
+        """
+        _prog = self._getInstancedProgram(win)
+        if 'corner' not in self._vbos:
+            self._vbos['corner'] = gltools.createVBO(
+                [[1, -1], [-1, -1], [-1, 1], [1, 1]])
+        if (buffersChanged or self._instanceVAO is None or
+                self._instanceVAO[0] != _prog):
+            # VAOs are not shared between windows or programs
+            if self._instanceVAO is not None:
+                gltools.deleteVAO(self._instanceVAO[1])
+            attribs = {}
+            divisors = {}
+            for name, vbo in self._vbos.items():
+                attribName = 'corner' if name == 'corner' else (
+                    'element' + name[0].upper() + name[1:])
+                loc = GL.glGetAttribLocation(_prog, attribName.encode())
+                attribs[loc] = vbo
+                if name != 'corner':
+                    divisors[loc] = 1
+            self._instanceVAO = (_prog, gltools.createVAO(
+                attribs, attribDivisors=divisors))
+
+        GL.glPushMatrix()
+        self.win.setScale('pix')
+        GL.glUseProgram(_prog)
+        GL.glUniform1i(GL.glGetUniformLocation(_prog, b"texture"), 0)
+        GL.glUniform1i(GL.glGetUniformLocation(_prog, b"mask"), 1)
+        unitScale = convertToPix(vertices=numpy.array([1.0, 1.0]),
+                                 pos=numpy.array([0.0, 0.0]),
+                                 units=self.units, win=self.win)
+        GL.glUniform2f(GL.glGetUniformLocation(_prog, b"unitScale"),
+                       unitScale[0], unitScale[1])
+        # bind textures
+        GL.glActiveTexture(GL.GL_TEXTURE1)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, self._maskID)
+        GL.glEnable(GL.GL_TEXTURE_2D)
+        GL.glActiveTexture(GL.GL_TEXTURE0)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, self._texID)
+        GL.glEnable(GL.GL_TEXTURE_2D)
+
+        gltools.drawVAO(self._instanceVAO[1], GL.GL_QUADS,
+                        instanceCount=self._vbos['pos'].shape[0])
+
+        # unbind the textures
+        GL.glActiveTexture(GL.GL_TEXTURE1)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+        GL.glDisable(GL.GL_TEXTURE_2D)
+        GL.glActiveTexture(GL.GL_TEXTURE0)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+        GL.glDisable(GL.GL_TEXTURE_2D)
+        GL.glUseProgram(0)
+        GL.glPopMatrix()
+
+    def _deleteBuffers(self):
+        if self._instanceVAO is not None:
+            gltools.deleteVAO(self._instanceVAO[1])
+            self._instanceVAO = None
+        for vbo in self._vbos.values():
+            gltools.deleteVBO(vbo)
+        self._vbos = {}
+
+    def _setInstanceData(self, name, data, indices=None):
+        """Store (some rows of) a per-element array for instanced drawing.
+        """
+        if indices is None:
+            self._instanceData[name] = numpy.ascontiguousarray(data, 'f')
+        else:
+            self._instanceData[name][indices] = data
+        self._flagUpload(name, indices)
+
+    def _updateVertices(self, indices=None):
+        """Sets Stim.verticesPix from fieldPos (for the given element
+        indices only, if not None).
         """
 
         # Handle the orientation, size and location of
         # each element in native units
 
         radians = 0.017453292519943295
+        idx = slice(None) if indices is None else indices
+        sizes = self.sizes[idx]
+        oris = self.oris[idx]
+        # set of positions across elements
+        positions = self.xys[idx] + self.fieldPos
+        depths = (numpy.zeros(len(self.xys)) + self.depths +
+                  self.fieldDepth)[idx]
+
+        if self.isInstanced:
+            # the shader does the rest
+            self._setInstanceData('pos', numpy.column_stack(
+                [positions, depths]), indices)
+            self._setInstanceData('sizeOri', numpy.column_stack(
+                [sizes, oris * radians]), indices)
+            self._needVertexUpdate = False
+            return
 
         # so we can do matrix rotation of coords we need shape=[n*4,3]
         # but we'll convert to [n,4,3] after matrix math
-        verts = numpy.zeros([self.nElements * 4, 3], 'd')
-        wx = -self.sizes[:, 0] * numpy.cos(self.oris[:] * radians) / 2
-        wy = self.sizes[:, 0] * numpy.sin(self.oris[:] * radians) / 2
-        hx = self.sizes[:, 1] * numpy.sin(self.oris[:] * radians) / 2
-        hy = self.sizes[:, 1] * numpy.cos(self.oris[:] * radians) / 2
+        n = len(sizes)
+        verts = numpy.zeros([n * 4, 3], 'd')
+        wx = -sizes[:, 0] * numpy.cos(oris[:] * radians) / 2
+        wy = sizes[:, 0] * numpy.sin(oris[:] * radians) / 2
+        hx = sizes[:, 1] * numpy.sin(oris[:] * radians) / 2
+        hy = sizes[:, 1] * numpy.cos(oris[:] * radians) / 2
 
         # X vals of each vertex relative to the element's centroid
         verts[0::4, 0] = -wx - hx
@@ -604,25 +1015,26 @@ class ElementArrayStim(MinimalStim, TextureMixin):
         verts[2::4, 1] = +wy + hy
         verts[3::4, 1] = -wy + hy
 
-        # set of positions across elements
-        positions = self.xys + self.fieldPos
-
         # depth
-        verts[:, 2] = self.depths + self.fieldDepth
+        verts[:, 2] = depths.repeat(4)
         # rotate, translate, scale by units
         if positions.shape[0] * 4 == verts.shape[0]:
             positions = positions.repeat(4, 0)
         verts[:, :2] = convertToPix(vertices=verts[:, :2], pos=positions,
                                     units=self.units, win=self.win)
-        verts = verts.reshape([self.nElements, 4, 3])
+        verts = verts.reshape([n, 4, 3])
 
-        # assign to self attribute; make sure it's contiguous
-        self.__dict__['verticesPix'] = numpy.require(verts,
-                                                     requirements=['C'])
+        if indices is None:
+            # assign to self attribute; make sure it's contiguous
+            self.__dict__['verticesPix'] = numpy.require(verts,
+                                                         requirements=['C'])
+        else:
+            self.verticesPix[indices] = verts
+        self._flagUpload('vertices', indices)
         self._needVertexUpdate = False
 
     # ----------------------------------------------------------------------
-    def updateElementColors(self):
+    def updateElementColors(self, indices=None):
         """Create a new array of self._RGBAs based on self.rgbs.
 
         Not needed by the user (simple call setColors())
@@ -630,55 +1042,77 @@ class ElementArrayStim(MinimalStim, TextureMixin):
         For element arrays the self.rgbs values correspond to one
         element so this function also converts them to be one for
         each vertex of each element.
+
+        If `indices` is given, only those elements are updated.
         """
-        N = self.nElements
-        self._RGBAs = numpy.zeros([N, 4], 'd')
+        idx = slice(None) if indices is None else indices
+        rgbs = self.rgbs[idx]
+        N = len(rgbs)
+        contrs = self.contrs[idx].reshape([N, 1])
+        RGBAs = numpy.zeros([N, 4], 'd')
         if self.colorSpace in ('rgb', 'dkl', 'lms', 'hsv'):
             # these spaces are 0-centred
-            self._RGBAs[:, 0:3] = (self.rgbs[:, :] *
-                self.contrs[:].reshape([N, 1]).repeat(3, 1) / 2 + 0.5)
+            RGBAs[:, 0:3] = rgbs * contrs / 2 + 0.5
         else:
-            self._RGBAs[:, 0:3] = (self.rgbs *
-                self.contrs[:].reshape([N, 1]).repeat(3, 1) / 255.0)
+            RGBAs[:, 0:3] = rgbs * contrs / 255.0
 
-        self._RGBAs[:, -1] = self.opacities.reshape([N, ])
+        RGBAs[:, -1] = self.opacities[idx].reshape([N, ])
+        if self.isInstanced:
+            self._setInstanceData('color', RGBAs, indices)
+            self._needColorUpdate = False
+            return
         # repeat for the 4 vertices in the grid
-        self._RGBAs = self._RGBAs.reshape([N, 1, 4]).repeat(4, 1)
-
+        RGBAs = RGBAs.reshape([N, 1, 4]).repeat(4, 1)
+        if indices is None:
+            self._RGBAs = RGBAs
+        else:
+            self._RGBAs[indices] = RGBAs
+        self._flagUpload('colors', indices)
         self._needColorUpdate = False
 
-    def updateTextureCoords(self):
-        """Create a new array of self._maskCoords
+    def updateTextureCoords(self, indices=None):
+        """Create a new array of self._maskCoords (and texture coordinates;
+        only for the given elements if `indices` is given)
         """
-
-        N = self.nElements
-        self._maskCoords = numpy.array([[1, 0], [0, 0], [0, 1], [1, 1]],
-                                       'd').reshape([1, 4, 2])
-        self._maskCoords = self._maskCoords.repeat(N, 0)
+        idx = slice(None) if indices is None else indices
+        sfs = self.sfs[idx]
+        phases = self.phases[idx]
+        N = len(sfs)
+        if not self.isInstanced and indices is None:
+            self._maskCoords = numpy.array([[1, 0], [0, 0], [0, 1], [1, 1]],
+                                           'd').reshape([1, 4, 2])
+            self._maskCoords = self._maskCoords.repeat(N, 0)
+            self._flagUpload('maskCoords')
 
         # for the main texture
         # sf is dependent on size (openGL default)
         if self.units in ['norm', 'pix', 'height']:
-            L = old_div(-self.sfs[:, 0], 2) - self.phases[:, 0] + 0.5
-            R = old_div(+self.sfs[:, 0], 2) - self.phases[:, 0] + 0.5
-            T = old_div(+self.sfs[:, 1], 2) - self.phases[:, 1] + 0.5
-            B = old_div(-self.sfs[:, 1], 2) - self.phases[:, 1] + 0.5
+            L = old_div(-sfs[:, 0], 2) - phases[:, 0] + 0.5
+            R = old_div(+sfs[:, 0], 2) - phases[:, 0] + 0.5
+            T = old_div(+sfs[:, 1], 2) - phases[:, 1] + 0.5
+            B = old_div(-sfs[:, 1], 2) - phases[:, 1] + 0.5
         else:
             # we should scale to become independent of size
-            L = (-self.sfs[:, 0] * self.sizes[:, 0] / 2
-                 - self.phases[:, 0] + 0.5)
-            R = (+self.sfs[:, 0] * self.sizes[:, 0] / 2
-                 - self.phases[:, 0] + 0.5)
-            T = (+self.sfs[:, 1] * self.sizes[:, 1] / 2
-                 - self.phases[:, 1] + 0.5)
-            B = (-self.sfs[:, 1] * self.sizes[:, 1] / 2
-                 - self.phases[:, 1] + 0.5)
-
+            sizes = self.sizes[idx]
+            L = -sfs[:, 0] * sizes[:, 0] / 2 - phases[:, 0] + 0.5
+            R = +sfs[:, 0] * sizes[:, 0] / 2 - phases[:, 0] + 0.5
+            T = +sfs[:, 1] * sizes[:, 1] / 2 - phases[:, 1] + 0.5
+            B = -sfs[:, 1] * sizes[:, 1] / 2 - phases[:, 1] + 0.5
+
+        if self.isInstanced:
+            self._setInstanceData('texRect', numpy.column_stack([L, R, B, T]),
+                                  indices)
+            self._needTexCoordUpdate = False
+            return
         # self._texCoords=numpy.array([[1,1],[1,0],[0,0],[0,1]],
         #           'd').reshape([1,4,2])
-        self._texCoords = (numpy.concatenate([[R, B], [L, B], [L, T], [R, T]])
+        texCoords = (numpy.concatenate([[R, B], [L, B], [L, T], [R, T]])
             .transpose().reshape([N, 4, 2]).astype('d'))
-        self._texCoords = numpy.ascontiguousarray(self._texCoords)
+        if indices is None:
+            self._texCoords = numpy.ascontiguousarray(texCoords)
+        else:
+            self._texCoords[indices] = texCoords
+        self._flagUpload('texCoords', indices)
         self._needTexCoordUpdate = False
 
     @attributeSetter
@@ -732,3 +1166,5 @@ class ElementArrayStim(MinimalStim, TextureMixin):
     def __del__(self):
         # remove textures from graphics card to prevent crash
         self.clearTextures()
+        if self.__dict__.get('_vbos'):
+            self._deleteBuffers()
@@ -193,6 +193,34 @@ vertSimple = """
     }
     """
 
+# for ElementArrayStim(instanced=True); the 4 corners of the quad are shared
+# by all the elements, the rest are per-element (instance) attributes
+vertElementArrayInstanced = """
+    #version 120
+    attribute vec2 corner;  // (+/-1, +/-1)
+    attribute vec3 elementPos;  // x, y (in stim units), depth
+    attribute vec3 elementSizeOri;  // width, height, ori (radians)
+    attribute vec4 elementColor;
+    attribute vec4 elementTexRect;  // left, right, bottom, top
+    uniform vec2 unitScale;  // pixels per stim unit
+    void main() {
+            float c = cos(elementSizeOri.z);
+            float s = sin(elementSizeOri.z);
+            vec2 xy = corner * elementSizeOri.xy / 2.0;
+            // clockwise rotation, as in ElementArrayStim._updateVertices
+            xy = vec2(xy.x * c + xy.y * s, -xy.x * s + xy.y * c);
+            xy = (xy + elementPos.xy) * unitScale;
+            gl_Position = gl_ModelViewProjectionMatrix *
+                vec4(xy, elementPos.z, 1.0);
+            gl_FrontColor = elementColor;
+            vec2 frac = (corner + 1.0) / 2.0;
+            gl_TexCoord[0] = vec4(
+                mix(elementTexRect.x, elementTexRect.y, frac.x),
+                mix(elementTexRect.z, elementTexRect.w, frac.y), 0.0, 1.0);
+            gl_TexCoord[1] = vec4(frac, 0.0, 1.0);
+    }
+    """
+
 vertPhongLighting = """
 // Vertex shader for the Phong Shading Model
 // 
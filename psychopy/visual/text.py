@@ -104,6 +104,7 @@ class TextStim(BaseVisualStim, ColorMixin, ContainerMixin):
                  flipHoriz=False,
                  flipVert=False,
                  languageStyle='LTR',
+                 useGlyphAtlas=False,
                  name=None,
                  autoLog=None):
         """
@@ -141,6 +142,16 @@ class TextStim(BaseVisualStim, ColorMixin, ContainerMixin):
                 in their isolated form. May also be applied in other scripts,
                 such as Farsi or Urdu, that use Arabic-style alphabets.
 
+        **useGlyphAtlas**
+            If True (and the window is a pyglet or glfw window), the text is
+            laid out by PsychoPy rather than by pyglet. Glyphs are rendered
+            (once) into a texture atlas shared by all the TextStims in the
+            window that use the same font and size, and the text is drawn as
+            a single array of textured quads. Changing ``text`` then only
+            recomputes the positions of the letters, which is much faster
+            than re-creating the pyglet label when the text changes on every
+            frame (e.g. counters and timers). Kerning is not applied.
+
         :Parameters:
 
         """
@@ -179,7 +190,10 @@ class TextStim(BaseVisualStim, ColorMixin, ContainerMixin):
         self.__dict__['flipHoriz'] = flipHoriz
         self.__dict__['flipVert'] = flipVert
         self.__dict__['languageStyle'] = languageStyle
+        self.__dict__['useGlyphAtlas'] = (bool(useGlyphAtlas) and
+                                          win.winType in ["pyglet", "glfw"])
         self._pygletTextObj = None
+        self._glyphAtlas = None
         self.__dict__['pos'] = numpy.array(pos, float)
         # deprecated attributes
         if alignVert:
@@ -275,10 +289,15 @@ class TextStim(BaseVisualStim, ColorMixin, ContainerMixin):
         be a string specifying the name of the font (in system resources).
         """
         self.__dict__['font'] = None  # until we find one
-        if self.win.winType in ["pyglet", "glfw"]:
-            self._font = pyglet.font.load(font, int(self._heightPix),
-                                          dpi=72, italic=self.italic,
-                                          bold=self.bold)
+        if self.useGlyphAtlas:
+            self._glyphAtlas = self._getGlyphAtlas(font)
+            self.__dict__['font'] = font
+        elif self.win.winType in ["pyglet", "glfw"]:
+            # keep hold of the font (and its rendered glyphs) for reuse
+            from psychopy.visual.textbox.fontmanager import getFontAtlasCache
+            self._font = getFontAtlasCache().getPygletFont(
+                font, int(self._heightPix), dpi=72, italic=self.italic,
+                bold=self.bold)
             self.__dict__['font'] = font
         else:
             if font is None or len(font) == 0:
@@ -361,7 +380,9 @@ class TextStim(BaseVisualStim, ColorMixin, ContainerMixin):
 
             self.__dict__['text'] = text
 
-        if self.useShaders:
+        if self.useGlyphAtlas:
+            self._setTextGlyphAtlas()
+        elif self.useShaders:
             self._setTextShaders(text)
         else:
             self._setTextNoShaders(text)
@@ -373,6 +394,74 @@ class TextStim(BaseVisualStim, ColorMixin, ContainerMixin):
         """
         setAttribute(self, 'text', text, log)
 
+    def _getGlyphAtlas(self, font):
+        """Get the glyph atlas for a font at the current letter height,
+        shared with all other text stimuli using it
+        """
+        from psychopy.visual.textbox.fontmanager import getFontAtlasCache
+        size = max(int(round(self._heightPix)), 1)
+        return getFontAtlasCache().getGlyphAtlas(
+            font, size, bold=self.bold, italic=self.italic,
+            font_files=self.fontFiles)
+
+    def _setTextGlyphAtlas(self):
+        """Lay the text out as an array of quads from the glyph atlas
+        """
+        atlas = self._glyphAtlas
+        vertices, texCoords, width, height = atlas.layout(
+            self.text, wrap_width=self._wrapWidthPix, align=self.alignText)
+        # move the box so that its anchor is at (0, 0)
+        if self.anchorHoriz in ('center', 'centre'):
+            vertices[:, 0] -= width / 2.0
+        elif self.anchorHoriz == 'right':
+            vertices[:, 0] -= width
+        if self.anchorVert in ('center', 'centre'):
+            vertices[:, 1] += height / 2.0
+        elif self.anchorVert == 'bottom':
+            vertices[:, 1] += height
+        elif self.anchorVert == 'baseline':
+            vertices[:, 1] += atlas.ascender
+        self._glyphVertices = vertices
+        self._glyphTexCoords = texCoords
+        self._glyphAtlasVersion = atlas.version
+        if len(vertices):
+            contentWidth = vertices[:, 0].max() - vertices[:, 0].min()
+        else:
+            contentWidth = 0
+        self._glyphContentSize = (contentWidth, height)
+        self.width = width
+        self._fontHeightPix = height
+        self._needUpdate = True
+
+    def _drawGlyphAtlas(self):
+        """Draw all the letters with a single call, using the atlas as the
+        texture
+        """
+        atlas = self._glyphAtlas
+        if atlas.version != self._glyphAtlasVersion:
+            # the atlas grew, so the texture coordinates changed
+            self._setTextGlyphAtlas()
+        if self.win._glyphAtlasTextures is None:
+            from psychopy.visual.textbox.fontmanager import GlyphAtlasTextures
+            self.win._glyphAtlasTextures = GlyphAtlasTextures()
+        texID = atlas.bind(self.win._glyphAtlasTextures)
+        GL.glActiveTexture(GL.GL_TEXTURE0)
+        GL.glEnable(GL.GL_TEXTURE_2D)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, texID)
+
+        GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
+        GL.glEnableClientState(GL.GL_TEXTURE_COORD_ARRAY)
+        GL.glVertexPointer(2, GL.GL_FLOAT, 0,
+                           self._glyphVertices.ctypes.data_as(
+                               ctypes.POINTER(ctypes.c_float)))
+        GL.glTexCoordPointer(2, GL.GL_FLOAT, 0,
+                             self._glyphTexCoords.ctypes.data_as(
+                                 ctypes.POINTER(ctypes.c_float)))
+        GL.glDrawArrays(GL.GL_QUADS, 0, len(self._glyphVertices))
+        GL.glDisableClientState(GL.GL_TEXTURE_COORD_ARRAY)
+        GL.glDisableClientState(GL.GL_VERTEX_ARRAY)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+
     def _setTextShaders(self, value=None):
         """Set the text to be rendered using the current font
         """
@@ -760,6 +849,8 @@ class TextStim(BaseVisualStim, ColorMixin, ContainerMixin):
         NOTE: currently always returns the size in pixels
         (this will change to return in stimulus units)
         """
+        if self.useGlyphAtlas:
+            return self._glyphContentSize
         if hasattr(self._pygletTextObj, 'content_width'):
             w, h = (self._pygletTextObj.content_width,
                     self._pygletTextObj.content_height)
@@ -827,6 +918,12 @@ class TextStim(BaseVisualStim, ColorMixin, ContainerMixin):
                 GL.glGetUniformLocation(self.win._progSignedTexFont, b"rgb"),
                 desiredRGB[0], desiredRGB[1], desiredRGB[2])
 
+        elif self.useGlyphAtlas:
+            # the atlas only holds alpha, so the color comes from glColor
+            desiredRGB = self._getDesiredRGB(
+                self.rgb, self.colorSpace, self.contrast)
+            GL.glColor4f(desiredRGB[0], desiredRGB[1],
+                         desiredRGB[2], self.opacity)
         else:  # color is set in texture, so set glColor to white
             GL.glColor4f(1, 1, 1, 1)
 
@@ -841,12 +938,14 @@ class TextStim(BaseVisualStim, ColorMixin, ContainerMixin):
             GL.glActiveTexture(GL.GL_TEXTURE1)
             GL.glEnable(GL.GL_TEXTURE_2D)
             GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
-            # unbind the main texture
-            GL.glActiveTexture(GL.GL_TEXTURE0)
-            GL.glEnable(GL.GL_TEXTURE_2D)
-            # then allow pyglet to bind and use texture during drawing
-
-            self._pygletTextObj.draw()
+            if self.useGlyphAtlas:
+                self._drawGlyphAtlas()
+            else:
+                # unbind the main texture
+                GL.glActiveTexture(GL.GL_TEXTURE0)
+                GL.glEnable(GL.GL_TEXTURE_2D)
+                # then allow pyglet to bind and use texture during drawing
+                self._pygletTextObj.draw()
             GL.glDisable(GL.GL_TEXTURE_2D)
         else:
             # for pygame we should (and can) use a drawing list
@@ -13,10 +13,21 @@ from builtins import chr
 from builtins import object
 import os
 import math
+import atexit
+import ctypes
+import functools
+import hashlib
+import itertools
+import pickle
+import tempfile
+import weakref
+from collections import OrderedDict
 import numpy as np
 import unicodedata as ud
 from matplotlib import font_manager
+from psychopy import logging
 from psychopy.core import getTime
+from psychopy.tools.filetools import replaceFile
 
 from freetype import Face, FT_LOAD_RENDER, FT_LOAD_FORCE_AUTOHINT, FT_Exception
                                                      
@@ -212,12 +223,9 @@ class FontManager(object):
             if len(font_infos) == 0:
                 return False
             font_info = font_infos[0]
-            fid = MonospaceFontAtlas.getIdFromArgs(font_info, size, dpi)
-            font_atlas = fm.font_atlas_dict.get(fid)
-            if font_atlas is None:
-                font_atlas = fm.font_atlas_dict.setdefault(
-                    fid, MonospaceFontAtlas(font_info, size, dpi))
-                font_atlas.createFontAtlas()
+            # shared with all other text stimuli and evicted when unused
+            font_atlas = getFontAtlasCache().getMonospaceAtlas(font_info,
+                                                               size, dpi)
             if fm.font_store:
                 t1 = getTime()
                 fm.font_store.addFontAtlas(font_atlas)
@@ -432,10 +440,52 @@ class MonospaceFontAtlas(object):
         # resize atlas
         height = nextPow2(self.atlas.max_y + 1)
         self.atlas.resize(height)
+        self._finishFontAtlas()
+
+    def _finishFontAtlas(self):
         self.atlas.upload()
         self.createDisplayLists()
         self._face = None
 
+    # revision of the rasterised glyphs (for FontAtlasCache); the
+    # monospace atlas is complete once created so never changes
+    cache_revision = 1
+
+    def getCacheState(self):
+        """
+        Return the rasterised atlas as a picklable dict, for FontAtlasCache.
+        """
+        width, height = float(self.atlas.width), float(self.atlas.height)
+        glyphs = {}
+        for charcode, glyph in self.charcode2glyph.items():
+            glyph = dict(glyph)
+            # back from texture to pixel coordinates (exact, as the atlas
+            # size is a power of 2)
+            gx1, gy1, gx2, gy2 = glyph['texcoords']
+            glyph['texcoords'] = [gx1 * width, gy1 * height,
+                                  gx2 * width, gy2 * height]
+            glyphs[charcode] = glyph
+        return dict(charcode2glyph=glyphs,
+                    charcode2unichr=self.charcode2unichr,
+                    data=self.atlas.data,
+                    max_ascender=self.max_ascender,
+                    max_descender=self.max_descender,
+                    max_tile_width=self.max_tile_width,
+                    max_tile_height=self.max_tile_height,
+                    max_bitmap_size=self.max_bitmap_size,
+                    total_bitmap_area=self.total_bitmap_area)
+
+    def setCacheState(self, state):
+        """
+        Restore an atlas saved with getCacheState() instead of calling
+        createFontAtlas().
+        """
+        data = state.pop('data')
+        self.__dict__.update(state)
+        self.atlas = TextureAtlas(data.shape[1], data.shape[0], data.shape[2])
+        self.atlas.data = data
+        self._finishFontAtlas()
+
     def createDisplayLists(self):
         glyph_count = len(self.charcode2unichr)
         max_tile_width = self.max_tile_width
@@ -506,3 +556,530 @@ class MonospaceFontAtlas(object):
         if self.charcode2unichr is not None:
             self.charcode2unichr.clear()
             self.charcode2unichr = None
+
+
+def findFontFile(font_family_name, bold=False, italic=False, font_files=()):
+    """
+    Return the path of the font file to use for the given font family name
+    and style. font_family_name may also be the path of a font file. Files in
+    font_files are checked first, then the fonts known to matplotlib (which
+    falls back to a default font if nothing matches).
+    """
+    if font_family_name and os.path.isfile(font_family_name):
+        return font_family_name
+    for fp in font_files:
+        try:
+            face = Face(fp)
+        except FT_Exception:
+            continue
+        family = face.family_name.decode('utf-8', 'replace')
+        style = face.style_name.lower()
+        if (family.lower() == font_family_name.lower() and
+                (b'bold' in style) == bold and
+                (b'italic' in style or b'oblique' in style) == italic):
+            return fp
+    prop = font_manager.FontProperties(
+        family=font_family_name or 'sans-serif',
+        weight='bold' if bold else 'normal',
+        style='italic' if italic else 'normal')
+    return font_manager.findfont(prop)
+
+
+class GlyphAtlas(object):
+    """
+    The glyphs of one font file at one pixel size, rasterised on demand
+    into a single texture. Unlike MonospaceFontAtlas, which renders every
+    glyph of the font up front, only the characters that have actually been
+    laid out are rendered, and proportional fonts are supported.
+
+    Glyph metrics are kept in NumPy arrays so that a whole string can be
+    laid out (and wrapped) with a handful of array operations; layout()
+    returns the vertices and texture coordinates of all the glyph quads, so
+    the text can be drawn with a single call to glDrawArrays. This is what
+    TextStim uses when created with useGlyphAtlas=True.
+
+    The atlas starts at atlas_size x atlas_size pixels and doubles its height
+    whenever it is full. That changes the texture coordinates of all the
+    glyphs, so users of the atlas should check the `version` attribute and
+    lay their text out again when it changes.
+
+    A GlyphAtlas holds no GL resources itself, so one atlas can be shared by
+    several windows (see FontAtlasCache); bind() keeps a texture per window.
+    """
+    _serials = itertools.count()
+
+    def __init__(self, font_file, size, dpi=72, atlas_size=512):
+        self.font_file = font_file
+        self.size = int(size)
+        self.dpi = int(dpi)
+        self._face = Face(font_file)
+        self._face.set_char_size(height=self.size * 64, hres=self.dpi,
+                                 vres=self.dpi)
+        metrics = self._face.size
+        self.ascender = metrics.ascender / 64.0
+        self.descender = metrics.descender / 64.0  # negative
+        self.line_height = metrics.height / 64.0
+        self.atlas = TextureAtlas(atlas_size, atlas_size, 1)
+        self.version = 0
+        # char codes with a glyph in the atlas (sorted) and the index of
+        # their glyph in self._glyphs
+        self._codes = np.zeros(0, dtype=np.int64)
+        self._indices = np.zeros(0, dtype=np.intp)
+        # one row per glyph:
+        # advance, bitmap left, bitmap top, width, height, atlas x, atlas y
+        self._glyphs = np.zeros((0, 7), dtype=np.float32)
+        # identifies this atlas (and its contents) in the textures of windows
+        self._serial = next(GlyphAtlas._serials)
+        self.cache_revision = 0
+
+    def getID(self):
+        return self.getIdFromArgs(self.font_file, self.size, self.dpi)
+
+    @staticmethod
+    def getIdFromArgs(font_file, size, dpi=72):
+        return "%s_%d_%d" % (font_file, int(size), int(dpi))
+
+    def getCacheState(self):
+        """
+        Return the glyphs rendered so far as a picklable dict, for
+        FontAtlasCache.
+        """
+        atlas = self.atlas
+        return dict(codes=self._codes, indices=self._indices,
+                    glyphs=self._glyphs, data=atlas.data, nodes=atlas.nodes,
+                    used=atlas.used, max_y=atlas.max_y)
+
+    def setCacheState(self, state):
+        """
+        Restore the glyphs saved with getCacheState(); glyphs that are
+        still missing are rendered as usual.
+        """
+        atlas = self.atlas
+        atlas.data = state['data']
+        atlas.height, atlas.width = atlas.data.shape[:2]
+        atlas.nodes = list(state['nodes'])
+        atlas.used = state['used']
+        atlas.max_y = state['max_y']
+        self._codes = state['codes']
+        self._indices = state['indices']
+        self._glyphs = state['glyphs']
+        self.version += 1
+        self.cache_revision += 1
+
+    def getGlyphIndices(self, codes):
+        """
+        Return the index (into the glyph metrics) of the glyph for each of
+        the char codes in the array, rendering any glyphs that are not in
+        the atlas yet.
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        if not len(codes):
+            return np.zeros(0, dtype=np.intp)
+        pos = np.searchsorted(self._codes, codes)
+        known = pos < len(self._codes)
+        known[known] = self._codes[pos[known]] == codes[known]
+        if not known.all():
+            self._addGlyphs(np.unique(codes[~known]))
+            pos = np.searchsorted(self._codes, codes)
+        return self._indices[pos]
+
+    def _addGlyphs(self, codes):
+        face = self._face
+        first = len(self._glyphs)
+        rows = np.zeros((len(codes), 7), dtype=np.float32)
+        for i, code in enumerate(codes):
+            face.load_char(chr(code), FT_LOAD_RENDER)
+            glyph = face.glyph
+            bitmap = glyph.bitmap
+            w, h = bitmap.width, bitmap.rows
+            x = y = 0
+            if w and h:
+                # leave a 1 pixel border so neighbours don't bleed in
+                x, y, _, _ = self._getRegion(w + 2, h + 2)
+                x, y = x + 1, y + 1
+                data = np.array(bitmap.buffer, dtype=np.ubyte)
+                data = data.reshape(h, bitmap.pitch)[:, :w]
+                self.atlas.set_region((x, y, w, h), data.reshape(h, w, 1))
+            rows[i] = (glyph.advance.x / 64.0, glyph.bitmap_left,
+                       glyph.bitmap_top, w, h, x, y)
+        self._glyphs = np.concatenate([self._glyphs, rows])
+        codes = np.concatenate([self._codes, codes])
+        indices = np.concatenate([self._indices,
+                                  np.arange(first, first + len(rows))])
+        order = np.argsort(codes, kind='mergesort')
+        self._codes = codes[order]
+        self._indices = indices[order]
+        self.cache_revision += 1
+
+    def _getRegion(self, width, height):
+        region = self.atlas.get_region(width, height)
+        while region[0] < 0:
+            if width > self.atlas.width:
+                raise ValueError("Glyph of %i pixels is too wide for the "
+                                 "font atlas" % width)
+            # full; double the height and keep what is already there
+            atlas = self.atlas
+            data = np.zeros((atlas.height * 2, atlas.width, atlas.depth),
+                            dtype=np.ubyte)
+            data[:atlas.height] = atlas.data
+            atlas.data = data
+            atlas.height *= 2
+            self.version += 1
+            region = atlas.get_region(width, height)
+        return region
+
+    def bind(self, textures):
+        """
+        Return the id of the texture holding the atlas in the current GL
+        context, (re)uploading it if glyphs were added since it was last
+        uploaded. textures is the GlyphAtlasTextures of the window (or
+        context), in which the atlas keeps track of its texture there.
+        """
+        texid, revision = textures.get(self)
+        if revision != self.cache_revision:
+            self.atlas.texid = texid
+            self.atlas.upload()
+            texid = self.atlas.texid
+            textures.set(self, texid, self.cache_revision)
+        return texid
+
+    def layout(self, text, wrap_width=None, align='left'):
+        """
+        Lay out a (possibly multi-line) string.
+
+        Lines are broken at '\\n' and, if wrap_width (in pixels) is given,
+        at the last space before a word would run beyond it (a word that is
+        longer than a line is broken between letters). align is one of
+        'left', 'center' or 'right' and positions each line within a box of
+        width wrap_width (or of the longest line if wrap_width is None).
+
+        Returns (vertices, texcoords, width, height). vertices are the
+        corners of one quad per visible glyph, in pixels relative to the top
+        left corner of the text box with y increasing upwards, and texcoords
+        the matching texture coordinates, both float32 arrays of shape
+        (n*4, 2) ready for glDrawArrays(GL_QUADS, ...). width and height are
+        the size of the text box.
+        """
+        lines = []  # (codes, pen x positions) for each line
+        for paragraph in text.split(u'\n'):
+            codes = np.array([ord(c) for c in paragraph], dtype=np.int64)
+            indices = self.getGlyphIndices(codes)
+            advances = self._glyphs[indices, 0].astype(np.float64)
+            ends = np.cumsum(advances)
+            starts = ends - advances
+            if wrap_width is None or not len(codes):
+                lines.append((indices, starts))
+                continue
+            spaces = np.flatnonzero(codes == 32)
+            first = 0
+            while first < len(codes):
+                # number of glyphs (from the start of the paragraph) that
+                # end within the wrap width of this line
+                fits = np.searchsorted(ends, starts[first] + wrap_width,
+                                       side='right')
+                if fits >= len(codes):
+                    last = len(codes)
+                    nextFirst = last
+                else:
+                    # break at the last space that fits (it may just overhang)
+                    space = np.searchsorted(spaces, fits, side='right') - 1
+                    if space >= 0 and spaces[space] > first:
+                        last = spaces[space]
+                        nextFirst = last + 1
+                    else:
+                        last = max(fits, first + 1)
+                        nextFirst = last
+                lines.append((indices[first:last],
+                              starts[first:last] - starts[first]))
+                first = nextFirst
+
+        lineWidths = np.array(
+            [x[-1] + self._glyphs[idx[-1], 0] if len(idx) else 0.0
+             for idx, x in lines])
+        if wrap_width is None:
+            width = lineWidths.max() if len(lineWidths) else 0.0
+        else:
+            width = float(wrap_width)
+        if align in ('center', 'centre'):
+            lineOffsets = (width - lineWidths) / 2.0
+        elif align == 'right':
+            lineOffsets = width - lineWidths
+        else:
+            lineOffsets = np.zeros(len(lines))
+        height = self.ascender - self.descender + \
+            (len(lines) - 1) * self.line_height
+
+        nGlyphs = [len(idx) for idx, x in lines]
+        if sum(nGlyphs):
+            indices = np.concatenate([idx for idx, x in lines])
+            penX = np.concatenate([x for idx, x in lines]) + \
+                np.repeat(lineOffsets, nGlyphs)
+            baseline = np.repeat(
+                -self.ascender - np.arange(len(lines)) * self.line_height,
+                nGlyphs)
+        else:
+            indices = np.zeros(0, dtype=np.intp)
+            penX = baseline = np.zeros(0)
+        glyphs = self._glyphs[indices]
+        visible = (glyphs[:, 3] > 0) & (glyphs[:, 4] > 0)
+        glyphs = glyphs[visible]
+        left = penX[visible] + glyphs[:, 1]
+        top = baseline[visible] + glyphs[:, 2]
+        right = left + glyphs[:, 3]
+        bottom = top - glyphs[:, 4]
+        texLeft = glyphs[:, 5] / self.atlas.width
+        texTop = glyphs[:, 6] / self.atlas.height
+        texRight = (glyphs[:, 5] + glyphs[:, 3]) / self.atlas.width
+        texBottom = (glyphs[:, 6] + glyphs[:, 4]) / self.atlas.height
+
+        # corners in the order top left, bottom left, bottom right, top right
+        vertices = np.empty((len(glyphs), 4, 2), dtype=np.float32)
+        vertices[:, :, 0] = np.column_stack([left, left, right, right])
+        vertices[:, :, 1] = np.column_stack([top, bottom, bottom, top])
+        texcoords = np.empty((len(glyphs), 4, 2), dtype=np.float32)
+        texcoords[:, :, 0] = np.column_stack(
+            [texLeft, texLeft, texRight, texRight])
+        texcoords[:, :, 1] = np.column_stack(
+            [texTop, texBottom, texBottom, texTop])
+        return (vertices.reshape(-1, 2), texcoords.reshape(-1, 2),
+                width, height)
+
+    def __del__(self):
+        self._face = None
+        self.atlas = None
+
+
+class GlyphAtlasTextures(object):
+    """
+    The textures of the GlyphAtlases used in one window (or GL context).
+
+    Atlases are only referenced weakly. Once an atlas is garbage collected
+    (e.g. it was evicted from the FontAtlasCache and no stimulus uses it
+    any more) its texture is deleted, the next time a texture is looked up,
+    as that is done while the window's context is current.
+    """
+
+    def __init__(self):
+        self._textures = {}  # atlas serial: (texid, revision, weakref)
+        self._released = []  # textures of atlases that were collected
+
+    def __len__(self):
+        return len(self._textures)
+
+    def get(self, atlas):
+        """
+        Return the (texid, cache_revision) of the texture of atlas, or
+        (None, None) if it has none yet.
+        """
+        self.deleteReleased()
+        texid, revision, ref = self._textures.get(atlas._serial,
+                                                  (None, None, None))
+        return texid, revision
+
+    def set(self, atlas, texid, revision):
+        entry = self._textures.get(atlas._serial)
+        if entry is None:
+            ref = weakref.ref(atlas, functools.partial(self._release,
+                                                       atlas._serial))
+        else:
+            ref = entry[2]
+        self._textures[atlas._serial] = (texid, revision, ref)
+
+    def _release(self, serial, ref=None):
+        # called when an atlas is garbage collected, in any thread
+        entry = self._textures.pop(serial, None)
+        if entry is not None and entry[0] is not None:
+            self._released.append(entry[0])
+
+    def deleteReleased(self):
+        """
+        Delete the textures of atlases that were garbage collected. Needs
+        the window's GL context to be current.
+        """
+        while self._released:
+            texid = self._released.pop()
+            glDeleteTextures(1, ctypes.byref(texid))
+
+
+class FontAtlasCache(object):
+    """
+    A process-wide cache of rasterised fonts, shared by all the text stimuli
+    (TextStim and thus Form, Slider and RatingScale labels, and TextBox), so
+    a font at a given size is only loaded and rasterised once however many
+    stimuli use it. Get it with getFontAtlasCache().
+
+    Entries are keyed by (kind, font file or name, size, dpi, style).
+    Up to max_size entries are kept; beyond that the least recently used
+    one is dropped from the cache (stimuli still using it keep it alive).
+
+    If cache_dir is set, rasterised atlases are also saved there (when they
+    are evicted, when save() is called and when Python exits) and loaded
+    from there instead of being rasterised again, so later sessions start
+    faster. Saved atlases are tied to the modification time of the font file.
+    """
+
+    def __init__(self, max_size=32, cache_dir=None):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._saved = {}  # key: cache_revision of the atlas on disk
+        self.cache_dir = None
+        self.setCacheDir(cache_dir)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def keys(self):
+        return list(self._entries.keys())
+
+    def setCacheDir(self, cache_dir):
+        """
+        Set the directory used to persist rasterised atlases, or None to
+        keep them in memory only.
+        """
+        if cache_dir is not None and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        if cache_dir is not None and self.cache_dir is None:
+            atexit.register(self.save)
+        self.cache_dir = cache_dir
+
+    def get(self, key, create):
+        """
+        Return the entry for key, calling create() to make it if needed.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            entry = create()
+        self._entries[key] = entry  # now the most recently used
+        while len(self._entries) > max(self.max_size, 1):
+            oldKey, oldEntry = self._entries.popitem(last=False)
+            self._store(oldKey, oldEntry)
+        return entry
+
+    def clear(self):
+        """
+        Empty the cache (after saving the atlases if there is a cache_dir).
+        """
+        self.save()
+        self._entries.clear()
+
+    def save(self):
+        """
+        Save all the atlases that changed since they were loaded or saved
+        to the cache_dir (if there is one).
+        """
+        for key, entry in list(self._entries.items()):
+            self._store(key, entry)
+
+    def getGlyphAtlas(self, font, size, bold=False, italic=False, dpi=72,
+                      font_files=()):
+        """
+        Return the GlyphAtlas for a font name (or file) and size in pixels
+        (at the given dpi).
+        """
+        font_file = findFontFile(font, bold, italic, font_files)
+        key = ('glyphs', font_file, int(size), int(dpi), bool(bold),
+               bool(italic))
+
+        def create():
+            atlas = GlyphAtlas(font_file, size, dpi)
+            self._restore(key, atlas)
+            return atlas
+        return self.get(key, create)
+
+    def getMonospaceAtlas(self, font_info, size, dpi=72):
+        """
+        Return the MonospaceFontAtlas (as used by TextBox) for a FontInfo.
+        """
+        # the style is that of the font file
+        key = ('monospace', font_info.path, int(size), int(dpi),
+               font_info.style_name)
+
+        def create():
+            atlas = MonospaceFontAtlas(font_info, size, dpi)
+            if not self._restore(key, atlas):
+                atlas.createFontAtlas()
+            return atlas
+        return self.get(key, create)
+
+    def getPygletFont(self, font, size, bold=False, italic=False, dpi=72):
+        """
+        Return a pyglet font. pyglet only keeps weak references to fonts
+        that are not in use (apart from the last few loaded), so holding
+        them here stops their glyphs from being rasterised again when, for
+        instance, the labels of one form are deleted and those of the next
+        one created.
+        """
+        import pyglet
+        context = pyglet.gl.current_context
+        objectSpace = id(context.object_space) if context else None
+        key = ('pyglet', font, int(size), int(dpi), bool(bold), bool(italic),
+               objectSpace)
+        return self.get(key, lambda: pyglet.font.load(
+            font, int(size), dpi=dpi, bold=bold, italic=italic))
+
+    def _getCacheFile(self, key):
+        fontFile = key[1]
+        try:
+            mtime = os.path.getmtime(fontFile)
+        except (OSError, TypeError):
+            return None
+        digest = hashlib.sha1(repr((key, mtime)).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest + '.atlas')
+
+    def _restore(self, key, atlas):
+        if self.cache_dir is None:
+            return False
+        fileName = self._getCacheFile(key)
+        if fileName is None or not os.path.isfile(fileName):
+            return False
+        try:
+            with open(fileName, 'rb') as f:
+                state = pickle.load(f)
+            atlas.setCacheState(state)
+        except Exception as err:
+            logging.warning("Could not load font atlas from %s (%s); "
+                            "rasterising it again" % (fileName, err))
+            return False
+        self._saved[key] = atlas.cache_revision
+        return True
+
+    def _store(self, key, entry):
+        if self.cache_dir is None or not hasattr(entry, 'getCacheState'):
+            return
+        if self._saved.get(key) == entry.cache_revision:
+            return  # nothing new
+        fileName = self._getCacheFile(key)
+        if fileName is None:
+            return
+        tmpName = None
+        try:
+            # a temp file of our own, as other processes may be saving the
+            # same atlas, then swapped in so the atlas file is never missing
+            fd, tmpName = tempfile.mkstemp(dir=os.path.dirname(fileName),
+                                           suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry.getCacheState(), f, protocol=2)
+            replaceFile(tmpName, fileName)
+        except Exception as err:
+            logging.warning("Could not save font atlas to %s (%s)"
+                            % (fileName, err))
+            if tmpName is not None and os.path.exists(tmpName):
+                os.remove(tmpName)
+            return
+        self._saved[key] = entry.cache_revision
+
+
+_fontAtlasCache = None
+
+
+def getFontAtlasCache():
+    """
+    Return the FontAtlasCache shared by all text stimuli.
+    """
+    global _fontAtlasCache
+    if _fontAtlasCache is None:
+        _fontAtlasCache = FontAtlasCache()
+    return _fontAtlasCache
@@ -535,6 +535,9 @@ class Window(object):
         self._toDraw = []
         self._toDrawDepths = []
         self._eventDispatchers = []
+        # textures of the glyph atlases used by TextStims in this window
+        # (a GlyphAtlasTextures, made when the first one is drawn)
+        self._glyphAtlasTextures = None
 
         self.lastFrameT = core.getTime()
         self.waitBlanking = waitBlanking